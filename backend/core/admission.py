@@ -0,0 +1,128 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator
+
+from fastapi import HTTPException, status
+from langchain_core.runnables import Runnable
+
+from core.config import settings
+from core.llm_scheduler import LLMOverloaded, LLMScheduler
+
+# Endpoint classes with their own per-user bucket
+HINT = "hint"
+CHECK = "check"
+ROADMAP = "roadmap"
+# Speculative model calls made on a user's behalf (core/similar_prefetch.py, core/practice_pool.py)
+SPECULATION = "speculation"
+# Classes whose model calls are scheduled as interactive (core/llm_scheduler.py)
+INTERACTIVE = (HINT, CHECK)
+
+
+def too_many_requests(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def overloaded_response(e: LLMOverloaded) -> HTTPException:
+    return too_many_requests("The tutor is busy right now, please try again shortly", e.retry_after)
+
+
+class _TokenBucket:
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated_at = now
+
+
+class RateLimiter:
+    """
+    Per-user token buckets, one per (endpoint class, user). Buckets refill
+    continuously at `per_minute / 60` tokens a second up to `burst`; a
+    request takes one token or is told how long to wait for it.
+    """
+
+    def __init__(self, limits: dict[str, tuple[float, int]], premium_multiplier: float, max_buckets: int):
+        self.limits = limits
+        self.premium_multiplier = premium_multiplier
+        self.max_buckets = max_buckets
+        self._buckets: OrderedDict[tuple[str, int], _TokenBucket] = OrderedDict()
+        self._stats = {name: {"admitted": 0, "rejected": 0} for name in limits}
+
+    def take(self, endpoint_class: str, user_id: int, premium: bool = False) -> float:
+        """
+        Take a token. Returns 0 when admitted, otherwise the seconds until
+        a token is available.
+        """
+        per_minute, burst = self.limits[endpoint_class]
+        if premium:
+            per_minute *= self.premium_multiplier
+            burst *= self.premium_multiplier
+        rate = per_minute / 60
+
+        now = time.monotonic()
+        key = (endpoint_class, user_id)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = _TokenBucket(burst, now)
+            self._buckets[key] = bucket
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated_at) * rate)
+            bucket.updated_at = now
+        self._buckets.move_to_end(key)
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            self._stats[endpoint_class]["admitted"] += 1
+            return 0.0
+        self._stats[endpoint_class]["rejected"] += 1
+        return (1 - bucket.tokens) / rate if rate > 0 else float(settings.LLM_OVERLOAD_RETRY_AFTER_SECONDS)
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "buckets": len(self._buckets),
+        }
+
+
+class GovernedModel(Runnable):
+    """
+    Wraps a chat model so every call (including each chunk stream) holds
+    a scheduler slot for its whole duration. Cache hits and coalesced
+    requests never reach the model, so they never take a slot.
+    """
+
+    def __init__(self, model: Runnable, scheduler: LLMScheduler):
+        self.model = model
+        self.scheduler = scheduler
+
+    def invoke(self, input: Any, config=None, **kwargs) -> Any:
+        # Sync calls are not used by the services; nothing to govern here
+        return self.model.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config=None, **kwargs) -> Any:
+        async with self.scheduler.slot():
+            return await self.model.ainvoke(input, config, **kwargs)
+
+    async def astream(self, input: Any, config=None, **kwargs) -> AsyncIterator:
+        async with self.scheduler.slot():
+            async for chunk in self.model.astream(input, config, **kwargs):
+                yield chunk
+
+
+rate_limiter = RateLimiter(
+    limits={
+        HINT: (settings.RATE_LIMIT_HINT_PER_MINUTE, settings.RATE_LIMIT_HINT_BURST),
+        CHECK: (settings.RATE_LIMIT_CHECK_PER_MINUTE, settings.RATE_LIMIT_CHECK_BURST),
+        ROADMAP: (settings.RATE_LIMIT_ROADMAP_PER_MINUTE, settings.RATE_LIMIT_ROADMAP_BURST),
+        SPECULATION: (settings.SIMILAR_EXERCISE_SPECULATION_PER_MINUTE, settings.SIMILAR_EXERCISE_SPECULATION_BURST),
+    },
+    premium_multiplier=settings.RATE_LIMIT_PREMIUM_MULTIPLIER,
+    max_buckets=settings.RATE_LIMIT_MAX_BUCKETS,
+)
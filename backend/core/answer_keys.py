@@ -0,0 +1,69 @@
+import asyncio
+
+from sqlalchemy import update
+
+from core.answer_verifier import VerifierUnavailable, verifier_pool
+from core.llm_scheduler import llm_class
+from core.tutor_service import TutorService
+from db.database import AsyncSessionLocal
+from models.exercise import Exercise
+
+
+class AnswerKeyExtractor:
+    """
+    Extracts an exercise's expected final result in the background and
+    stores it on the exercise row, so later answer checks can be decided
+    by the local verifier. Each exercise is extracted at most once at a time.
+    """
+
+    def __init__(self):
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._stats = {
+            "extracted": 0,
+            "checkable": 0,
+            "deferred": 0,
+            "failed": 0,
+        }
+
+    def schedule(self, exercise_id: int, exercise_content: str, premium: bool = False):
+        if exercise_id in self._tasks:
+            return
+        task = asyncio.create_task(self._extract(exercise_id, exercise_content, premium))
+        self._tasks[exercise_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(exercise_id, None))
+
+    async def _extract(self, exercise_id: int, exercise_content: str, premium: bool):
+        try:
+            # Batch work, whichever request scheduled it
+            with llm_class(interactive=False, premium=premium):
+                answer_key = await TutorService.extract_expected_answer(exercise_content)
+            answer, kind = await verifier_pool.normalize(answer_key.kind, answer_key.answer)
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(Exercise)
+                    .where(Exercise.id == exercise_id)
+                    .values(expected_answer=answer, expected_answer_kind=kind)
+                )
+                await db.commit()
+        except VerifierUnavailable as e:
+            # Nothing is stored, so the kind stays NULL and a later answer
+            # schedules the extraction again (the model reply is cached)
+            self._stats["deferred"] += 1
+            print(f"Answer key extraction deferred for exercise {exercise_id}: verifier {e}")
+            return
+        except Exception as e:
+            self._stats["failed"] += 1
+            print(f"Answer key extraction failed for exercise {exercise_id}: {e}")
+            return
+        self._stats["extracted"] += 1
+        if answer is not None:
+            self._stats["checkable"] += 1
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "in_flight": len(self._tasks),
+        }
+
+
+answer_keys = AnswerKeyExtractor()
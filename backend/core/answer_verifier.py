@@ -0,0 +1,395 @@
+import asyncio
+import random
+import re
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+from core.config import settings
+
+try:
+    import sympy
+    from sympy.parsing.sympy_parser import (
+        convert_xor,
+        implicit_multiplication_application,
+        parse_expr,
+        standard_transformations,
+    )
+except ImportError:  # SymPy is optional; without it every answer goes to the LLM
+    sympy = None
+
+# Answer kinds stored in Exercise.expected_answer_kind
+KIND_NUMBER = "number"
+KIND_EXPRESSION = "expression"
+KIND_OTHER = "other" # Not checkable locally
+
+_MAX_ANSWER_LENGTH = 200
+_SAMPLE_POINTS = 6
+# Limits that keep evaluation cheap: 9**9**9 or 10^100000 would take
+# minutes and gigabytes to compute exactly
+_MAX_DIGITS = 15
+_MAX_EXPONENT = 100
+_MAX_NODES = 200
+
+# Reason given when a local "incorrect" is sent to the LLM to confirm
+UNCONFIRMED_INCORRECT = "incorrect, unconfirmed"
+
+_REPLACEMENTS = (
+    ("×", "*"), ("·", "*"), ("÷", "/"), ("−", "-"), ("–", "-"),
+    ("π", "pi"), ("²", "**2"), ("³", "**3"),
+)
+# √2 -> sqrt(2), √(x+1) -> sqrt(x+1)
+_SQRT_RE = re.compile(r"√\s*(\d+(?:[.,]\d+)?|[A-Za-z])")
+# Vietnamese decimal comma: 2,5 -> 2.5
+_DECIMAL_COMMA_RE = re.compile(r"(?<=\d),(?=\d)")
+_SAFE_TEXT_RE = re.compile(r"^[\w\s+\-*/^().]*$")
+_DECIMAL_RE = re.compile(r"^-?\d+\.(\d+)$")
+# "x = 2 hoặc x = 3", "2; 3", "x = ±2", "2 3": several values, not one
+_CLAUSE_RE = re.compile(r"\b(?:hoặc|và|or|and)\b|[,;±]|\+\s*-|\+/-|\d\s+\d", re.IGNORECASE)
+# A dot that is not a decimal point, as in pi.evalf(100000)
+_ATTRIBUTE_RE = re.compile(r"(?<!\d)\.|\.(?!\d)")
+_NAME_RE = re.compile(r"[^\W\d]\w*")
+_SYMBOL_NAME_RE = re.compile(r"^[A-Za-z]\d*$")
+_LONG_NUMBER_RE = re.compile(r"\d{%d,}" % (_MAX_DIGITS + 1))
+
+if sympy is not None:
+    _TRANSFORMATIONS = standard_transformations + (implicit_multiplication_application, convert_xor)
+    _LOCALS = {
+        name: getattr(sympy, name)
+        for name in ("pi", "E", "sqrt", "log", "ln", "exp", "sin", "cos", "tan", "Abs", "Rational")
+    }
+    # parse_expr evaluates code: give it only what its transformations
+    # (and evaluate=False) emit, and no builtins
+    _GLOBALS = {
+        "__builtins__": {},
+        **{
+            name: getattr(sympy, name)
+            for name in ("Integer", "Float", "Rational", "Symbol", "Function", "Add", "Mul", "Pow")
+        },
+    }
+
+
+@dataclass
+class Verdict:
+    """
+    is_correct is None when the answer could not be decided locally.
+    """
+    is_correct: bool | None
+    reason: str
+
+
+def _single_value(text: str) -> str | None:
+    """
+    The one value an answer states, or None when it states several
+    ("x = 2 hoặc x = 3", "x1 = 2, x2 = 3") and has to go to the LLM.
+    """
+    text = _DECIMAL_COMMA_RE.sub(".", (text or "").strip().rstrip(".").strip())
+    if text.count("=") > 1 or _CLAUSE_RE.search(text):
+        return None
+    # "x = 5" / "f'(x) = 2x": compare the right-hand side
+    if "=" in text:
+        text = text.split("=", 1)[1].strip()
+    return text
+
+
+def _allowed_names(text: str) -> bool:
+    return all(
+        name in _LOCALS or _SYMBOL_NAME_RE.match(name)
+        for name in _NAME_RE.findall(text)
+    )
+
+
+def _bounded(expr) -> bool:
+    """
+    Reject trees that are expensive to evaluate: exponent towers,
+    exponents above _MAX_EXPONENT, and very large trees.
+    """
+    for count, node in enumerate(sympy.preorder_traversal(expr), 1):
+        if count > _MAX_NODES:
+            return False
+        if node.is_Pow:
+            exponent = node.exp
+        elif isinstance(node, sympy.exp):
+            exponent = node.args[0]
+        else:
+            continue
+        for inner in sympy.preorder_traversal(exponent):
+            # Reciprocals (x**-1) are how 1/2 is written unevaluated
+            if (inner.is_Pow and inner.exp != -1) or isinstance(inner, sympy.exp):
+                return False
+        if any(abs(number) > _MAX_EXPONENT for number in exponent.atoms(sympy.Number)):
+            return False
+        if not exponent.free_symbols and abs(complex(sympy.N(exponent))) > _MAX_EXPONENT:
+            return False
+    return True
+
+
+def _parse(text: str):
+    text = _single_value(text)
+    if not text:
+        return None
+    for old, new in _REPLACEMENTS:
+        text = text.replace(old, new)
+    text = _SQRT_RE.sub(r"sqrt(\1)", text).replace("√", "sqrt")
+    if (
+        not text
+        or len(text) > _MAX_ANSWER_LENGTH
+        or not _SAFE_TEXT_RE.match(text)
+        or "_" in text
+        or _ATTRIBUTE_RE.search(text)
+        or _LONG_NUMBER_RE.search(text)
+        or not _allowed_names(text)
+    ):
+        return None
+    try:
+        # Unevaluated, so nothing is computed before _bounded has looked at it
+        expr = parse_expr(
+            text,
+            local_dict=dict(_LOCALS),
+            global_dict=dict(_GLOBALS),
+            transformations=_TRANSFORMATIONS,
+            evaluate=False
+        )
+        return expr if _bounded(expr) else None
+    except Exception:
+        return None
+
+
+def _close(a: complex, b: complex, rel_tol: float, abs_tol: float) -> bool:
+    return abs(a - b) <= max(abs_tol, rel_tol * max(abs(a), abs(b)))
+
+
+def _numeric(expr) -> complex | None:
+    try:
+        value = complex(sympy.N(expr))
+    except (TypeError, ValueError):
+        return None
+    return value
+
+
+def verify_answer(
+    expected: str | None,
+    kind: str | None,
+    answer: str,
+    rel_tol: float = 1e-6,
+    abs_tol: float = 1e-9,
+) -> Verdict:
+    """
+    Compare a student's answer with the stored expected result.
+
+    Numbers are compared within a tolerance, expressions by evaluating both
+    at random points for their variables. Anything that does not parse
+    cleanly, states several values or is too expensive to evaluate is
+    left undecided for the LLM.
+
+    Runs SymPy in the calling thread; from the event loop, go through
+    verifier_pool instead.
+    """
+    if sympy is None or not expected or kind not in (KIND_NUMBER, KIND_EXPRESSION):
+        return Verdict(None, "no checkable answer")
+
+    expected_expr = _parse(expected)
+    answer_expr = _parse(answer)
+    if expected_expr is None or answer_expr is None:
+        return Verdict(None, "unparseable")
+
+    try:
+        if kind == KIND_NUMBER:
+            if answer_expr.free_symbols:
+                return Verdict(None, "answer has variables")
+            a, b = _numeric(expected_expr), _numeric(answer_expr)
+            if a is None or b is None:
+                return Verdict(None, "not numeric")
+            if _close(a, b, rel_tol, abs_tol):
+                return Verdict(True, "numeric")
+            rounded = _DECIMAL_RE.match(_single_value(answer))
+            if rounded and abs(a - b) <= 0.5 * 10 ** -len(rounded.group(1)) * (1 + 1e-9):
+                # Correct to the digits given; whether that is enough is the tutor's call
+                return Verdict(None, "rounded")
+            return Verdict(False, "numeric")
+
+        symbols = sorted(expected_expr.free_symbols | answer_expr.free_symbols, key=str)
+        if answer_expr.free_symbols - expected_expr.free_symbols:
+            return Verdict(None, "unexpected variables")
+        rng = random.Random(0)
+        for _ in range(_SAMPLE_POINTS):
+            point = {symbol: sympy.Float(rng.uniform(0.5, 2.5)) for symbol in symbols}
+            a = _numeric(expected_expr.subs(point))
+            b = _numeric(answer_expr.subs(point))
+            if a is None or b is None:
+                return Verdict(None, "not numeric")
+            if not _close(a, b, rel_tol, abs_tol):
+                return Verdict(False, "expression differs")
+        return Verdict(True, "expression equivalent")
+    except Exception:
+        return Verdict(None, "evaluation failed")
+
+
+def normalize_answer_key(kind: str, answer: str) -> tuple[str | None, str]:
+    """
+    Validate an extracted answer key before it is stored: anything that
+    cannot be checked locally becomes KIND_OTHER with no answer.
+    """
+    kind = (kind or "").strip().lower()
+    answer = (answer or "").strip()
+    if kind not in (KIND_NUMBER, KIND_EXPRESSION) or sympy is None:
+        return None, KIND_OTHER
+    expr = _parse(answer)
+    if expr is None or (kind == KIND_NUMBER and expr.free_symbols):
+        return None, KIND_OTHER
+    return answer, kind
+
+
+class VerifierUnavailable(Exception):
+    """
+    The verifier pool was saturated, ran past its timeout or lost a worker.
+    """
+
+
+class AnswerVerifierPool:
+    """
+    Runs the verifier in a dedicated process pool with a hard timeout.
+
+    Answers are student input and SymPy holds the GIL while it computes,
+    so a pathological answer that gets past the parser's limits must not
+    run on the event loop, and must not hold up the calls behind it: a call
+    still running after `timeout` seconds gets the pool shut down and
+    replaced, so later calls go to fresh workers. The old worker finishes
+    in the background and counts as in flight until it does. At most
+    `workers + max_queue` calls are in flight; beyond that, or on a
+    timeout, the answer is left undecided and goes to the LLM.
+    """
+
+    def __init__(self, workers: int, max_queue: int, timeout: float):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {
+            "calls": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "restarts": 0,
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _release(self, _future: Future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _restart(self, executor: ProcessPoolExecutor):
+        if self._executor is not executor:
+            return # Already replaced by another call
+        self._executor = None
+        self._stats["restarts"] += 1
+        # A running call cannot be cancelled; queued ones are, and the next
+        # call builds a new executor
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise VerifierUnavailable("busy")
+            self._in_flight += 1
+
+        self._stats["calls"] += 1
+        executor = self._get_executor()
+        future = executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except TimeoutError:
+            self._stats["timeouts"] += 1
+            self._restart(executor)
+            raise VerifierUnavailable("timed out") from None
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise VerifierUnavailable("worker lost") from None
+
+    async def verify(
+        self,
+        expected: str | None,
+        kind: str | None,
+        answer: str,
+        rel_tol: float = 1e-6,
+        abs_tol: float = 1e-9,
+    ) -> Verdict:
+        if sympy is None or not expected or kind not in (KIND_NUMBER, KIND_EXPRESSION):
+            return verify_answer(expected, kind, answer)
+        try:
+            return await self._run(verify_answer, expected, kind, answer, rel_tol, abs_tol)
+        except VerifierUnavailable as e:
+            return Verdict(None, f"verifier {e}")
+
+    async def normalize(self, kind: str, answer: str) -> tuple[str | None, str]:
+        """
+        normalize_answer_key in the pool: the key comes from a model reading
+        student-written exercise text, so it gets the same limits.
+        Raises VerifierUnavailable when the pool cannot run it, so a busy
+        pool is not mistaken for an uncheckable key.
+        """
+        return await self._run(normalize_answer_key, kind, answer)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "in_flight": self._in_flight,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "timeout_seconds": self.timeout,
+        }
+
+
+verifier_pool = AnswerVerifierPool(
+    workers=settings.ANSWER_VERIFIER_WORKERS,
+    max_queue=settings.ANSWER_VERIFIER_MAX_QUEUE,
+    timeout=settings.ANSWER_VERIFIER_TIMEOUT_SECONDS,
+)
+
+
+class AnswerVerifierStats:
+    def __init__(self):
+        self._stats = {
+            "decided_correct": 0,
+            "decided_incorrect": 0,
+            "undecided": 0,
+            "unconfirmed_incorrect": 0,
+            "no_answer_key": 0,
+        }
+
+    def record(self, verdict: Verdict | None):
+        if verdict is None:
+            self._stats["no_answer_key"] += 1
+        elif verdict.is_correct is None:
+            self._stats["undecided"] += 1
+            if verdict.reason == UNCONFIRMED_INCORRECT:
+                self._stats["unconfirmed_incorrect"] += 1
+        elif verdict.is_correct:
+            self._stats["decided_correct"] += 1
+        else:
+            self._stats["decided_incorrect"] += 1
+
+    def stats(self) -> dict:
+        decided = self._stats["decided_correct"] + self._stats["decided_incorrect"]
+        total = decided + self._stats["undecided"] + self._stats["no_answer_key"]
+        return {
+            **self._stats,
+            "local_ratio": round(decided / total, 4) if total else 0.0,
+            "sympy_available": sympy is not None,
+        }
+
+
+verifier_stats = AnswerVerifierStats()
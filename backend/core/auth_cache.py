@@ -0,0 +1,166 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from core.config import settings
+from models.user import User
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    Read-only copy of the user fields request handlers need,
+    detached from any DB session so it can be cached.
+    """
+    id: int
+    email: str
+    username: str | None
+    is_premium: bool
+    profile_year: str | None
+    profile_skill_level: str | None
+    profile_common_mistakes: tuple[str, ...] | None
+
+    @classmethod
+    def from_model(cls, user: User) -> "UserSnapshot":
+        mistakes = user.profile_common_mistakes
+        return cls(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            is_premium=bool(user.is_premium),
+            profile_year=user.profile_year,
+            profile_skill_level=user.profile_skill_level,
+            profile_common_mistakes=tuple(mistakes) if mistakes else None,
+        )
+
+
+class AuthCache:
+    """
+    In-process TTL caches for the authentication hot path:
+    verified token -> subject (email), and email -> UserSnapshot.
+
+    Both are bounded LRUs. A cached token never outlives its own `exp`.
+    User entries are dropped as soon as the row is updated or deleted
+    through the ORM in this process (see the listeners below); other
+    processes see the change within `ttl_seconds`.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._tokens: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._users: OrderedDict[str, tuple[float, UserSnapshot]] = OrderedDict()
+        self._stats = {
+            "token_hits": 0,
+            "token_misses": 0,
+            "user_hits": 0,
+            "user_misses": 0,
+            "invalidations": 0,
+        }
+
+    def _get(self, entries: OrderedDict, key: str):
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del entries[key]
+            return None
+        entries.move_to_end(key)
+        return value
+
+    def _set(self, entries: OrderedDict, key: str, value, expires_at: float):
+        entries[key] = (expires_at, value)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    # --- Tokens ---
+    def get_token_subject(self, token: str) -> str | None:
+        if not settings.AUTH_CACHE_ENABLED:
+            return None
+        subject = self._get(self._tokens, token)
+        self._stats["token_hits" if subject is not None else "token_misses"] += 1
+        return subject
+
+    def put_token(self, token: str, subject: str, token_expires_at: float | None):
+        if not settings.AUTH_CACHE_ENABLED:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        self._set(self._tokens, token, subject, expires_at)
+
+    # --- Users ---
+    def get_user(self, email: str) -> UserSnapshot | None:
+        if not settings.AUTH_CACHE_ENABLED:
+            return None
+        user = self._get(self._users, email)
+        self._stats["user_hits" if user is not None else "user_misses"] += 1
+        return user
+
+    def put_user(self, user: UserSnapshot):
+        if not settings.AUTH_CACHE_ENABLED:
+            return
+        self._set(self._users, user.email, user, time.time() + self.ttl_seconds)
+
+    def invalidate_user(self, email: str | None):
+        if email and self._users.pop(email, None) is not None:
+            self._stats["invalidations"] += 1
+
+    def clear(self):
+        self._tokens.clear()
+        self._users.clear()
+
+    def stats(self) -> dict:
+        lookups = sum(self._stats[k] for k in ("token_hits", "token_misses", "user_hits", "user_misses"))
+        hits = self._stats["token_hits"] + self._stats["user_hits"]
+        return {
+            **self._stats,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "tokens": len(self._tokens),
+            "users": len(self._users),
+        }
+
+
+auth_cache = AuthCache(
+    max_entries=settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.AUTH_CACHE_TTL_SECONDS,
+)
+
+
+# --- Invalidation ---
+_PENDING_KEY = "auth_cache_invalidate"
+
+
+def _user_emails(target: User) -> set[str]:
+    # The current email, plus the old one if this flush changed it
+    history = inspect(target).attrs.email.history
+    return {email for email in (target.email, *history.deleted) if email}
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target: User):
+    emails = _user_emails(target)
+    for email in emails:
+        auth_cache.invalidate_user(email)
+    # Drop them again on commit, in case a concurrent request re-cached
+    # the old row between this flush and the commit
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).update(emails)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session: Session):
+    for email in session.info.pop(_PENDING_KEY, ()):
+        auth_cache.invalidate_user(email)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_users(session: Session):
+    session.info.pop(_PENDING_KEY, None)
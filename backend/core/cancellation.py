@@ -0,0 +1,135 @@
+import asyncio
+from collections import deque
+
+from fastapi import HTTPException, Request
+
+from core.config import settings
+
+# nginx's "client closed request"; never seen by the client, only in logs
+CLIENT_CLOSED_REQUEST = 499
+
+
+class ClientDisconnected(Exception):
+    """
+    The client went away while the request was being handled.
+    """
+
+
+class RequestDeadlineExceeded(TimeoutError):
+    """
+    The request ran past its endpoint's deadline.
+    """
+
+
+def client_closed_response() -> HTTPException:
+    return HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed the request")
+
+
+class CancellationStats:
+    """
+    Requests cut short by a disconnect or their deadline, and the model
+    calls that were cancelled as a result, with an estimate of the output
+    tokens they did not generate (the call type's recent average output,
+    minus whatever had already been streamed).
+    """
+
+    def __init__(self, window: int = 100):
+        self._window = window
+        self._requests: dict[str, dict] = {}
+        self._calls: dict[str, dict] = {}
+        self._output_tokens: dict[str, deque[int]] = {}
+
+    def record_request(self, endpoint: str, outcome: str):
+        """
+        outcome: "disconnected" or "deadline_exceeded".
+        """
+        entry = self._requests.setdefault(endpoint, {"disconnected": 0, "deadline_exceeded": 0})
+        entry[outcome] += 1
+
+    def record_output_tokens(self, call_type: str, tokens: int):
+        self._output_tokens.setdefault(call_type, deque(maxlen=self._window)).append(tokens)
+
+    def record_cancelled_call(self, call_type: str, tokens_received: int = 0):
+        recent = self._output_tokens.get(call_type)
+        expected = sum(recent) // len(recent) if recent else 0
+        entry = self._calls.setdefault(call_type, {"cancelled": 0, "estimated_tokens_saved": 0})
+        entry["cancelled"] += 1
+        entry["estimated_tokens_saved"] += max(0, expected - tokens_received)
+
+    def stats(self) -> dict:
+        return {
+            "requests": dict(sorted(self._requests.items())),
+            "model_calls": dict(sorted(self._calls.items())),
+            "cancelled_calls": sum(entry["cancelled"] for entry in self._calls.values()),
+            "estimated_tokens_saved": sum(entry["estimated_tokens_saved"] for entry in self._calls.values()),
+        }
+
+
+cancellation_stats = CancellationStats()
+
+
+class RequestScope:
+    """
+    Async context manager that ties the work inside it to the request:
+
+        async with request_scope(request, "create_exercise"):
+            ...
+
+    When the client disconnects or the endpoint's deadline
+    (REQUEST_DEADLINE_SECONDS) passes, the handler's task is cancelled,
+    the way asyncio.timeout does it, so whatever it awaits (model calls,
+    scheduler slots, DB queries) is cancelled and released. The scope
+    then raises ClientDisconnected or RequestDeadlineExceeded for the
+    handler to roll back and answer.
+
+    Enter it only after the request body has been read: the disconnect
+    watcher consumes the ASGI receive channel.
+    """
+
+    def __init__(self, request: Request, endpoint: str):
+        self._request = request
+        self._endpoint = endpoint
+        self._deadline = settings.REQUEST_DEADLINE_SECONDS.get(endpoint)
+        self._task: asyncio.Task | None = None
+        self._watcher: asyncio.Task | None = None
+        self._timeout = None
+        self._disconnected = False
+        self._exited = False
+
+    async def __aenter__(self):
+        self._task = asyncio.current_task()
+        if settings.REQUEST_CANCEL_ON_DISCONNECT:
+            self._watcher = asyncio.create_task(self._watch())
+        self._timeout = asyncio.timeout(self._deadline)
+        await self._timeout.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # No awaits before this point, so the watcher cannot cancel us late
+        self._exited = True
+        if self._watcher is not None:
+            self._watcher.cancel()
+
+        try:
+            await self._timeout.__aexit__(exc_type, exc, tb)
+        except TimeoutError:
+            cancellation_stats.record_request(self._endpoint, "deadline_exceeded")
+            raise RequestDeadlineExceeded(f"{self._endpoint} did not finish within {self._deadline}s") from None
+
+        if self._disconnected and exc_type is asyncio.CancelledError and self._task.uncancel() == 0:
+            cancellation_stats.record_request(self._endpoint, "disconnected")
+            raise ClientDisconnected(self._endpoint) from None
+        return False
+
+    async def _watch(self):
+        while True:
+            message = await self._request.receive()
+            if message["type"] == "http.disconnect":
+                break
+        if not self._exited:
+            self._disconnected = True
+            self._task.cancel()
+
+
+def request_scope(request: Request, endpoint: str) -> RequestScope:
+    return RequestScope(request, endpoint)
@@ -10,14 +10,257 @@ class Settings(BaseSettings):
     DEBUG: bool = False
 
     DATABASE_URL: str
+    # Optional explicit async URL; derived from DATABASE_URL when empty
+    ASYNC_DATABASE_URL: str = ""
+    DATABASE_POOL_SIZE: int = 10
+    DATABASE_MAX_OVERFLOW: int = 20
+    DATABASE_POOL_TIMEOUT: int = 30 # Seconds to wait for a free connection
+    DATABASE_POOL_RECYCLE: int = 1800
 
     SECRET_KEY: str = "your_secret_key"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7 
+    # Verified tokens and user snapshots, so authenticated requests skip the users query
+    AUTH_CACHE_ENABLED: bool = True
+    AUTH_CACHE_MAX_ENTRIES: int = 10_000
+    AUTH_CACHE_TTL_SECONDS: int = 60 # Bounds staleness across processes
 
-    # FIX: This requires the GOOGLE_API_KEY from the environment/dotenv.
-    # The old OPENAI_API_KEY field is REMOVED to prevent conflict.
-    GOOGLE_API_KEY: str
+    # --- METRICS ENDPOINT ---
+    # /api/metrics exposes internal state, so it is off unless enabled. With a
+    # token set, callers must send "Authorization: Bearer <METRICS_TOKEN>".
+    METRICS_ENABLED: bool = False
+    METRICS_TOKEN: str = ""
+
+    # --- PASSWORD HASHING (Argon2) ---
+    # Changing these rehashes each user's password on their next login
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536 # KiB
+    ARGON2_PARALLELISM: int = 4
+    PASSWORD_HASH_WORKERS: int = 2 # Processes dedicated to hashing
+    PASSWORD_HASH_MAX_QUEUE: int = 32 # Requests waiting beyond this get 503
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = 2
+    PASSWORD_HASH_WARM_UP_ON_STARTUP: bool = True
+
+    # --- ADMISSION CONTROL ---
+    # Per-user token buckets by endpoint class: sustained requests per minute
+    # and burst size. Premium users get PREMIUM_MULTIPLIER times both.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_HINT_PER_MINUTE: float = 20
+    RATE_LIMIT_HINT_BURST: int = 10
+    RATE_LIMIT_CHECK_PER_MINUTE: float = 30
+    RATE_LIMIT_CHECK_BURST: int = 15
+    RATE_LIMIT_ROADMAP_PER_MINUTE: float = 2
+    RATE_LIMIT_ROADMAP_BURST: int = 3
+    RATE_LIMIT_PREMIUM_MULTIPLIER: float = 2.0
+    RATE_LIMIT_MAX_BUCKETS: int = 50_000 # Least recently used buckets are dropped beyond this
+    # Global cap on concurrent model calls in this process
+    LLM_MAX_CONCURRENT_CALLS: int = 16
+    LLM_MAX_WAITING_CALLS: int = 64 # Calls queued beyond this are rejected at once
+    LLM_OVERLOAD_RETRY_AFTER_SECONDS: int = 5
+    # Weighted-fair queues in front of that cap (core/llm_scheduler.py): share of
+    # freed slots per class under load, and how long a call may wait before it is dropped
+    LLM_SCHEDULER_WEIGHTS: dict[str, float] = {
+        "interactive_premium": 8,
+        "interactive_free": 4,
+        "batch_premium": 2,
+        "batch_free": 1,
+    }
+    LLM_SCHEDULER_MAX_WAIT_SECONDS: dict[str, float] = {
+        "interactive_premium": 10,
+        "interactive_free": 8,
+        "batch_premium": 120,
+        "batch_free": 60,
+    }
+
+    # --- REQUEST CANCELLATION (core/cancellation.py) ---
+    # Stop the model calls and roll back the writes of a request whose client went away
+    REQUEST_CANCEL_ON_DISCONNECT: bool = True
+    # Whole-request deadlines by endpoint
+    REQUEST_DEADLINE_SECONDS: dict[str, float] = {
+        "create_exercise": 60,
+        "submit_answer": 45,
+    }
+
+    # --- LLM RESILIENCE (core/resilience.py) ---
+    # Deadline per call type (for streams, until the first chunk); others use the default
+    LLM_DEADLINE_SECONDS: dict[str, float] = {
+        "guidance_text": 20,
+        "guidance_multimodal": 40,
+        "check_answer": 15,
+        "explain_verdict": 15,
+        "roadmap": 90,
+    }
+    LLM_DEFAULT_DEADLINE_SECONDS: float = 30.0
+    # A call that has not answered by its type's p95 latency gets a second attempt
+    LLM_HEDGING_ENABLED: bool = True
+    LLM_HEDGE_DEFAULT_DELAY_SECONDS: float = 4.0 # Until 20 latencies are recorded
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 0.5
+    LLM_HEDGE_MAX_RATIO: float = 0.1 # Share of calls that may be hedged
+    # Hedges, failovers and calls made while a model's breaker is open go here;
+    # models without an entry are hedged against themselves
+    LLM_FALLBACK_MODELS: dict[str, str] = {
+        "gemini-2.5-flash": "gemini-2.5-flash-lite",
+        "gemini-2.5-flash-lite": "gemini-2.5-flash",
+    }
+    # Per-model circuit breaker: opens when ERROR_RATE of the last WINDOW calls failed
+    LLM_BREAKER_WINDOW: int = 20
+    LLM_BREAKER_MIN_CALLS: int = 10
+    LLM_BREAKER_ERROR_RATE: float = 0.5
+    LLM_BREAKER_COOLDOWN_SECONDS: float = 30.0
+
+    # --- LLM PROVIDER ---
+    # gemini, ollama, openai (any OpenAI-compatible endpoint) or fake (offline, core/fake_llm.py)
+    LLM_PROVIDER: str = "gemini"
+    # Required for the gemini provider, from the environment/dotenv.
+    GOOGLE_API_KEY: str = ""
+    OLLAMA_BASE_URL: str = "http://localhost:11434"
+    OPENAI_API_KEY: str = ""
+    OPENAI_BASE_URL: str = ""
+    # Model names are Gemini's; map them for other providers,
+    # e.g. {"gemini-2.5-flash": "llama3.2-vision", "gemini-2.5-flash-lite": "llama3.2"}
+    LLM_MODEL_ALIASES: dict[str, str] = {}
+    # Fake backend: latency to first token (fixed, uniform or lognormal around
+    # FAKE_LLM_LATENCY_MS), delay between streamed chunks, and injected failures
+    FAKE_LLM_LATENCY_DISTRIBUTION: str = "lognormal"
+    FAKE_LLM_LATENCY_MS: float = 400.0
+    FAKE_LLM_LATENCY_SPREAD: float = 0.5
+    FAKE_LLM_CHUNK_MS: float = 20.0
+    FAKE_LLM_FAILURE_RATE: float = 0.0
+    FAKE_LLM_SEED: int = 0
+
+    # --- LLM MODELS ---
+    GEMINI_MULTIMODAL_MODEL: str = "gemini-2.5-flash"
+    GEMINI_TEXT_MODEL: str = "gemini-2.5-flash-lite"
+    # Build every model client and chain at startup instead of on first request
+    LLM_WARM_UP_ON_STARTUP: bool = True
+    # Identical concurrent LLM requests share one call
+    LLM_SINGLEFLIGHT_ENABLED: bool = True
+
+    # --- MODEL ROUTER (core/model_router.py) ---
+    # Guidance calls go to the text (fast) or multimodal (strong) model by
+    # estimated complexity, unless the preferred one is outside its latency SLO
+    MODEL_ROUTER_ENABLED: bool = True
+    MODEL_ROUTER_COMPLEXITY_THRESHOLD: float = 0.5 # At or above: strong model
+    MODEL_ROUTER_LONG_PROMPT_CHARS: int = 600
+    MODEL_ROUTER_IMAGE_WEIGHT: float = 0.5
+    MODEL_ROUTER_SUBJECT_WEIGHTS: dict[str, float] = {
+        "tích phân": 0.35,
+        "nguyên hàm": 0.3,
+        "chứng minh": 0.4,
+        "hình học không gian": 0.4,
+        "xác suất": 0.2,
+        "tổ hợp": 0.2,
+        "giới hạn": 0.2,
+        "đạo hàm": 0.15,
+        "số phức": 0.2,
+        "ma trận": 0.3,
+        "integral": 0.35,
+        "prove": 0.4,
+        "probability": 0.2,
+        "limit": 0.2,
+        "derivative": 0.15,
+        "matrix": 0.3,
+    }
+    # p95 latency targets (streams: time to first chunk), over the last WINDOW seconds
+    MODEL_ROUTER_LATENCY_SLO_SECONDS: dict[str, float] = {
+        "guidance_text": 4,
+        "guidance_text:stream": 2,
+        "guidance_multimodal": 10,
+        "guidance_multimodal:stream": 4,
+    }
+    MODEL_ROUTER_DEFAULT_SLO_SECONDS: float = 5.0
+    MODEL_ROUTER_WINDOW_SECONDS: float = 300.0
+    MODEL_ROUTER_MIN_SAMPLES: int = 10
+    MODEL_ROUTER_MAX_ERROR_RATE: float = 0.2
+    # Decisions and their outcomes, as JSON lines ("" to disable)
+    MODEL_ROUTER_LOG_PATH: str = "data/model_routing.jsonl"
+    MODEL_ROUTER_LOG_FLUSH_EVERY: int = 100
+
+    # --- CHECK ANSWER MICRO-BATCHING (opt-in) ---
+    # Concurrent answer checks are collected for a few ms and sent together
+    CHECK_ANSWER_BATCHING_ENABLED: bool = False
+    CHECK_ANSWER_BATCH_MAX_SIZE: int = 8
+    CHECK_ANSWER_BATCH_MAX_WAIT_MS: float = 20.0
+    # "abatch": LangChain abatch (one request per item); "prompt": one multi-item request per
+    # batch, which puts several students' answers in one prompt
+    CHECK_ANSWER_BATCH_MODE: str = "abatch"
+
+    # --- STRUCTURED OUTPUT ---
+    # Have Gemini enforce the JSON schema (response_json_schema) instead of
+    # describing the format in every prompt
+    LLM_NATIVE_STRUCTURED_OUTPUT: bool = True
+    # Extra model calls when a reply cannot be parsed even after local repair
+    LLM_PARSE_RETRIES: int = 1
+
+    # --- LOCAL ANSWER VERIFIER ---
+    # Numeric / algebraic answers are checked with SymPy against a stored expected result
+    ANSWER_VERIFIER_ENABLED: bool = True
+    ANSWER_VERIFIER_REL_TOL: float = 1e-6
+    ANSWER_VERIFIER_ABS_TOL: float = 1e-9
+    # Feedback for locally decided answers: "canned" text, or "llm" to have the model write it
+    ANSWER_VERIFIER_EXPLANATION: str = "canned"
+    # SymPy runs in its own processes; a check still running after the timeout
+    # has its workers killed and the answer goes to the LLM
+    ANSWER_VERIFIER_WORKERS: int = 1
+    ANSWER_VERIFIER_MAX_QUEUE: int = 16
+    ANSWER_VERIFIER_TIMEOUT_SECONDS: float = 2.0
+    # Answer keys are extracted by the model, so by default a local "incorrect"
+    # is confirmed by the LLM; only "correct" is decided locally
+    ANSWER_VERIFIER_TRUST_INCORRECT: bool = False
+    # Extract the expected result in the background as soon as an exercise is created
+    # (one model call per exercise); otherwise on its first answer, for later ones
+    ANSWER_KEY_EXTRACT_ON_CREATE: bool = False
+
+    # --- HINT LADDER ---
+    HINT_LADDER_STEPS: int = 4
+    # Generate the ladder in the background as soon as an exercise is created (one
+    # model call per exercise, hint or not); otherwise on the first "next hint" request
+    HINT_LADDER_GENERATE_ON_CREATE: bool = False
+
+    # --- LLM RESPONSE CACHE ---
+    # Repeat exercises are answered from cache instead of a new Gemini call
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2048 # In-memory LRU tier
+    RESPONSE_CACHE_TTL_SECONDS: int = 60 * 60 * 24 * 7
+    RESPONSE_CACHE_PERSISTENT: bool = True # Database tier
+    RESPONSE_CACHE_PERSISTENT_MAX_ENTRIES: int = 50_000
+    # Persistent-tier hit counts are written in batches of this many hits
+    RESPONSE_CACHE_HITS_FLUSH_EVERY: int = 100
+
+    # --- SIMILAR EXERCISE SPECULATION (opt-in) ---
+    # Generate the next exercise while the answer is checked. On a wrong answer the
+    # result is "park"-ed in the response cache or "cancel"-led; "off" disables it.
+    # Every speculation is a model call, wasted unless the answer is correct.
+    SIMILAR_EXERCISE_SPECULATION: str = "off"
+    # Per-user budget of speculative calls (requests per minute, burst); answers
+    # beyond it are checked first and the suggestion generated only if correct
+    SIMILAR_EXERCISE_SPECULATION_PER_MINUTE: float = 2
+    SIMILAR_EXERCISE_SPECULATION_BURST: int = 2
+    # Also start generating it as soon as an exercise is created
+    SIMILAR_EXERCISE_PREFETCH_ON_CREATE: bool = False
+
+    # --- PRACTICE POOL ---
+    # Pre-generated practice exercises per source exercise, served before generating one.
+    # Refills spend the SIMILAR_EXERCISE_SPECULATION_* budget of the user who emptied the pool
+    PRACTICE_POOL_ENABLED: bool = False
+    PRACTICE_POOL_TARGET_DEPTH: int = 2 # Unserved exercises kept ready per source
+    PRACTICE_POOL_REFILL_CONCURRENCY: int = 2
+    PRACTICE_POOL_SWEEP_SECONDS: float = 300.0
+    # Fill a source's pool when the exercise is created, not only after its first use
+    PRACTICE_POOL_FILL_ON_CREATE: bool = False
+
+    # --- ROADMAP JOB WORKER ---
+    # Run the worker inside the API process; set to False when `python worker.py` runs separately
+    ROADMAP_WORKER_IN_PROCESS: bool = True
+    ROADMAP_WORKER_CONCURRENCY: int = 4 # Max roadmap jobs generating at once
+    ROADMAP_WORKER_POLL_SECONDS: float = 2.0
+    ROADMAP_JOB_MAX_ATTEMPTS: int = 3
+    ROADMAP_JOB_RETRY_BACKOFF_SECONDS: float = 10.0 # Doubled after every failed attempt
+    ROADMAP_JOB_STALE_SECONDS: int = 600 # `processing` jobs older than this are requeued
+    # Job status long-poll / SSE
+    ROADMAP_STATUS_MAX_WAIT_SECONDS: float = 60.0
+    # How often waiting clients re-read the job, for workers running in another process
+    ROADMAP_STATUS_RECHECK_SECONDS: float = 5.0
 
     # --- STRIPE KEYS (DISABLED) ---
     # Since these fields are commented out, Pydantic ignores them.
@@ -27,6 +270,34 @@ class Settings(BaseSettings):
     # STRIPE_WEBHOOK_SECRET: str
     # --- END STRIPE FIX ---
 
+    # --- IMAGE BLOB STORE ---
+    BLOB_STORE_DIR: str = "data/blobs"
+    # Memory-map blobs when reading them back instead of copying through read()
+    BLOB_STORE_USE_MMAP: bool = False
+    # Upload limits, enforced while the body is still being received
+    UPLOAD_MAX_IMAGE_BYTES: int = 10 * 1024 * 1024
+    UPLOAD_MAX_FIELD_BYTES: int = 64 * 1024
+
+    # --- IMAGE PREPROCESSING (before multimodal calls) ---
+    # The original upload is kept in the blob store; only the model gets the smaller copy
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_PREPROCESS_EXECUTOR: str = "thread" # "thread" or "process"
+    IMAGE_PREPROCESS_WORKERS: int = 2
+    IMAGE_MAX_DIMENSION: int = 1600 # Longest side, in pixels
+    IMAGE_TEXT_MODE: str = "grayscale" # "grayscale", "contrast" or "none"
+    IMAGE_JPEG_QUALITY: int = 80
+
+    # --- OCR TRANSCRIPTION CACHE ---
+    # A photo identical to one already transcribed reuses its problem text
+    OCR_CACHE_ENABLED: bool = True
+    # Also reuse it for near-duplicate photos (needs Pillow and preprocessing on).
+    # Off by default: a false match answers the wrong problem
+    OCR_CACHE_NEAR_DUPLICATES: bool = False
+    OCR_CACHE_MAX_DISTANCE: int = 2 # Hamming distance out of 256 bits
+    # ...and also within this distance on a 1024-bit hash, so only copies of the same photo match
+    OCR_CACHE_VERIFY_MAX_DISTANCE: int = 4
+    OCR_CACHE_REFRESH_SECONDS: float = 30.0 # Pick up photos indexed by other workers
+
     ALLOWED_ORIGINS: str = "" 
     
     class Config:
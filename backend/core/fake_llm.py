@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, ClassVar, Iterator
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# PydanticOutputParser embeds the schema between triple backticks
+_SCHEMA_IN_PROMPT_RE = re.compile(r"```\s*(\{.*\})\s*```", re.DOTALL)
+
+_WORDS = (
+    "hãy", "xét", "biểu", "thức", "đạo", "hàm", "phương", "trình", "bước", "tiếp",
+    "theo", "rút", "gọn", "thay", "giá", "trị", "kiểm", "tra", "điều", "kiện",
+)
+
+
+class FakeLLMError(RuntimeError):
+    """
+    Injected failure from the fake backend.
+    """
+
+
+def _message_text(messages: list[BaseMessage]) -> str:
+    parts = []
+    for message in messages:
+        content = message.content
+        if isinstance(content, str):
+            parts.append(content)
+            continue
+        for block in content:
+            if isinstance(block, str):
+                parts.append(block)
+            elif block.get("type") == "text":
+                parts.append(block.get("text", ""))
+            elif "data" in block or "image_url" in block:
+                parts.append("[image]")
+    return "\n".join(parts)
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[:1].upper() + text[1:] + "."
+
+
+class _SchemaFaker:
+    """
+    Schema-valid JSON from a JSON schema, driven by a seeded RNG.
+    """
+
+    def __init__(self, schema: dict, rng: random.Random):
+        self.defs = schema.get("$defs", {})
+        self.rng = rng
+
+    def value(self, schema: dict, name: str = "") -> Any:
+        if "$ref" in schema:
+            return self.value(self.defs[schema["$ref"].rsplit("/", 1)[-1]], name)
+        if "anyOf" in schema:
+            options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+            return self.value(options[0] if options else {"type": "null"}, name)
+        if "enum" in schema:
+            return self.rng.choice(schema["enum"])
+
+        # Format instructions drop the top-level "type"
+        kind = schema.get("type") or ("object" if "properties" in schema else "string")
+        if kind == "object":
+            return {
+                key: self.value(prop, key)
+                for key, prop in schema.get("properties", {}).items()
+            }
+        if kind == "array":
+            count = self.rng.randint(max(1, schema.get("minItems", 1)), max(1, schema.get("maxItems", 3)))
+            return [self.value(schema.get("items", {}), name) for _ in range(count)]
+        if kind == "boolean":
+            return self.rng.random() < 0.5
+        if kind == "integer":
+            return self.rng.randint(1, 3)
+        if kind == "number":
+            return round(self.rng.uniform(0, 10), 2)
+        if kind == "null":
+            return None
+        return self.text(name)
+
+    def text(self, name: str) -> str:
+        if name == "explanation":
+            # Matches the verdict wording the prompts ask for
+            return "Chưa hoàn toàn chính xác. " + _sentence(self.rng, 12)
+        return _sentence(self.rng, self.rng.randint(4, 14))
+
+    def document(self, schema: dict) -> dict:
+        document = self.value(schema)
+        # Keep the verdict and its explanation consistent
+        if isinstance(document, dict) and document.get("is_correct") is True and "explanation" in document:
+            document["explanation"] = "Tuyệt vời! Bạn đã làm đúng. " + _sentence(self.rng, 10)
+        return document
+
+
+class FakeTutorChatModel(BaseChatModel):
+    """
+    Offline stand-in for a chat model, for load tests without network.
+
+    The reply depends only on the prompt (and `seed`): JSON that validates
+    against the requested schema for structured calls (passed as
+    response_json_schema / response_format / format, or found in the
+    prompt's format instructions), otherwise a short Vietnamese hint, with
+    the [ĐỀ BÀI]/[GỢI Ý] markers when the prompt asks for them.
+
+    Latency and failures are drawn from a seeded RNG shared by all calls:
+    time to first token from the configured distribution, then one chunk
+    every `chunk_ms` when streaming.
+    """
+
+    model_name: str = "fake"
+    latency_distribution: str = "lognormal" # fixed, uniform or lognormal
+    latency_ms: float = 400.0 # Median (lognormal) or mean (fixed, uniform)
+    latency_spread: float = 0.5 # sigma (lognormal) or +/- fraction (uniform)
+    chunk_ms: float = 20.0
+    failure_rate: float = 0.0
+    seed: int = 0
+
+    _rng: random.Random | None = None
+    _lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-tutor"
+
+    # --- Randomness ---
+    def _shared_rng(self) -> random.Random:
+        if self._rng is None:
+            self._rng = random.Random(self.seed)
+        return self._rng
+
+    def _draw_latency(self) -> float:
+        with self._lock:
+            rng = self._shared_rng()
+            if self.latency_distribution == "fixed":
+                latency = self.latency_ms
+            elif self.latency_distribution == "uniform":
+                latency = self.latency_ms * rng.uniform(1 - self.latency_spread, 1 + self.latency_spread)
+            else:
+                latency = rng.lognormvariate(0, self.latency_spread) * self.latency_ms
+        return max(0.0, latency) / 1000
+
+    def _should_fail(self) -> bool:
+        if self.failure_rate <= 0:
+            return False
+        with self._lock:
+            return self._shared_rng().random() < self.failure_rate
+
+    def _content_rng(self, prompt: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}:{self.model_name}:{prompt}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    # --- Replies ---
+    def _schema(self, prompt: str, kwargs: dict) -> dict | None:
+        schema = kwargs.get("response_json_schema") or kwargs.get("format")
+        response_format = kwargs.get("response_format")
+        if schema is None and isinstance(response_format, dict):
+            schema = response_format.get("json_schema", {}).get("schema")
+        if schema is None:
+            match = _SCHEMA_IN_PROMPT_RE.search(prompt)
+            if match:
+                try:
+                    schema = json.loads(match.group(1))
+                except json.JSONDecodeError:
+                    schema = None
+        return schema if isinstance(schema, dict) else None
+
+    def _reply(self, messages: list[BaseMessage], kwargs: dict) -> str:
+        prompt = _message_text(messages)
+        rng = self._content_rng(prompt)
+        schema = self._schema(prompt, kwargs)
+        if schema is not None:
+            return json.dumps(_SchemaFaker(schema, rng).document(schema), ensure_ascii=False)
+
+        hint = " ".join(_sentence(rng, rng.randint(6, 12)) for _ in range(rng.randint(2, 4)))
+        if "[ĐỀ BÀI]" in prompt:
+            return f"[ĐỀ BÀI]\n{_sentence(rng, 8)}\n\n[GỢI Ý]\n{hint}"
+        return hint
+
+    def _usage(self, messages: list[BaseMessage], reply: str) -> dict:
+        # ~4 characters per token
+        input_tokens = len(_message_text(messages)) // 4
+        output_tokens = len(reply) // 4
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+    def _chunks(self, reply: str) -> list[str]:
+        return re.findall(r"\S+\s*|\s+", reply) or [reply]
+
+    # --- BaseChatModel ---
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._draw_latency())
+        if self._should_fail():
+            raise FakeLLMError("Injected failure")
+        reply = self._reply(messages, kwargs)
+        message = AIMessage(content=reply, usage_metadata=self._usage(messages, reply))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self._draw_latency())
+        if self._should_fail():
+            raise FakeLLMError("Injected failure")
+        reply = self._reply(messages, kwargs)
+        message = AIMessage(content=reply, usage_metadata=self._usage(messages, reply))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self._draw_latency())
+        if self._should_fail():
+            raise FakeLLMError("Injected failure")
+        for chunk in self._chunks(self._reply(messages, kwargs)):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+            time.sleep(self.chunk_ms / 1000)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self._draw_latency())
+        if self._should_fail():
+            raise FakeLLMError("Injected failure")
+        reply = self._reply(messages, kwargs)
+        chunks = self._chunks(reply)
+        for i, chunk in enumerate(chunks):
+            usage = self._usage(messages, reply) if i == len(chunks) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk, usage_metadata=usage))
+            await asyncio.sleep(self.chunk_ms / 1000)
@@ -0,0 +1,176 @@
+import asyncio
+from datetime import datetime, UTC
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from core.config import settings
+from core.llm_scheduler import llm_class
+from core.ocr_cache import split_transcribed_guidance
+from core.tutor_service import TutorService
+from db.database import AsyncSessionLocal
+from models.exercise import HintStep
+
+
+def first_hint_of(initial_guidance: str) -> str:
+    """
+    The hint part of an exercise's first interaction (photo exercises also
+    carry the transcribed problem).
+    """
+    _, hint = split_transcribed_guidance(initial_guidance)
+    return hint
+
+
+class HintLadder:
+    """
+    Progressively stronger hints per exercise, generated in one LLM call and
+    stored as `hint_steps` rows.
+
+    The ladder is generated in the background after the first hint (or on
+    the first request for one), so "next hint" is usually a plain DB read.
+    Each exercise is generated at most once at a time in this process; a
+    ladder stored by another worker first wins on the unique
+    (exercise_id, level) constraint.
+    """
+
+    def __init__(self, steps: int):
+        self.steps = steps
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._stats = {
+            "ladders_generated": 0,
+            "served": 0,
+            "waited_for_generation": 0,
+            "exhausted": 0,
+            "failed": 0,
+        }
+
+    # --- Generation ---
+    def schedule(
+        self,
+        exercise_id: int,
+        exercise_content: str,
+        first_hint: str,
+        premium: bool = False,
+        interactive: bool = False
+    ) -> asyncio.Task:
+        """
+        Generate the ladder in a task of its own. Its model call is
+        scheduled as batch work unless someone is waiting for it.
+        """
+        task = self._tasks.get(exercise_id)
+        if task is None:
+            task = asyncio.create_task(
+                self._generate(exercise_id, exercise_content, first_hint, premium, interactive)
+            )
+            self._tasks[exercise_id] = task
+            task.add_done_callback(lambda done: self._finished(exercise_id, done))
+        return task
+
+    def _finished(self, exercise_id: int, task: asyncio.Task):
+        self._tasks.pop(exercise_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            self._stats["failed"] += 1
+            print(f"Hint ladder generation failed for exercise {exercise_id}: {task.exception()}")
+
+    async def _has_ladder(self, exercise_id: int) -> bool:
+        async with AsyncSessionLocal() as db:
+            found = (await db.execute(
+                select(HintStep.id).where(HintStep.exercise_id == exercise_id).limit(1)
+            )).scalar_one_or_none()
+        return found is not None
+
+    async def _generate(
+        self,
+        exercise_id: int,
+        exercise_content: str,
+        first_hint: str,
+        premium: bool,
+        interactive: bool
+    ):
+        if await self._has_ladder(exercise_id):
+            return
+
+        # Set here, not inherited: the task copies the creating request's class
+        with llm_class(interactive=interactive, premium=premium):
+            ladder = await TutorService.get_hint_ladder(exercise_content, first_hint)
+        hints = [hint.strip() for hint in ladder.hints if hint.strip()][:self.steps]
+        if not hints:
+            raise ValueError("The model returned no hints")
+
+        async with AsyncSessionLocal() as db:
+            db.add_all([
+                HintStep(exercise_id=exercise_id, level=level, content=hint)
+                for level, hint in enumerate(hints, start=1)
+            ])
+            try:
+                await db.commit()
+            except IntegrityError:
+                # Another worker stored this exercise's ladder first
+                await db.rollback()
+                return
+        self._stats["ladders_generated"] += 1
+
+    # --- Serving ---
+    async def _reveal(self, db: AsyncSession, exercise_id: int) -> HintStep | None:
+        candidates = (await db.execute(
+            select(HintStep)
+            .where(HintStep.exercise_id == exercise_id, HintStep.revealed_at.is_(None))
+            .order_by(HintStep.level)
+            .limit(3)
+        )).scalars().all()
+        for step in candidates:
+            # Conditional UPDATE, so two concurrent requests never get the same hint
+            revealed_at = datetime.now(UTC)
+            result = await db.execute(
+                update(HintStep)
+                .where(HintStep.id == step.id, HintStep.revealed_at.is_(None))
+                .values(revealed_at=revealed_at)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 1:
+                set_committed_value(step, "revealed_at", revealed_at)
+                return step
+        return None
+
+    async def next_hint(
+        self,
+        db: AsyncSession,
+        exercise_id: int,
+        exercise_content: str,
+        first_hint: str,
+        premium: bool = False
+    ) -> tuple[HintStep | None, int]:
+        """
+        Mark the next hint as revealed and return it with the number of hints
+        left after it; (None, 0) once the ladder is used up. The caller commits.
+        """
+        step = await self._reveal(db, exercise_id)
+        if step is None and not await self._has_ladder(exercise_id):
+            self._stats["waited_for_generation"] += 1
+            # Shielded: a client that disconnects does not throw the ladder away
+            await asyncio.shield(
+                self.schedule(exercise_id, exercise_content, first_hint, premium, interactive=True)
+            )
+            step = await self._reveal(db, exercise_id)
+
+        if step is None:
+            self._stats["exhausted"] += 1
+            return None, 0
+
+        self._stats["served"] += 1
+        total = (await db.execute(
+            select(func.max(HintStep.level)).where(HintStep.exercise_id == exercise_id)
+        )).scalar_one()
+        return step, total - step.level
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "generating": len(self._tasks),
+            "steps": self.steps,
+        }
+
+
+hint_ladder = HintLadder(steps=settings.HINT_LADDER_STEPS)
@@ -0,0 +1,204 @@
+import asyncio
+import io
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+from core.blob_store import sniff_image_mime
+from core.config import settings
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it images are sent as uploaded
+    Image = None
+    ImageOps = None
+
+
+@dataclass
+class PreprocessedImage:
+    data: bytes
+    mime: str
+    original_bytes: int
+    processed_bytes: int
+    width: int | None = None
+    height: int | None = None
+    source_format: str | None = None
+    # 256-bit perceptual hash of the photo, and a 1024-bit one to verify
+    # matches with (see image_dhash)
+    dhash: int | None = None
+    fine_dhash: int | None = None
+
+
+def image_dhash(img, size: int = 16) -> int:
+    """
+    size*size-bit difference hash: each bit says whether a pixel of a
+    (size+1) x size grayscale thumbnail is brighter than its right
+    neighbour. Comparing neighbours makes it insensitive to exposure and
+    lighting; a small border is trimmed first so a re-encoded or barely
+    cropped copy still hashes alike. The classic 8x8 hash maps most
+    worksheets to nearly the same value, hence the larger default.
+    """
+    width, height = img.size
+    margin_x, margin_y = int(width * 0.04), int(height * 0.04)
+    small = (
+        img.crop((margin_x, margin_y, width - margin_x, height - margin_y))
+        .convert("L")
+        .resize((size + 1, size), Image.Resampling.BILINEAR)
+    )
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def preprocess_image(
+    data: bytes,
+    max_dimension: int,
+    text_mode: str,
+    quality: int,
+) -> PreprocessedImage:
+    """
+    Shrink a photo of an exercise before it is sent to the model:
+    auto-orient from EXIF, drop all metadata, downscale so the longest side
+    is at most `max_dimension`, optionally convert to grayscale / stretch
+    contrast for text, and re-encode as JPEG at `quality`.
+
+    Top-level function so it can run in a process pool.
+    """
+    original_mime = sniff_image_mime(data[:16]) or "image/jpeg"
+    untouched = PreprocessedImage(
+        data=data,
+        mime=original_mime,
+        original_bytes=len(data),
+        processed_bytes=len(data),
+    )
+    if Image is None:
+        return untouched
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            source_format = img.format
+            # Rotate according to the EXIF orientation, then forget the EXIF
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+            dhash = image_dhash(img)
+            fine_dhash = image_dhash(img, size=32)
+
+            if text_mode == "grayscale":
+                img = ImageOps.autocontrast(img.convert("L"), cutoff=1)
+            elif text_mode == "contrast":
+                img = ImageOps.autocontrast(img.convert("RGB"), cutoff=1)
+            elif img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+
+            out = io.BytesIO()
+            # No exif= argument, so no metadata is written back
+            img.save(out, format="JPEG", quality=quality, optimize=True)
+            width, height = img.size
+    except Exception:
+        # Formats Pillow cannot decode (e.g. HEIC without a plugin) go as-is
+        return untouched
+
+    processed = out.getvalue()
+    if len(processed) >= len(data) and max(width, height) < max_dimension:
+        # Already small; re-encoding did not help
+        untouched.width, untouched.height = width, height
+        untouched.source_format = source_format
+        untouched.dhash = dhash
+        untouched.fine_dhash = fine_dhash
+        return untouched
+
+    return PreprocessedImage(
+        data=processed,
+        mime="image/jpeg",
+        original_bytes=len(data),
+        processed_bytes=len(processed),
+        width=width,
+        height=height,
+        source_format=source_format,
+        dhash=dhash,
+        fine_dhash=fine_dhash,
+    )
+
+
+class ImagePipeline:
+    """
+    Runs preprocess_image off the event loop, in a thread or process pool,
+    and keeps before/after byte counters.
+    """
+
+    def __init__(self, executor_kind: str, workers: int):
+        self.executor_kind = executor_kind
+        self.workers = workers
+        self._executor: Executor | None = None
+        self._stats = {
+            "images": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "unchanged": 0,
+            "total_ms": 0.0,
+        }
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="image-pipeline"
+                )
+        return self._executor
+
+    async def process(self, data: bytes) -> PreprocessedImage:
+        if not settings.IMAGE_PREPROCESS_ENABLED:
+            return PreprocessedImage(
+                data=data,
+                mime=sniff_image_mime(data[:16]) or "image/jpeg",
+                original_bytes=len(data),
+                processed_bytes=len(data),
+            )
+
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            self._get_executor(),
+            preprocess_image,
+            data,
+            settings.IMAGE_MAX_DIMENSION,
+            settings.IMAGE_TEXT_MODE,
+            settings.IMAGE_JPEG_QUALITY,
+        )
+
+        self._stats["images"] += 1
+        self._stats["bytes_in"] += result.original_bytes
+        self._stats["bytes_out"] += result.processed_bytes
+        self._stats["total_ms"] += (time.perf_counter() - started) * 1000
+        if result.data is data:
+            self._stats["unchanged"] += 1
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        images = self._stats["images"]
+        bytes_in = self._stats["bytes_in"]
+        return {
+            **self._stats,
+            "total_ms": round(self._stats["total_ms"], 1),
+            "avg_ms": round(self._stats["total_ms"] / images, 1) if images else 0.0,
+            "size_ratio": round(self._stats["bytes_out"] / bytes_in, 4) if bytes_in else 0.0,
+            "pillow_available": Image is not None,
+        }
+
+
+image_pipeline = ImagePipeline(
+    executor_kind=settings.IMAGE_PREPROCESS_EXECUTOR,
+    workers=settings.IMAGE_PREPROCESS_WORKERS,
+)
@@ -0,0 +1,215 @@
+import json
+import re
+import types
+import typing
+from typing import Any
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import BaseOutputParser
+from pydantic import BaseModel, ValidationError
+
+_FENCE_RE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+_TRUE_WORDS = {"true", "yes", "correct", "đúng", "1"}
+_FALSE_WORDS = {"false", "no", "incorrect", "sai", "0"}
+
+
+def _cut_json(text: str) -> str:
+    """
+    The outermost JSON value in `text`, dropping any prose or code fence
+    around it. A value the model did not finish is returned up to the end.
+    """
+    text = _FENCE_RE.sub("", text.strip())
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return text
+    text = text[min(starts):]
+
+    depth = 0
+    in_string = escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[:i + 1]
+    return text
+
+
+def _balance(text: str) -> str:
+    """
+    Close an unterminated string and any brackets left open, e.g. after
+    the output was cut off at the token limit.
+    """
+    stack = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(",")
+    if text.endswith(":"):
+        text += " null"
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> Any:
+    """
+    Best-effort parse of a model's almost-JSON reply. Raises ValueError
+    when nothing usable is left.
+    """
+    candidate = _cut_json(text)
+    for attempt in (candidate, _balance(candidate)):
+        try:
+            return json.loads(_TRAILING_COMMA_RE.sub(r"\1", attempt))
+        except json.JSONDecodeError:
+            continue
+    raise ValueError("No JSON value could be recovered")
+
+
+def _coerce(annotation, value):
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin in (list, typing.List):
+        item_type = args[0] if args else Any
+        if isinstance(value, (str, dict)):
+            value = [value]
+        if isinstance(value, list):
+            return [_coerce(item_type, item) for item in value]
+        return value
+    if origin in (typing.Union, types.UnionType):
+        # Optional[X]: coerce as X
+        non_null = [arg for arg in args if arg is not type(None)]
+        return _coerce(non_null[0], value) if len(non_null) == 1 and value is not None else value
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return coerce_fields(annotation, value) if isinstance(value, dict) else value
+    if annotation is bool and isinstance(value, str):
+        word = value.strip().lower()
+        if word in _TRUE_WORDS:
+            return True
+        if word in _FALSE_WORDS:
+            return False
+    if annotation is str and isinstance(value, (int, float, bool)):
+        return str(value)
+    if annotation is str and isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return "\n".join(value)
+    return value
+
+
+def coerce_fields(schema: type[BaseModel], data: dict) -> dict:
+    """
+    Lenient field matching for a model reply: keys are matched case- and
+    separator-insensitively, and values are coerced to the field's type
+    where the intent is unambiguous ("true" -> True, "x" -> ["x"], ...).
+    """
+    def simplify(name: str) -> str:
+        return name.replace("_", "").replace("-", "").replace(" ", "").lower()
+
+    by_key = {simplify(key): value for key, value in data.items()}
+    coerced = {}
+    for name, field in schema.model_fields.items():
+        if name in data:
+            value = data[name]
+        elif simplify(name) in by_key:
+            value = by_key[simplify(name)]
+        else:
+            continue
+        coerced[name] = _coerce(field.annotation, value)
+    return coerced
+
+
+class StructuredOutputStats:
+    def __init__(self):
+        self._calls: dict[str, dict] = {}
+
+    def record(self, call_type: str, outcome: str, tokens_saved: int = 0):
+        """
+        outcome: "clean", "repaired" or "failed".
+        """
+        entry = self._calls.setdefault(call_type, {
+            "clean": 0,
+            "repaired": 0,
+            "failed": 0,
+            "input_tokens_saved": 0,
+        })
+        entry[outcome] += 1
+        entry["input_tokens_saved"] += tokens_saved
+
+    def stats(self) -> dict:
+        result = {}
+        for call_type, entry in sorted(self._calls.items()):
+            parsed = entry["clean"] + entry["repaired"] + entry["failed"]
+            result[call_type] = {
+                **entry,
+                "parse_failure_rate": round((entry["repaired"] + entry["failed"]) / parsed, 4) if parsed else 0.0,
+            }
+        return result
+
+
+structured_output_stats = StructuredOutputStats()
+
+
+class RepairingOutputParser(BaseOutputParser):
+    """
+    Pydantic output parser that repairs before it gives up: strict
+    validation first, then JSON repair plus lenient field coercion. Raises
+    OutputParserException only when both fail, so the chain can retry.
+    """
+
+    pydantic_object: type[BaseModel]
+    call_type: str
+    # Estimated input tokens no longer spent on format instructions, per call
+    tokens_saved: int = 0
+
+    def parse(self, text: str) -> BaseModel:
+        try:
+            result = self.pydantic_object.model_validate_json(text)
+            structured_output_stats.record(self.call_type, "clean", self.tokens_saved)
+            return result
+        except ValidationError:
+            pass
+
+        try:
+            data = repair_json(text)
+            if isinstance(data, list) and len(data) == 1:
+                data = data[0]
+            if not isinstance(data, dict):
+                raise ValueError(f"Expected a JSON object, got {type(data).__name__}")
+            result = self.pydantic_object.model_validate(coerce_fields(self.pydantic_object, data))
+        except (ValueError, ValidationError) as e:
+            structured_output_stats.record(self.call_type, "failed", self.tokens_saved)
+            raise OutputParserException(
+                f"Could not parse {self.pydantic_object.__name__} from model output: {e}",
+                llm_output=text
+            )
+        structured_output_stats.record(self.call_type, "repaired", self.tokens_saved)
+        return result
+
+    @property
+    def _type(self) -> str:
+        return "repairing_pydantic"
@@ -0,0 +1,91 @@
+import base64
+
+from core.config import settings
+
+# Values for Settings.LLM_PROVIDER
+GEMINI = "gemini"
+OLLAMA = "ollama"
+OPENAI = "openai" # Any OpenAI-compatible endpoint (OPENAI_BASE_URL)
+FAKE = "fake" # Offline, deterministic (core/fake_llm.py)
+PROVIDERS = (GEMINI, OLLAMA, OPENAI, FAKE)
+
+
+def provider_model_name(model_name: str) -> str:
+    """
+    The configured models are named after Gemini's; other providers map
+    them through LLM_MODEL_ALIASES.
+    """
+    return settings.LLM_MODEL_ALIASES.get(model_name, model_name)
+
+
+def build_chat_model(model_name: str):
+    """
+    Build the LangChain chat model for `model_name` with the configured provider.
+    Provider packages are only imported when selected.
+    """
+    provider = settings.LLM_PROVIDER
+    name = provider_model_name(model_name)
+
+    if provider == GEMINI:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        if not settings.GOOGLE_API_KEY:
+            raise RuntimeError("GOOGLE_API_KEY must be set to use the gemini provider")
+        return ChatGoogleGenerativeAI(
+            model=name,
+            google_api_key=settings.GOOGLE_API_KEY
+        )
+
+    if provider == OLLAMA:
+        from langchain_ollama import ChatOllama
+        return ChatOllama(model=name, base_url=settings.OLLAMA_BASE_URL)
+
+    if provider == OPENAI:
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            model=name,
+            api_key=settings.OPENAI_API_KEY or "unused",
+            base_url=settings.OPENAI_BASE_URL or None
+        )
+
+    if provider == FAKE:
+        from core.fake_llm import FakeTutorChatModel
+        return FakeTutorChatModel(
+            model_name=name,
+            latency_distribution=settings.FAKE_LLM_LATENCY_DISTRIBUTION,
+            latency_ms=settings.FAKE_LLM_LATENCY_MS,
+            latency_spread=settings.FAKE_LLM_LATENCY_SPREAD,
+            chunk_ms=settings.FAKE_LLM_CHUNK_MS,
+            failure_rate=settings.FAKE_LLM_FAILURE_RATE,
+            seed=settings.FAKE_LLM_SEED
+        )
+
+    raise ValueError(f"Unknown LLM_PROVIDER {provider!r}, expected one of {', '.join(PROVIDERS)}")
+
+
+def bind_json_schema(llm, schema):
+    """
+    Constrain `llm`'s reply to the JSON schema of the Pydantic model
+    `schema`, in each provider's own way.
+    """
+    json_schema = schema.model_json_schema()
+    provider = settings.LLM_PROVIDER
+    if provider == OLLAMA:
+        return llm.bind(format=json_schema)
+    if provider == OPENAI:
+        return llm.bind(response_format={
+            "type": "json_schema",
+            "json_schema": {"name": schema.__name__, "schema": json_schema}
+        })
+    # Gemini, and the fake backend which reads the same argument
+    return llm.bind(response_mime_type="application/json", response_json_schema=json_schema)
+
+
+def image_block(mime: str, data: bytes) -> dict:
+    """
+    Message content block for an image. Gemini takes raw bytes as inline
+    data; the other providers only accept a base64 data URL.
+    """
+    if settings.LLM_PROVIDER in (GEMINI, FAKE):
+        return {"type": "media", "mime_type": mime, "data": data}
+    encoded = base64.b64encode(data).decode("ascii")
+    return {"type": "image_url", "image_url": {"url": f"data:{mime};base64,{encoded}"}}
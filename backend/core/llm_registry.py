@@ -0,0 +1,98 @@
+import threading
+from typing import Any, Callable
+
+from core.admission import GovernedModel
+from core.llm_scheduler import llm_scheduler
+from core.llm_providers import build_chat_model
+
+
+class LLMRegistry:
+    """
+    Process-wide registry of chat model clients and precompiled chains.
+
+    Each model client and each prompt | llm | parser chain is built once and
+    then shared by every request. LangChain runnables are stateless between
+    calls, so sharing them across concurrent requests is safe; the lock only
+    guards construction. Every model is wrapped so its calls go through the
+    global scheduler (core/llm_scheduler.py).
+    """
+
+    _lock = threading.Lock()
+    _models: dict[str, Any] = {}
+    _chains: dict[str, Any] = {}
+    _stats = {
+        "models_built": 0,
+        "models_reused": 0,
+        "chains_built": 0,
+        "chains_reused": 0,
+    }
+
+    @classmethod
+    def _build_model(cls, model_name: str):
+        return GovernedModel(build_chat_model(model_name), llm_scheduler)
+
+    @classmethod
+    def get_model(cls, model_name: str):
+        """
+        Return the shared client for `model_name`, building it on first use.
+        """
+        model = cls._models.get(model_name)
+        if model is not None:
+            cls._stats["models_reused"] += 1
+            return model
+
+        with cls._lock:
+            # Another thread may have built it while we waited for the lock
+            model = cls._models.get(model_name)
+            if model is None:
+                model = cls._build_model(model_name)
+                cls._models[model_name] = model
+                cls._stats["models_built"] += 1
+            else:
+                cls._stats["models_reused"] += 1
+        return model
+
+    @classmethod
+    def get_chain(cls, name: str, builder: Callable[[], Any]):
+        """
+        Return the shared chain registered under `name`.
+        `builder` is only called the first time the chain is requested.
+        """
+        chain = cls._chains.get(name)
+        if chain is not None:
+            cls._stats["chains_reused"] += 1
+            return chain
+
+        with cls._lock:
+            chain = cls._chains.get(name)
+            if chain is not None:
+                cls._stats["chains_reused"] += 1
+                return chain
+
+        # Build outside the lock: builders call get_model(), which takes it too
+        chain = builder()
+        with cls._lock:
+            existing = cls._chains.get(name)
+            if existing is not None:
+                cls._stats["chains_reused"] += 1
+                return existing
+            cls._chains[name] = chain
+            cls._stats["chains_built"] += 1
+        return chain
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            **cls._stats,
+            "models": sorted(cls._models),
+            "chains": sorted(cls._chains),
+        }
+
+    @classmethod
+    def reset(cls):
+        """
+        Drop every cached client and chain (used when settings change).
+        """
+        with cls._lock:
+            cls._models.clear()
+            cls._chains.clear()
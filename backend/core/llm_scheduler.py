@@ -0,0 +1,236 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from core.config import settings
+
+# Scheduling classes: interactive (hints, answer checks) vs batch (roadmaps,
+# background generation), each split by tier
+INTERACTIVE_PREMIUM = "interactive_premium"
+INTERACTIVE_FREE = "interactive_free"
+BATCH_PREMIUM = "batch_premium"
+BATCH_FREE = "batch_free"
+CLASSES = (INTERACTIVE_PREMIUM, INTERACTIVE_FREE, BATCH_PREMIUM, BATCH_FREE)
+
+# Class of the model calls made by the current request or background task.
+# Tasks inherit it from whoever created them (including singleflight leaders).
+_current_class: ContextVar[str] = ContextVar("llm_class", default=BATCH_FREE)
+
+
+def class_for(interactive: bool, premium: bool) -> str:
+    if interactive:
+        return INTERACTIVE_PREMIUM if premium else INTERACTIVE_FREE
+    return BATCH_PREMIUM if premium else BATCH_FREE
+
+
+def set_llm_class(interactive: bool, premium: bool):
+    """
+    Set the class for the rest of the current request.
+    """
+    _current_class.set(class_for(interactive, premium))
+
+
+@contextmanager
+def llm_class(interactive: bool, premium: bool):
+    token = _current_class.set(class_for(interactive, premium))
+    try:
+        yield
+    finally:
+        _current_class.reset(token)
+
+
+class LLMOverloaded(Exception):
+    """
+    Raised when a model call cannot be scheduled in time.
+    """
+    def __init__(self, retry_after: float):
+        super().__init__("Too many model calls in flight")
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("future", "enqueued_at", "deadline")
+
+    def __init__(self, future: asyncio.Future, enqueued_at: float, deadline: float):
+        self.future = future
+        self.enqueued_at = enqueued_at
+        self.deadline = deadline
+
+
+class _Queue:
+    def __init__(self, weight: float, max_wait: float):
+        self.weight = weight
+        self.max_wait = max_wait
+        self.waiters: deque[_Waiter] = deque()
+        # Stride scheduling: the queue with the lowest pass goes next, and
+        # each dispatch advances it by 1 / weight
+        self.pass_value = 0.0
+        self.stats = {
+            "dispatched": 0,
+            "expired": 0,
+            "rejected": 0,
+            "wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+        }
+
+
+class LLMScheduler:
+    """
+    Process-wide cap on concurrent model calls, with a weighted-fair queue
+    per class in front of it.
+
+    When all `max_concurrent` slots are busy, calls wait in their class's
+    queue. A freed slot goes to the non-empty queue with the lowest pass
+    value (stride scheduling), so under load each class gets slots in
+    proportion to its weight and none starves. Each class has a deadline:
+    work that waited longer than that is dropped with LLMOverloaded
+    instead of being sent late.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_waiting: int,
+        weights: dict[str, float],
+        max_wait: dict[str, float],
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self._queues = {
+            name: _Queue(max(weights.get(name, 1), 0.01), max_wait.get(name, 10.0))
+            for name in CLASSES
+        }
+        self._in_flight = 0
+        self._waiting = 0
+        self._stats = {
+            "calls": 0,
+            "queued": 0,
+            "peak_in_flight": 0,
+        }
+
+    def _grant(self):
+        self._in_flight += 1
+        self._stats["calls"] += 1
+        self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._in_flight)
+
+    def _next_queue(self) -> _Queue | None:
+        active = [queue for queue in self._queues.values() if queue.waiters]
+        return min(active, key=lambda queue: queue.pass_value) if active else None
+
+    def _dispatch(self):
+        now = time.monotonic()
+        while self._in_flight < self.max_concurrent:
+            queue = self._next_queue()
+            if queue is None:
+                return
+            waiter = queue.waiters.popleft()
+            self._waiting -= 1
+            if waiter.future.done():
+                continue
+            if waiter.deadline <= now:
+                # Too stale to be worth sending
+                queue.stats["expired"] += 1
+                waiter.future.set_exception(LLMOverloaded(settings.LLM_OVERLOAD_RETRY_AFTER_SECONDS))
+                continue
+            queue.pass_value += 1 / queue.weight
+            self._record_wait(queue, now - waiter.enqueued_at)
+            self._grant()
+            waiter.future.set_result(None)
+
+    def _record_wait(self, queue: _Queue, waited: float):
+        queue.stats["dispatched"] += 1
+        queue.stats["wait_ms"] += waited * 1000
+        queue.stats["max_wait_ms"] = max(queue.stats["max_wait_ms"], waited * 1000)
+
+    def _release(self):
+        self._in_flight -= 1
+        self._dispatch()
+
+    async def _acquire(self, queue: _Queue):
+        if self._in_flight < self.max_concurrent and self._waiting == 0:
+            self._record_wait(queue, 0.0)
+            self._grant()
+            return
+
+        if self._waiting >= self.max_waiting:
+            queue.stats["rejected"] += 1
+            raise LLMOverloaded(settings.LLM_OVERLOAD_RETRY_AFTER_SECONDS)
+
+        # A queue that was idle joins at the current minimum pass, so it
+        # cannot bank credit while it had nothing to send
+        active = [other.pass_value for other in self._queues.values() if other.waiters]
+        if not queue.waiters and active:
+            queue.pass_value = max(queue.pass_value, min(active))
+
+        now = time.monotonic()
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), now, now + queue.max_wait)
+        queue.waiters.append(waiter)
+        self._waiting += 1
+        self._stats["queued"] += 1
+
+        try:
+            async with asyncio.timeout(queue.max_wait):
+                await waiter.future
+        except TimeoutError:
+            if not waiter.future.done() or waiter.future.cancelled():
+                self._forget(queue, waiter)
+                queue.stats["expired"] += 1
+                raise LLMOverloaded(settings.LLM_OVERLOAD_RETRY_AFTER_SECONDS)
+            # The slot was granted just as the deadline passed; use it
+            waiter.future.result()
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                # Granted, but the caller went away before using it
+                self._release()
+            else:
+                self._forget(queue, waiter)
+            raise
+
+    def _forget(self, queue: _Queue, waiter: _Waiter):
+        try:
+            queue.waiters.remove(waiter)
+            self._waiting -= 1
+        except ValueError:
+            pass
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one model call slot, scheduled under the current class.
+        """
+        await self._acquire(self._queues[_current_class.get()])
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        queues = {}
+        for name, queue in self._queues.items():
+            dispatched = queue.stats["dispatched"]
+            queues[name] = {
+                **queue.stats,
+                "wait_ms": round(queue.stats["wait_ms"], 1),
+                "max_wait_ms": round(queue.stats["max_wait_ms"], 1),
+                "avg_wait_ms": round(queue.stats["wait_ms"] / dispatched, 2) if dispatched else 0.0,
+                "depth": len(queue.waiters),
+                "weight": queue.weight,
+                "max_wait_seconds": queue.max_wait,
+            }
+        return {
+            **self._stats,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "max_concurrent": self.max_concurrent,
+            "queues": queues,
+        }
+
+
+llm_scheduler = LLMScheduler(
+    max_concurrent=settings.LLM_MAX_CONCURRENT_CALLS,
+    max_waiting=settings.LLM_MAX_WAITING_CALLS,
+    weights=settings.LLM_SCHEDULER_WEIGHTS,
+    max_wait=settings.LLM_SCHEDULER_MAX_WAIT_SECONDS,
+)
@@ -0,0 +1,102 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests for a short window and hands them to
+    `handler` as one list.
+
+    A batch is flushed when it reaches `max_batch_size` or `max_wait_ms`
+    after its first item arrived, whichever comes first. `handler` must
+    return one result per item, in order; an Exception in that list is
+    raised to that item's caller only. A caller that goes away simply
+    stops waiting; the rest of its batch is unaffected.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[list], Awaitable[list]],
+        max_batch_size: int,
+        max_wait_ms: float,
+    ):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending: list[tuple[Any, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._running: set[asyncio.Task] = set()
+        self._stats = {
+            "items": 0,
+            "batches": 0,
+            "flushed_full": 0,
+            "flushed_on_timeout": 0,
+            "largest_batch": 0,
+            "failed_items": 0,
+        }
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        self._stats["items"] += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._stats["flushed_full"] += 1
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush_on_timeout)
+
+        return await future
+
+    def _flush_on_timeout(self):
+        self._timer = None
+        if self._pending:
+            self._stats["flushed_on_timeout"] += 1
+            self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = self._pending[:self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size:]
+        # Callers that already gave up are not sent
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+
+        self._stats["batches"] += 1
+        self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+        task = asyncio.create_task(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+        if self._pending and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush_on_timeout)
+
+    async def _run(self, batch: list[tuple[Any, asyncio.Future]]):
+        try:
+            results = await self.handler([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batch handler returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                self._stats["failed_items"] += 1
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        batches = self._stats["batches"]
+        return {
+            **self._stats,
+            "avg_batch_size": round(self._stats["items"] / batches, 2) if batches else 0.0,
+            "pending": len(self._pending),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+
+from core.config import settings
+from core.resilience import resilience_monitor
+
+# Characters and LaTeX commands that mark a formula-heavy exercise
+_MATH_CHARS = set("=+-*/^√∫∑∏∞πθαβγΔ≤≥≠≈<>|!%′'")
+_LATEX_RE = re.compile(r"\\[a-zA-Z]+")
+_DIGIT_RE = re.compile(r"\d")
+
+
+@dataclass
+class Complexity:
+    score: float
+    length: int
+    math_density: float
+    subjects: list[str]
+    has_image: bool
+
+
+def estimate_complexity(text: str, has_image: bool) -> Complexity:
+    """
+    Cheap 0..1 difficulty estimate from the exercise text: its length, how
+    much of it is formula, and the subjects it mentions (MODEL_ROUTER_SUBJECT_WEIGHTS).
+    An attached image adds MODEL_ROUTER_IMAGE_WEIGHT, since its content is unknown.
+    """
+    text = text or ""
+    lowered = text.lower()
+    stripped = [char for char in text if not char.isspace()]
+    math_chars = sum(1 for char in stripped if char in _MATH_CHARS)
+    math_chars += len(_DIGIT_RE.findall(text)) // 2 + 3 * len(_LATEX_RE.findall(text))
+    math_density = min(1.0, math_chars / len(stripped)) if stripped else 0.0
+
+    subjects = [subject for subject in settings.MODEL_ROUTER_SUBJECT_WEIGHTS if subject in lowered]
+    subject_score = max((settings.MODEL_ROUTER_SUBJECT_WEIGHTS[subject] for subject in subjects), default=0.0)
+
+    score = (
+        0.3 * min(1.0, len(text) / settings.MODEL_ROUTER_LONG_PROMPT_CHARS)
+        + 0.3 * min(1.0, math_density / 0.3)
+        + subject_score
+        + (settings.MODEL_ROUTER_IMAGE_WEIGHT if has_image else 0.0)
+    )
+    return Complexity(
+        score=round(min(1.0, score), 3),
+        length=len(text),
+        math_density=round(math_density, 3),
+        subjects=subjects,
+        has_image=has_image,
+    )
+
+
+@dataclass
+class RoutingDecision:
+    call_type: str
+    model: str
+    preferred: str
+    reason: str # "complexity", "slo" or "fixed"
+    complexity: Complexity
+    p95_seconds: dict[str, float | None]
+    started: float = field(default_factory=time.monotonic)
+    first_chunk_ms: float | None = None
+
+    def mark_first_chunk(self):
+        if self.first_chunk_ms is None:
+            self.first_chunk_ms = round((time.monotonic() - self.started) * 1000, 1)
+
+
+class ModelRouter:
+    """
+    Picks the model for each guidance call.
+
+    Complex exercises (see estimate_complexity) prefer the strong model,
+    the rest the fast one. The preference is overridden when that model is
+    outside its latency SLO (rolling p95 of its recent attempts for the
+    call type) or its error rate is too high, and the other model is not.
+    Every decision is written, with its outcome, to MODEL_ROUTER_LOG_PATH
+    as JSON lines for offline tuning of the weights and thresholds.
+    """
+
+    def __init__(self, fast_model: str, strong_model: str, log_path: str, flush_every: int):
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.log_path = log_path
+        self.flush_every = flush_every
+        self._buffer: list[str] = []
+        self._write_lock = threading.Lock()
+        self._flushing: asyncio.Task | None = None
+        self._stats = {
+            "decisions": 0,
+            "fast": 0,
+            "strong": 0,
+            "overridden_by_slo": 0,
+            "logged": 0,
+            "log_errors": 0,
+        }
+
+    def _slo(self, call_type: str) -> float:
+        return settings.MODEL_ROUTER_LATENCY_SLO_SECONDS.get(call_type, settings.MODEL_ROUTER_DEFAULT_SLO_SECONDS)
+
+    def _p95(self, call_type: str, model_name: str) -> float | None:
+        return resilience_monitor.model_p95(
+            call_type, model_name,
+            max_age=settings.MODEL_ROUTER_WINDOW_SECONDS,
+            min_samples=settings.MODEL_ROUTER_MIN_SAMPLES,
+        )
+
+    def _healthy(self, call_type: str, model_name: str, p95: float | None) -> bool:
+        breaker = resilience_monitor.breaker(model_name)
+        if breaker.state == "open" or breaker.recent_error_rate() > settings.MODEL_ROUTER_MAX_ERROR_RATE:
+            return False
+        # No recent samples: assume it is fine, so an idle model gets tried again
+        return p95 is None or p95 <= self._slo(call_type)
+
+    def choose(self, call_type: str, text: str, has_image: bool = False) -> RoutingDecision:
+        complexity = estimate_complexity(text, has_image)
+        if not settings.MODEL_ROUTER_ENABLED:
+            model = self.strong_model if has_image else self.fast_model
+            return RoutingDecision(call_type, model, model, "fixed", complexity, {})
+
+        if complexity.score >= settings.MODEL_ROUTER_COMPLEXITY_THRESHOLD:
+            preferred, other = self.strong_model, self.fast_model
+        else:
+            preferred, other = self.fast_model, self.strong_model
+        p95 = {name: self._p95(call_type, name) for name in (preferred, other)}
+
+        model, reason = preferred, "complexity"
+        if not self._healthy(call_type, preferred, p95[preferred]) and self._healthy(call_type, other, p95[other]):
+            model, reason = other, "slo"
+            self._stats["overridden_by_slo"] += 1
+
+        self._stats["decisions"] += 1
+        self._stats["strong" if model == self.strong_model else "fast"] += 1
+        return RoutingDecision(call_type, model, preferred, reason, complexity, p95)
+
+    def finish(self, decision: RoutingDecision, ok: bool):
+        """
+        Log the decision with its outcome.
+        """
+        if decision.reason == "fixed" or not self.log_path:
+            return
+        self._buffer.append(json.dumps({
+            "at": time.time(),
+            "call_type": decision.call_type,
+            "model": decision.model,
+            "preferred": decision.preferred,
+            "reason": decision.reason,
+            "complexity": decision.complexity.score,
+            "length": decision.complexity.length,
+            "math_density": decision.complexity.math_density,
+            "subjects": decision.complexity.subjects,
+            "has_image": decision.complexity.has_image,
+            "p95_seconds": decision.p95_seconds,
+            "slo_seconds": self._slo(decision.call_type),
+            "latency_ms": round((time.monotonic() - decision.started) * 1000, 1),
+            "first_chunk_ms": decision.first_chunk_ms,
+            "ok": ok,
+        }, ensure_ascii=False))
+        if len(self._buffer) >= self.flush_every and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.get_running_loop().create_task(self.flush())
+
+    def _write(self, lines: list[str]):
+        with self._write_lock:
+            directory = os.path.dirname(self.log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as log_file:
+                log_file.write("\n".join(lines) + "\n")
+
+    async def flush(self):
+        lines, self._buffer = self._buffer, []
+        if not lines:
+            return
+        try:
+            await asyncio.to_thread(self._write, lines)
+            self._stats["logged"] += len(lines)
+        except OSError as e:
+            self._stats["log_errors"] += 1
+            print(f"Could not write routing log: {e}")
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "buffered": len(self._buffer),
+            "fast_model": self.fast_model,
+            "strong_model": self.strong_model,
+            "enabled": settings.MODEL_ROUTER_ENABLED,
+        }
+
+
+model_router = ModelRouter(
+    fast_model=settings.GEMINI_TEXT_MODEL,
+    strong_model=settings.GEMINI_MULTIMODAL_MODEL,
+    log_path=settings.MODEL_ROUTER_LOG_PATH,
+    flush_every=settings.MODEL_ROUTER_LOG_FLUSH_EVERY,
+)
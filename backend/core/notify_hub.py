@@ -0,0 +1,62 @@
+import asyncio
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any
+
+
+class NotificationHub:
+    """
+    In-process publish/subscribe keyed by topic (e.g. "roadmap:<job_id>").
+
+    A subscriber is just an asyncio.Queue, so a client waiting for a job
+    costs no polling and no DB connection until something is published.
+    Only events published in this process are seen; callers that must also
+    notice work done by other processes re-check the DB on a slow timer.
+    """
+
+    def __init__(self, max_queue_size: int = 100):
+        self.max_queue_size = max_queue_size
+        self._subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+        self._stats = {
+            "published": 0,
+            "delivered": 0,
+            "dropped": 0,
+        }
+
+    @contextmanager
+    def subscribe(self, topic: str):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._subscribers[topic].add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def publish(self, topic: str, message: Any):
+        self._stats["published"] += 1
+        for queue in list(self._subscribers.get(topic, ())):
+            try:
+                queue.put_nowait(message)
+                self._stats["delivered"] += 1
+            except asyncio.QueueFull:
+                # A stalled subscriber only misses intermediate updates;
+                # it re-reads the job state when it wakes up.
+                self._stats["dropped"] += 1
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "topics": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+        }
+
+
+notification_hub = NotificationHub()
+
+
+def roadmap_topic(job_id: str) -> str:
+    return f"roadmap:{job_id}"
@@ -0,0 +1,256 @@
+import asyncio
+import re
+import time
+import unicodedata
+
+from sqlalchemy import select, update
+
+from core.config import settings
+from db.database import AsyncSessionLocal
+from core.image_pipeline import PreprocessedImage
+from models.ocr_cache import ImageTranscription
+
+HASH_BITS = 256
+
+# Section markers the image guidance prompt asks the model to emit
+PROBLEM_MARKER = "[ĐỀ BÀI]"
+HINT_MARKER = "[GỢI Ý]"
+
+_PROBLEM_RE = re.compile(r"\[\s*ĐỀ\s+BÀI\s*\]\**:?", re.IGNORECASE)
+_HINT_RE = re.compile(r"\[\s*GỢI\s+Ý\s*\]\**:?", re.IGNORECASE)
+
+
+def _band_layout(max_distance: int, bits: int = HASH_BITS) -> list[tuple[int, int]]:
+    """
+    Split a `bits`-bit hash into max_distance + 1 bands of (shift, mask).
+    Two hashes within `max_distance` bits must then agree exactly on at
+    least one band (pigeonhole), so looking up each band finds every match.
+    """
+    bands = max_distance + 1
+    layout, shift = [], 0
+    for i in range(bands):
+        width = bits // bands + (1 if i < bits % bands else 0)
+        layout.append((shift, (1 << width) - 1))
+        shift += width
+    return layout
+
+
+def split_transcribed_guidance(text: str) -> tuple[str | None, str]:
+    """
+    Split a guidance response for a photo into (problem text, hint).
+    The problem text is None when the model did not use the markers.
+    """
+    text = unicodedata.normalize("NFC", text or "")
+    problem_match = _PROBLEM_RE.search(text)
+    hint_match = _HINT_RE.search(text)
+    if not problem_match or not hint_match or hint_match.start() < problem_match.end():
+        return None, text.strip()
+
+    problem = text[problem_match.end():hint_match.start()].strip().strip("*").strip()
+    hint = text[hint_match.end():].strip()
+    return problem or None, hint
+
+
+def format_transcribed_guidance(problem: str, hint: str = "") -> str:
+    """
+    Inverse of split_transcribed_guidance, for hints written from a
+    cached transcription.
+    """
+    return f"{PROBLEM_MARKER}\n{problem}\n\n{HINT_MARKER}\n{hint}"
+
+
+def combine_exercise_text(problem: str, prompt: str | None) -> str:
+    """
+    Exercise text for a photo: the transcribed problem, followed by
+    whatever the student typed alongside it.
+    """
+    prompt = (prompt or "").strip()
+    return f"{problem}\n\n{prompt}" if prompt else problem
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class OCRCache:
+    """
+    Reuse of the problem text the multimodal model read from a photo.
+
+    Every transcribed photo is stored in `image_transcriptions` with its
+    SHA-256 and its 256- and 1024-bit dHashes. A photo byte-identical to
+    a stored one reuses its transcription.
+
+    Near-duplicates are opt-in: a false match answers the wrong problem.
+    Two pages that differ in one line of text are closer, even at 1024
+    bits, than two shots of the same page, so only copies of the same
+    photo (re-encoded, recompressed by a messaging app, brightened) can
+    be matched safely. A candidate within `max_distance` of the 256-bit
+    hash (found through an in-memory band index, refreshed from other
+    workers every `refresh_seconds`) is used only if its 1024-bit hash is
+    also within `verify_max_distance`.
+    """
+
+    def __init__(self, max_distance: int, verify_max_distance: int, refresh_seconds: float):
+        self.max_distance = max(0, min(max_distance, 31))
+        self.verify_max_distance = verify_max_distance
+        self.refresh_seconds = refresh_seconds
+        self._layout = _band_layout(self.max_distance)
+        self._hashes: dict[int, int] = {} # row id -> dhash256
+        self._bands: list[dict[int, list[int]]] = [{} for _ in self._layout]
+        self._last_id = 0
+        self._last_refresh = 0.0
+        self._lock = asyncio.Lock()
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "exact_hits": 0,
+            "near_duplicate_hits": 0,
+            "rejected_by_verification": 0,
+            "misses": 0,
+            "added": 0,
+        }
+
+    def _band_values(self, dhash: int):
+        for band, (shift, mask) in enumerate(self._layout):
+            yield band, (dhash >> shift) & mask
+
+    def _index(self, row_id: int, dhash: int):
+        if row_id in self._hashes:
+            return
+        self._hashes[row_id] = dhash
+        for band, value in self._band_values(dhash):
+            self._bands[band].setdefault(value, []).append(row_id)
+
+    async def _refresh(self):
+        """
+        Load rows written since the last refresh (by any worker).
+        """
+        if time.monotonic() - self._last_refresh < self.refresh_seconds:
+            return
+        async with self._lock:
+            if time.monotonic() - self._last_refresh < self.refresh_seconds:
+                return
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(
+                    select(ImageTranscription.id, ImageTranscription.dhash256)
+                    .where(ImageTranscription.id > self._last_id)
+                    .order_by(ImageTranscription.id)
+                )).all()
+            for row_id, dhash in rows:
+                if dhash:
+                    self._index(row_id, int(dhash, 16))
+                # Only advanced here: rows this worker indexed itself may have
+                # overtaken ids that other workers had not committed yet
+                self._last_id = row_id
+            self._last_refresh = time.monotonic()
+
+    def _nearest(self, dhash: int) -> tuple[int, int] | None:
+        best = None
+        seen = set()
+        for band, value in self._band_values(dhash):
+            for row_id in self._bands[band].get(value, ()):
+                if row_id in seen:
+                    continue
+                seen.add(row_id)
+                distance = hamming_distance(dhash, self._hashes[row_id])
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (row_id, distance)
+        return best
+
+    async def _exact(self, db, image_sha256: str) -> tuple[int, str] | None:
+        row = (await db.execute(
+            select(ImageTranscription.id, ImageTranscription.problem_text)
+            .where(ImageTranscription.image_sha256 == image_sha256)
+            .order_by(ImageTranscription.id.desc())
+            .limit(1)
+        )).first()
+        return tuple(row) if row else None
+
+    async def _near_duplicate(self, db, processed: PreprocessedImage) -> tuple[int, str] | None:
+        if processed.dhash is None or processed.fine_dhash is None:
+            return None
+        await self._refresh()
+        match = self._nearest(processed.dhash)
+        if match is None:
+            return None
+        row = (await db.execute(
+            select(ImageTranscription.problem_text, ImageTranscription.fine_dhash)
+            .where(ImageTranscription.id == match[0])
+        )).first()
+        if row is None:
+            return None
+        stored = int(row.fine_dhash, 16) if row.fine_dhash else None
+        if stored is None or hamming_distance(processed.fine_dhash, stored) > self.verify_max_distance:
+            self._stats["rejected_by_verification"] += 1
+            return None
+        return match[0], row.problem_text
+
+    async def lookup(self, image_sha256: str, processed: PreprocessedImage) -> str | None:
+        """
+        Return the stored problem text of the same photo or, when
+        OCR_CACHE_NEAR_DUPLICATES is on, of a verified near-duplicate.
+        """
+        if not settings.OCR_CACHE_ENABLED:
+            return None
+        self._stats["lookups"] += 1
+        try:
+            async with AsyncSessionLocal() as db:
+                found, kind = await self._exact(db, image_sha256), "exact_hits"
+                if found is None and settings.OCR_CACHE_NEAR_DUPLICATES:
+                    found, kind = await self._near_duplicate(db, processed), "near_duplicate_hits"
+                if found is not None and found[1]:
+                    await db.execute(
+                        update(ImageTranscription)
+                        .where(ImageTranscription.id == found[0])
+                        .values(hits=ImageTranscription.hits + 1)
+                    )
+                    await db.commit()
+                    self._stats["hits"] += 1
+                    self._stats[kind] += 1
+                    return found[1]
+        except Exception as e:
+            # The cache is an optimization; never fail the request over it
+            print(f"OCR cache lookup failed: {e}")
+
+        self._stats["misses"] += 1
+        return None
+
+    async def add(self, image_sha256: str, processed: PreprocessedImage, problem_text: str):
+        if not settings.OCR_CACHE_ENABLED:
+            return
+        dhash = processed.dhash
+        try:
+            async with AsyncSessionLocal() as db:
+                entry = ImageTranscription(
+                    dhash=f"{(dhash or 0) >> (HASH_BITS - 64):016x}",
+                    dhash256=f"{dhash:064x}" if dhash is not None else None,
+                    fine_dhash=f"{processed.fine_dhash:0256x}" if processed.fine_dhash is not None else None,
+                    image_sha256=image_sha256,
+                    problem_text=problem_text,
+                    hits=0
+                )
+                db.add(entry)
+                await db.commit()
+            if dhash is not None:
+                self._index(entry.id, dhash)
+            self._stats["added"] += 1
+        except Exception as e:
+            print(f"OCR cache write failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self._stats["lookups"]
+        return {
+            **self._stats,
+            "hit_ratio": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            "indexed": len(self._hashes),
+            "near_duplicates": settings.OCR_CACHE_NEAR_DUPLICATES,
+            "max_distance": self.max_distance,
+            "verify_max_distance": self.verify_max_distance,
+        }
+
+
+ocr_cache = OCRCache(
+    max_distance=settings.OCR_CACHE_MAX_DISTANCE,
+    verify_max_distance=settings.OCR_CACHE_VERIFY_MAX_DISTANCE,
+    refresh_seconds=settings.OCR_CACHE_REFRESH_SECONDS,
+)
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from passlib.context import CryptContext
+
+from core.config import settings
+
+# One context per worker process, built by _init_worker
+_context: CryptContext | None = None
+
+
+def build_context(time_cost: int, memory_cost: int, parallelism: int) -> CryptContext:
+    """
+    Argon2 context with the configured cost. Hashes made with other
+    parameters still verify, and are flagged for rehashing on login.
+    """
+    return CryptContext(
+        schemes=["argon2"],
+        deprecated="auto",
+        argon2__rounds=time_cost,
+        argon2__memory_cost=memory_cost,
+        argon2__parallelism=parallelism,
+    )
+
+
+def _init_worker(time_cost: int, memory_cost: int, parallelism: int):
+    global _context
+    _context = build_context(time_cost, memory_cost, parallelism)
+
+
+def _hash(password: str) -> str:
+    return _context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return _context.verify_and_update(password, hashed_password)
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised instead of queueing when the hashing pool is saturated.
+    """
+
+
+class PasswordHasher:
+    """
+    Argon2 hashing in a dedicated process pool.
+
+    Argon2 is deliberately CPU- and memory-hard; running it in separate
+    processes keeps a burst of logins from holding the GIL or the shared
+    threadpool. At most `workers` hashes run at once and `max_queue` more
+    may wait; anything beyond that is rejected immediately with
+    PasswordHasherBusy rather than piling up.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {
+            "hashed": 0,
+            "verified": 0,
+            "rehashed": 0,
+            "rejected": 0,
+            "peak_in_flight": 0,
+            "total_ms": 0.0,
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(
+                    settings.ARGON2_TIME_COST,
+                    settings.ARGON2_MEMORY_COST,
+                    settings.ARGON2_PARALLELISM,
+                ),
+            )
+        return self._executor
+
+    def _release(self, _future: Future):
+        with self._lock:
+            self._in_flight -= 1
+
+    async def _submit(self, fn, *args, bounded: bool = True):
+        with self._lock:
+            if bounded and self._in_flight >= self.workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise PasswordHasherBusy()
+            self._in_flight += 1
+            self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._in_flight)
+
+        started = time.perf_counter()
+        future = self._get_executor().submit(fn, *args)
+        # Released when the worker finishes, even if the request was cancelled,
+        # so the depth reflects what the pool is actually doing
+        future.add_done_callback(self._release)
+        result = await asyncio.wrap_future(future)
+        if bounded:
+            self._stats["total_ms"] += (time.perf_counter() - started) * 1000
+        return result
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._submit(_hash, password)
+        self._stats["hashed"] += 1
+        return hashed
+
+    async def verify(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """
+        Returns (matches, new_hash). new_hash is set when the stored hash
+        used outdated parameters and should be replaced.
+        """
+        matches, new_hash = await self._submit(_verify_and_update, password, hashed_password)
+        self._stats["verified"] += 1
+        if new_hash:
+            self._stats["rehashed"] += 1
+        return matches, new_hash
+
+    async def warm_up(self):
+        """
+        Start every worker process and run one hash in each, so the first
+        logins do not pay for process start-up and Argon2 initialisation.
+        """
+        await asyncio.gather(*(
+            self._submit(_hash, "warm-up", bounded=False) for _ in range(self.workers)
+        ))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        calls = self._stats["hashed"] + self._stats["verified"]
+        return {
+            **self._stats,
+            "total_ms": round(self._stats["total_ms"], 1),
+            "avg_ms": round(self._stats["total_ms"] / calls, 1) if calls else 0.0,
+            "in_flight": self._in_flight,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+        }
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
@@ -0,0 +1,248 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, UTC
+
+from sqlalchemy import case, func, select, update
+
+from core import admission
+from core.admission import rate_limiter
+from core.config import settings
+from core.llm_scheduler import llm_class
+from core.response_cache import normalize_exercise_text
+from core.tutor_service import TutorService
+from db.database import AsyncSessionLocal
+from models.practice import PracticeExercise
+
+
+def source_key(exercise_content: str) -> str:
+    return hashlib.sha256(normalize_exercise_text(exercise_content).encode("utf-8")).hexdigest()
+
+
+class PracticePool:
+    """
+    Pool of pre-generated practice exercises per source exercise, stored in
+    the `practice_pool` table.
+
+    A correct answer pops a ready exercise instead of waiting for the LLM.
+    A miss generates on demand as before and keeps that suggestion here
+    for the next user of the same source. Only a hit queues its source for
+    the background refiller, which tops the pool back up to `target_depth`
+    unserved exercises; each refill spends a token from the user's
+    speculation budget, like similar-exercise speculation. A periodic sweep
+    also refills sources served more than once in the last day, including
+    by other workers.
+    """
+
+    def __init__(self, target_depth: int, concurrency: int, sweep_interval: float):
+        self.target_depth = target_depth
+        self.concurrency = concurrency
+        self.sweep_interval = sweep_interval
+
+        self._queue: asyncio.Queue[tuple[str, bool]] | None = None
+        self._queued: set[str] = set()
+        self._runners: list[asyncio.Task] = []
+        self._stats = {
+            "served_from_pool": 0,
+            "generated_on_miss": 0,
+            "refilled": 0,
+            "duplicates_skipped": 0,
+            "kept_from_miss": 0,
+            "refill_over_budget": 0,
+            "refill_failures": 0,
+        }
+
+    # --- Lifecycle ---
+    async def start(self):
+        if self._runners:
+            return
+        self._queue = asyncio.Queue()
+        self._runners = [asyncio.create_task(self._refill_loop()) for _ in range(self.concurrency)]
+        self._runners.append(asyncio.create_task(self._sweep_loop()))
+
+    async def stop(self):
+        for task in self._runners:
+            task.cancel()
+        await asyncio.gather(*self._runners, return_exceptions=True)
+        self._runners = []
+        self._queue = None
+        self._queued.clear()
+
+    # --- Serving ---
+    async def has_ready(self, exercise_content: str) -> bool:
+        async with AsyncSessionLocal() as db:
+            found = (await db.execute(
+                select(PracticeExercise.id)
+                .where(
+                    PracticeExercise.source_key == source_key(exercise_content),
+                    PracticeExercise.served_at.is_(None)
+                )
+                .limit(1)
+            )).scalar_one_or_none()
+        return found is not None
+
+    async def pop(self, exercise_content: str, user_id: int, premium: bool = False) -> str | None:
+        """
+        Hand out one unserved exercise for this source, or None if the pool
+        is empty. A hit queues the source for a refill on the user's budget.
+        """
+        key = source_key(exercise_content)
+        content = None
+        async with AsyncSessionLocal() as db:
+            candidates = (await db.execute(
+                select(PracticeExercise.id, PracticeExercise.content)
+                .where(PracticeExercise.source_key == key, PracticeExercise.served_at.is_(None))
+                .order_by(PracticeExercise.id)
+                .limit(3)
+            )).all()
+            for row_id, row_content in candidates:
+                # Conditional UPDATE, so two workers never serve the same row
+                result = await db.execute(
+                    update(PracticeExercise)
+                    .where(PracticeExercise.id == row_id, PracticeExercise.served_at.is_(None))
+                    .values(served_at=datetime.now(UTC))
+                )
+                if result.rowcount == 1:
+                    await db.commit()
+                    content = row_content
+                    break
+            else:
+                await db.rollback()
+
+        if content is None:
+            self._stats["generated_on_miss"] += 1
+            return None
+        self._stats["served_from_pool"] += 1
+        self.request_refill(exercise_content, user_id, premium)
+        return content
+
+    async def add(self, exercise_content: str, content: str) -> bool:
+        """
+        Keep an exercise generated on a miss as an unserved entry, so the
+        next correct answer on this source is a hit.
+        """
+        key = source_key(exercise_content)
+        content = content.strip()
+        if not content:
+            return False
+        async with AsyncSessionLocal() as db:
+            existing = (await db.execute(
+                select(PracticeExercise.content).where(PracticeExercise.source_key == key)
+            )).scalars().all()
+            if normalize_exercise_text(content) in {normalize_exercise_text(c) for c in existing}:
+                self._stats["duplicates_skipped"] += 1
+                return False
+            db.add(PracticeExercise(source_key=key, source_content=exercise_content, content=content))
+            await db.commit()
+        self._stats["kept_from_miss"] += 1
+        return True
+
+    def request_refill(self, exercise_content: str, user_id: int | None = None, premium: bool = False):
+        """
+        Queue a source for the refiller. With a user, the refill is charged
+        to their speculation budget and dropped when it is spent.
+        """
+        if self._queue is None:
+            return
+        key = source_key(exercise_content)
+        if key in self._queued:
+            return
+        if user_id is not None and rate_limiter.take(admission.SPECULATION, user_id, premium):
+            self._stats["refill_over_budget"] += 1
+            return
+        self._queued.add(key)
+        self._queue.put_nowait((exercise_content, premium))
+
+    # --- Refilling ---
+    async def _refill_loop(self):
+        while True:
+            exercise_content, premium = await self._queue.get()
+            try:
+                with llm_class(interactive=False, premium=premium):
+                    await self.refill(exercise_content)
+            except Exception as e:
+                self._stats["refill_failures"] += 1
+                print(f"Practice pool refill failed: {e}")
+            finally:
+                self._queued.discard(source_key(exercise_content))
+
+    async def refill(self, exercise_content: str) -> int:
+        """
+        Generate exercises until the source has `target_depth` unserved ones.
+        """
+        key = source_key(exercise_content)
+        async with AsyncSessionLocal() as db:
+            existing = {
+                normalize_exercise_text(content) for content in (await db.execute(
+                    select(PracticeExercise.content).where(PracticeExercise.source_key == key)
+                )).scalars().all()
+            }
+            ready = (await db.execute(
+                select(func.count(PracticeExercise.id))
+                .where(PracticeExercise.source_key == key, PracticeExercise.served_at.is_(None))
+            )).scalar_one()
+
+        added = 0
+        # A few extra attempts, since the model sometimes repeats itself
+        for _ in range(max(0, self.target_depth - ready) * 2):
+            if ready + added >= self.target_depth:
+                break
+            suggestion = await TutorService.get_similar_exercise(exercise_content, use_cache=False)
+            content = suggestion.content.strip()
+            if not content or normalize_exercise_text(content) in existing:
+                self._stats["duplicates_skipped"] += 1
+                continue
+            async with AsyncSessionLocal() as db:
+                db.add(PracticeExercise(
+                    source_key=key,
+                    source_content=exercise_content,
+                    content=content
+                ))
+                await db.commit()
+            existing.add(normalize_exercise_text(content))
+            added += 1
+
+        self._stats["refilled"] += added
+        return added
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self._sweep()
+            except Exception as e:
+                print(f"Practice pool sweep failed: {e}")
+
+    async def _sweep(self):
+        """
+        Queue sources served more than once in the last day that are below
+        target depth.
+        """
+        since = datetime.now(UTC) - timedelta(days=1)
+        unserved = func.sum(case((PracticeExercise.served_at.is_(None), 1), else_=0))
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(func.min(PracticeExercise.source_content))
+                .group_by(PracticeExercise.source_key)
+                .having(unserved < self.target_depth)
+                .having(func.max(PracticeExercise.served_at) >= since)
+                .having(func.count(PracticeExercise.served_at) > 1)
+            )).scalars().all()
+        for exercise_content in rows:
+            self.request_refill(exercise_content)
+
+    def stats(self) -> dict:
+        served = self._stats["served_from_pool"]
+        requests = served + self._stats["generated_on_miss"]
+        return {
+            **self._stats,
+            "pool_hit_ratio": round(served / requests, 4) if requests else 0.0,
+            "refill_queue": self._queue.qsize() if self._queue is not None else 0,
+            "target_depth": self.target_depth,
+        }
+
+
+practice_pool = PracticePool(
+    target_depth=settings.PRACTICE_POOL_TARGET_DEPTH,
+    concurrency=settings.PRACTICE_POOL_REFILL_CONCURRENCY,
+    sweep_interval=settings.PRACTICE_POOL_SWEEP_SECONDS,
+)
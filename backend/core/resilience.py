@@ -0,0 +1,442 @@
+import asyncio
+import contextlib
+import time
+from collections import deque
+from typing import Any, AsyncIterator
+
+from fastapi import HTTPException, status
+from langchain_core.runnables import Runnable
+
+from core.cancellation import cancellation_stats
+from core.config import settings
+from core.llm_registry import LLMRegistry
+from core.llm_scheduler import LLMOverloaded
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """
+    The call type's deadline passed before any attempt answered.
+    """
+
+
+class CircuitOpen(LLMOverloaded):
+    """
+    Every model that could serve the call is failing; try again after the cooldown.
+    """
+
+
+def deadline_response() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        detail="The tutor took too long to answer, please try again"
+    )
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Per-model breaker. Trips open when at least `error_rate` of the last
+    `window` calls failed (once `min_calls` were seen); after `cooldown`
+    seconds it lets a single probe through and closes again if it succeeds.
+    """
+
+    def __init__(self, window: int, min_calls: int, error_rate: float, cooldown: float):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._probing = False
+        self.trips = 0
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self.state = "half_open"
+            self._probing = False
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def finish(self, ok: bool | None):
+        """
+        ok is None for an attempt that was cancelled (lost a hedge race).
+        """
+        if self.state == "half_open":
+            self._probing = False
+            if ok:
+                self.state = "closed"
+                self._outcomes.clear()
+            elif ok is False:
+                self._open()
+            return
+        if ok is None:
+            return
+        self._outcomes.append(ok)
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+            self._open()
+
+    def _open(self):
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.trips += 1
+
+    def recent_error_rate(self) -> float:
+        return self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0
+
+    def retry_after(self) -> float:
+        return max(1.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "trips": self.trips,
+            "recent_error_rate": round(self.recent_error_rate(), 4),
+        }
+
+
+class ResilienceMonitor:
+    """
+    Rolling latencies and counters per call type, attempt latencies per
+    call type and model (read by core/model_router.py), and one breaker
+    per model.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._window = window
+        self._latencies: dict[str, deque[float]] = {}
+        self._model_latencies: dict[tuple[str, str], deque[tuple[float, float]]] = {}
+        self._stats: dict[str, dict] = {}
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def breaker(self, model_name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model_name)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                window=settings.LLM_BREAKER_WINDOW,
+                min_calls=settings.LLM_BREAKER_MIN_CALLS,
+                error_rate=settings.LLM_BREAKER_ERROR_RATE,
+                cooldown=settings.LLM_BREAKER_COOLDOWN_SECONDS,
+            )
+            self._breakers[model_name] = breaker
+        return breaker
+
+    def count(self, call_type: str, counter: str):
+        entry = self._stats.setdefault(call_type, {
+            "calls": 0,
+            "hedged": 0,
+            "hedge_won": 0,
+            "failed_over": 0,
+            "routed_to_fallback": 0,
+            "deadline_exceeded": 0,
+            "failed": 0,
+        })
+        entry[counter] += 1
+
+    def record_latency(self, call_type: str, seconds: float):
+        self._latencies.setdefault(call_type, deque(maxlen=self._window)).append(seconds)
+
+    def record_attempt(self, call_type: str, model_name: str, seconds: float):
+        self._model_latencies.setdefault(
+            (call_type, model_name), deque(maxlen=self._window)
+        ).append((time.monotonic(), seconds))
+
+    def model_p95(self, call_type: str, model_name: str, max_age: float, min_samples: int) -> float | None:
+        """
+        p95 latency of the model's recent successful attempts for this call
+        type, or None while there are fewer than `min_samples` of them.
+        """
+        cutoff = time.monotonic() - max_age
+        recent = [seconds for at, seconds in self._model_latencies.get((call_type, model_name), ()) if at >= cutoff]
+        if len(recent) < min_samples:
+            return None
+        return _percentile(recent, 0.95)
+
+    def hedge_delay(self, call_type: str) -> float:
+        latencies = self._latencies.get(call_type)
+        if not latencies or len(latencies) < self.min_samples:
+            return settings.LLM_HEDGE_DEFAULT_DELAY_SECONDS
+        return max(settings.LLM_HEDGE_MIN_DELAY_SECONDS, _percentile(list(latencies), 0.95))
+
+    def may_hedge(self, call_type: str) -> bool:
+        entry = self._stats.get(call_type, {})
+        # Hedge budget, so a slow provider does not double the load
+        return entry.get("hedged", 0) < settings.LLM_HEDGE_MAX_RATIO * entry.get("calls", 0) + 1
+
+    def stats(self) -> dict:
+        call_types = {}
+        for call_type, entry in sorted(self._stats.items()):
+            latencies = list(self._latencies.get(call_type, ()))
+            call_types[call_type] = {
+                **entry,
+                "p50_ms": round(_percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+                "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+                "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+                "hedge_delay_ms": round(self.hedge_delay(call_type) * 1000, 1),
+            }
+        return {
+            "call_types": call_types,
+            "breakers": {name: breaker.stats() for name, breaker in sorted(self._breakers.items())},
+        }
+
+
+resilience_monitor = ResilienceMonitor()
+
+
+class ResilientModel(Runnable):
+    """
+    Model wrapper for one call type, adding a deadline, hedging and
+    failover on top of the primary model.
+
+    - The whole call (the first chunk, for streams) must finish within the
+      call type's deadline, or it fails with LLMDeadlineExceeded.
+    - If the first attempt has not answered by the call type's rolling p95
+      latency, a second attempt is sent to the fallback model (or the same
+      model again) and the first answer wins; the other is cancelled.
+    - An attempt that fails is immediately retried on the fallback.
+    - While the primary model's breaker is open, calls go straight to the
+      fallback; with no usable model, they fail fast with CircuitOpen.
+    """
+
+    def __init__(self, call_type: str, model_name: str, fallback_name: str | None):
+        self.call_type = call_type
+        self.model_name = model_name
+        self.fallback_name = fallback_name if fallback_name and fallback_name != model_name else None
+        self._models = {
+            name: LLMRegistry.get_model(name)
+            for name in (model_name, self.fallback_name) if name
+        }
+
+    def _deadline(self) -> float:
+        return settings.LLM_DEADLINE_SECONDS.get(self.call_type, settings.LLM_DEFAULT_DEADLINE_SECONDS)
+
+    def _first_target(self, call_type: str) -> str:
+        if resilience_monitor.breaker(self.model_name).allow():
+            return self.model_name
+        if self.fallback_name and resilience_monitor.breaker(self.fallback_name).allow():
+            resilience_monitor.count(call_type, "routed_to_fallback")
+            return self.fallback_name
+        raise CircuitOpen(resilience_monitor.breaker(self.model_name).retry_after())
+
+    def _second_target(self, first: str) -> str | None:
+        """
+        Where a hedge or failover goes: the fallback model if it can take
+        it, else the same model again.
+        """
+        for name in (self.fallback_name, first):
+            if name and (name == first or resilience_monitor.breaker(name).allow()):
+                return name
+        return None
+
+    async def _attempt(self, model_name: str, input: Any, config, kwargs: dict):
+        breaker = resilience_monitor.breaker(model_name)
+        started = time.monotonic()
+        try:
+            result = await self._models[model_name].ainvoke(input, config, **kwargs)
+        except asyncio.CancelledError:
+            breaker.finish(None)
+            raise
+        except Exception:
+            breaker.finish(False)
+            raise
+        breaker.finish(True)
+        resilience_monitor.record_attempt(self.call_type, model_name, time.monotonic() - started)
+        usage = getattr(result, "usage_metadata", None)
+        if usage:
+            cancellation_stats.record_output_tokens(self.call_type, usage.get("output_tokens", 0))
+        return result
+
+    def invoke(self, input: Any, config=None, **kwargs) -> Any:
+        # Sync calls are not used by the services
+        return self._models[self.model_name].invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config=None, **kwargs) -> Any:
+        call_type = self.call_type
+        resilience_monitor.count(call_type, "calls")
+        started = time.monotonic()
+        first = self._first_target(call_type)
+        hedge_at = started + resilience_monitor.hedge_delay(call_type)
+
+        first_task = asyncio.create_task(self._attempt(first, input, config, kwargs))
+        attempts: dict[asyncio.Task, str] = {first_task: first}
+        second_sent = False
+        last_error: BaseException | None = None
+        try:
+            async with asyncio.timeout(self._deadline()):
+                while attempts:
+                    wait_for = None
+                    if not second_sent and settings.LLM_HEDGING_ENABLED:
+                        wait_for = max(0.0, hedge_at - time.monotonic())
+                    done, _ = await asyncio.wait(attempts, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+
+                    if not done:
+                        # Slow first attempt: hedge
+                        second_sent = True
+                        second = self._second_target(first) if resilience_monitor.may_hedge(call_type) else None
+                        if second is not None:
+                            resilience_monitor.count(call_type, "hedged")
+                            attempts[asyncio.create_task(self._attempt(second, input, config, kwargs))] = second
+                        continue
+
+                    for task in done:
+                        attempts.pop(task)
+                        if task.exception() is None:
+                            if task is not first_task and last_error is None:
+                                resilience_monitor.count(call_type, "hedge_won")
+                            resilience_monitor.record_latency(call_type, time.monotonic() - started)
+                            return task.result()
+                        last_error = task.exception()
+
+                    if not attempts and not second_sent:
+                        # Failed fast: fail over instead of giving up
+                        second_sent = True
+                        second = self._second_target(first) if self.fallback_name else None
+                        if second is not None:
+                            resilience_monitor.count(call_type, "failed_over")
+                            attempts[asyncio.create_task(self._attempt(second, input, config, kwargs))] = second
+        except TimeoutError:
+            resilience_monitor.count(call_type, "deadline_exceeded")
+            raise LLMDeadlineExceeded(f"{call_type} did not answer within {self._deadline()}s")
+        except asyncio.CancelledError:
+            # The caller went away (e.g. client disconnect); the attempts are cancelled below
+            cancellation_stats.record_cancelled_call(self.call_type)
+            raise
+        finally:
+            for task in attempts:
+                task.cancel()
+            if attempts:
+                await asyncio.wait(attempts)
+
+        resilience_monitor.count(call_type, "failed")
+        raise last_error
+
+    async def astream(self, input: Any, config=None, **kwargs) -> AsyncIterator:
+        """
+        Hedged on the first chunk: the first stream to produce one is
+        followed to the end, the other is closed.
+        """
+        call_type = self.call_type + ":stream"
+        resilience_monitor.count(call_type, "calls")
+        started = time.monotonic()
+        first = self._first_target(call_type)
+        hedge_at = started + resilience_monitor.hedge_delay(call_type)
+
+        streams: dict[asyncio.Task, tuple[str, AsyncIterator, float]] = {}
+
+        def start(model_name: str) -> asyncio.Task:
+            stream = self._models[model_name].astream(input, config, **kwargs)
+            task = asyncio.create_task(anext(stream))
+            streams[task] = (model_name, stream, time.monotonic())
+            return task
+
+        async def close(task: asyncio.Task, stream: AsyncIterator):
+            task.cancel()
+            await asyncio.wait([task])
+            with contextlib.suppress(Exception):
+                await stream.aclose()
+
+        first_task = start(first)
+        second_sent = False
+        last_error: BaseException | None = None
+        winner = None
+        raced = False
+        try:
+            async with asyncio.timeout(self._deadline()):
+                while streams and winner is None:
+                    wait_for = None
+                    if not second_sent and settings.LLM_HEDGING_ENABLED:
+                        wait_for = max(0.0, hedge_at - time.monotonic())
+                    done, _ = await asyncio.wait(streams, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+
+                    if not done:
+                        second_sent = True
+                        second = self._second_target(first) if resilience_monitor.may_hedge(call_type) else None
+                        if second is not None:
+                            resilience_monitor.count(call_type, "hedged")
+                            start(second)
+                        continue
+
+                    for task in done:
+                        model_name, stream, stream_started = streams.pop(task)
+                        breaker = resilience_monitor.breaker(model_name)
+                        error = task.exception()
+                        if error is None or isinstance(error, StopAsyncIteration):
+                            breaker.finish(True)
+                            resilience_monitor.record_attempt(call_type, model_name, time.monotonic() - stream_started)
+                            if winner is None:
+                                winner = (task, model_name, stream)
+                            else:
+                                await close(task, stream)
+                        else:
+                            breaker.finish(False)
+                            last_error = error
+
+                    if not streams and winner is None and not second_sent:
+                        second_sent = True
+                        second = self._second_target(first) if self.fallback_name else None
+                        if second is not None:
+                            resilience_monitor.count(call_type, "failed_over")
+                            start(second)
+            raced = True
+        except TimeoutError:
+            resilience_monitor.count(call_type, "deadline_exceeded")
+            raise LLMDeadlineExceeded(f"{self.call_type} did not start answering within {self._deadline()}s")
+        except asyncio.CancelledError:
+            cancellation_stats.record_cancelled_call(self.call_type)
+            raise
+        finally:
+            losers = list(streams.items())
+            if winner is not None and not raced:
+                # Cancelled right after picking a winner: it is not used either
+                losers.append((winner[0], (winner[1], winner[2], None)))
+            for task, (model_name, stream, _) in losers:
+                resilience_monitor.breaker(model_name).finish(None)
+                await close(task, stream)
+
+        if winner is None:
+            resilience_monitor.count(call_type, "failed")
+            raise last_error
+
+        task, model_name, stream = winner
+        if task is not first_task and last_error is None:
+            resilience_monitor.count(call_type, "hedge_won")
+        resilience_monitor.record_latency(call_type, time.monotonic() - started)
+        if isinstance(task.exception(), StopAsyncIteration):
+            return
+        # Output tokens so far (~4 characters each), to estimate what a cancellation saves
+        chars_received = 0
+        output_tokens = 0 # Usage is reported per chunk, as deltas
+        chunk = task.result()
+        try:
+            while True:
+                chars_received += len(chunk.content) if isinstance(chunk.content, str) else 0
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage:
+                    output_tokens += usage.get("output_tokens", 0)
+                yield chunk
+                try:
+                    chunk = await anext(stream)
+                except StopAsyncIteration:
+                    break
+            if output_tokens:
+                cancellation_stats.record_output_tokens(self.call_type, output_tokens)
+        except (asyncio.CancelledError, GeneratorExit):
+            cancellation_stats.record_cancelled_call(self.call_type, chars_received // 4)
+            raise
+        finally:
+            await stream.aclose()
+
+
+def resilient_model(call_type: str, model_name: str) -> ResilientModel:
+    return ResilientModel(call_type, model_name, settings.LLM_FALLBACK_MODELS.get(model_name))
@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+from sqlalchemy import bindparam, delete, func, select, update
+
+from core.config import settings
+from db.database import AsyncSessionLocal
+from models.llm_cache import LLMCacheEntry
+
+
+def normalize_exercise_text(text: str | None) -> str:
+    """
+    Canonical form of an exercise used for cache keys: NFC unicode
+    (Vietnamese diacritics can arrive composed or decomposed) and
+    collapsed whitespace. Case is kept, since `X` and `x` can differ in math.
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def template_version(template: str) -> str:
+    """
+    Short fingerprint of a prompt template, so editing a prompt
+    automatically invalidates the responses cached for the old one.
+    """
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM responses.
+
+    Tier 1 is an in-process LRU; tier 2 is the `llm_response_cache` table,
+    shared by every worker and kept across restarts. Both tiers expire
+    entries after `ttl_seconds` and are capped in size.
+
+    Reads from tier 2 do not write: hit counts are kept in memory and
+    added to the rows in one batch every `hits_flush_every` hits (and on
+    shutdown), so the counters may lag or lose a few hits on a crash.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: int,
+        persistent: bool = True,
+        persistent_max_entries: int = 50_000,
+        hits_flush_every: int = 100,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self.persistent_max_entries = persistent_max_entries
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._writes_since_trim = 0
+        self.hits_flush_every = hits_flush_every
+        self._pending_hits: dict[str, int] = {}
+        self._flushing: asyncio.Task | None = None
+        self._stats = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expired": 0,
+            "hit_flushes": 0,
+        }
+
+    @staticmethod
+    def make_key(kind: str, template: str, model: str, *inputs: str | None) -> str:
+        # The provider is part of the key, so e.g. fake-backend replies
+        # from a load test are never served by the real one
+        payload = json.dumps(
+            [kind, template_version(template), settings.LLM_PROVIDER, model, *inputs],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # --- Tier 1: in-memory LRU ---
+    def _memory_get(self, key: str) -> str | None:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._memory[key]
+            self._stats["expired"] += 1
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_set(self, key: str, value: str, expires_at: float):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    # --- Tier 2: database ---
+    async def _db_get(self, key: str) -> tuple[str, float] | None:
+        async with AsyncSessionLocal() as db:
+            entry = await db.get(LLMCacheEntry, key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time():
+                await db.delete(entry)
+                await db.commit()
+                return None
+            return entry.value, entry.expires_at
+
+    async def _db_set(self, key: str, kind: str, value: str, expires_at: float, trim: bool):
+        async with AsyncSessionLocal() as db:
+            await db.merge(LLMCacheEntry(key=key, kind=kind, value=value, expires_at=expires_at))
+            await db.commit()
+            if trim:
+                await self._db_trim(db)
+
+    async def _db_add_hits(self, hits: dict[str, int]):
+        async with AsyncSessionLocal() as db:
+            table = LLMCacheEntry.__table__
+            await db.execute(
+                update(table)
+                .where(table.c.key == bindparam("entry_key"))
+                .values(hits=func.coalesce(table.c.hits, 0) + bindparam("added")),
+                [{"entry_key": key, "added": added} for key, added in hits.items()]
+            )
+            await db.commit()
+
+    async def flush_hits(self):
+        hits, self._pending_hits = self._pending_hits, {}
+        if not hits:
+            return
+        try:
+            await self._db_add_hits(hits)
+            self._stats["hit_flushes"] += 1
+        except Exception as e:
+            print(f"Response cache hit count flush failed: {e}")
+
+    def _count_hit(self, key: str):
+        self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+        pending = sum(self._pending_hits.values())
+        if pending >= self.hits_flush_every and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.get_running_loop().create_task(self.flush_hits())
+
+    async def _db_trim(self, db):
+        """
+        Drop expired rows, then the oldest rows beyond the size cap.
+        """
+        await db.execute(delete(LLMCacheEntry).where(LLMCacheEntry.expires_at <= time.time()))
+        overflow = (await db.execute(
+            select(LLMCacheEntry.key)
+            .order_by(LLMCacheEntry.expires_at.desc())
+            .offset(self.persistent_max_entries)
+        )).scalars().all()
+        if overflow:
+            await db.execute(delete(LLMCacheEntry).where(LLMCacheEntry.key.in_(overflow)))
+        await db.commit()
+
+    # --- Public API ---
+    async def get(self, key: str) -> str | None:
+        value = self._memory_get(key)
+        if value is not None:
+            self._stats["memory_hits"] += 1
+            return value
+
+        if self.persistent:
+            try:
+                found = await self._db_get(key)
+            except Exception as e:
+                print(f"Response cache read failed: {e}")
+                found = None
+            if found is not None:
+                value, expires_at = found
+                self._memory_set(key, value, expires_at)
+                self._stats["persistent_hits"] += 1
+                self._count_hit(key)
+                return value
+
+        self._stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, kind: str, value: str):
+        expires_at = time.time() + self.ttl_seconds
+        self._memory_set(key, value, expires_at)
+        self._stats["sets"] += 1
+
+        if self.persistent:
+            self._writes_since_trim += 1
+            trim = self._writes_since_trim >= 100
+            if trim:
+                self._writes_since_trim = 0
+            try:
+                await self._db_set(key, kind, value, expires_at, trim)
+            except Exception as e:
+                # The cache is an optimization; never fail the request over it
+                print(f"Response cache write failed: {e}")
+
+    def clear_memory(self):
+        self._memory.clear()
+
+    def stats(self) -> dict:
+        hits = self._stats["memory_hits"] + self._stats["persistent_hits"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "pending_hits": sum(self._pending_hits.values()),
+        }
+
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+    persistent=settings.RESPONSE_CACHE_PERSISTENT,
+    persistent_max_entries=settings.RESPONSE_CACHE_PERSISTENT_MAX_ENTRIES,
+    hits_flush_every=settings.RESPONSE_CACHE_HITS_FLUSH_EVERY,
+)
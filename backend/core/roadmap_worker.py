@@ -0,0 +1,269 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, UTC
+
+from sqlalchemy import select, update, or_
+
+from core.config import settings
+from core.llm_scheduler import llm_class
+from core.notify_hub import notification_hub, roadmap_topic
+from core.tutor_service import RoadmapService
+from db.database import AsyncSessionLocal, async_engine
+from models.roadmap import RoadmapJob as RoadmapJobModel
+from models.user import User as UserModel
+
+
+class RoadmapWorker:
+    """
+    Long-lived worker that runs queued roadmap jobs from the `roadmap_jobs` table.
+
+    Jobs are claimed with row locking (SKIP LOCKED on PostgreSQL, a conditional
+    UPDATE on SQLite), so any number of workers can share the table. At most
+    `concurrency` jobs run at once; failed jobs are retried with exponential
+    backoff and jobs left in `processing` by a crashed worker are requeued.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        poll_interval: float,
+        max_attempts: int,
+        retry_backoff: float,
+        stale_after: int,
+    ):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.stale_after = stale_after
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+        self._semaphore: asyncio.Semaphore | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._runner: asyncio.Task | None = None
+        self._jobs: set[asyncio.Task] = set()
+        self._stopping = False
+        self._stats = {
+            "claimed": 0,
+            "completed": 0,
+            "failed": 0,
+            "retried": 0,
+            "recovered": 0,
+        }
+
+    # --- Lifecycle ---
+    async def start(self):
+        """
+        Run the worker as a background task of the current event loop.
+        """
+        if self._runner is None or self._runner.done():
+            self._stopping = False
+            self._runner = asyncio.create_task(self.run())
+
+    async def stop(self, timeout: float = 30.0):
+        """
+        Stop claiming new jobs and give running ones `timeout` seconds to finish.
+        Jobs still running after that are cancelled and will be requeued by
+        stale-job recovery.
+        """
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._runner is not None:
+            # The runner may be parked on a full semaphore; a claim in progress
+            # is a single transaction, so cancelling it just rolls it back.
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        if self._jobs:
+            _, pending = await asyncio.wait(self._jobs, timeout=timeout)
+            for task in pending:
+                task.cancel()
+
+    def notify(self):
+        """
+        Wake the worker immediately (a job was just queued in this process).
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._wakeup = asyncio.Event()
+        print(f"Roadmap worker {self.worker_id} started (concurrency={self.concurrency})")
+
+        last_recovery = 0.0
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            if loop.time() - last_recovery >= self.poll_interval * 10:
+                await self._safe(self.recover_stale_jobs())
+                last_recovery = loop.time()
+
+            # Only claim a job once there is a free slot to run it
+            await self._semaphore.acquire()
+            job_pk = await self._safe(self.claim_next_job())
+            if job_pk is None:
+                self._semaphore.release()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self._run_job(job_pk))
+            self._jobs.add(task)
+            task.add_done_callback(self._job_done)
+
+    def _job_done(self, task: asyncio.Task):
+        self._jobs.discard(task)
+        self._semaphore.release()
+        # A slot is free again; look for more work right away
+        self._wakeup.set()
+
+    async def _safe(self, coro):
+        try:
+            return await coro
+        except Exception as e:
+            print(f"Roadmap worker error: {e}")
+            return None
+
+    # --- Queue operations ---
+    async def claim_next_job(self) -> int | None:
+        """
+        Atomically move one due `pending` job to `processing` and return its id.
+        """
+        now = datetime.now(UTC)
+        async with AsyncSessionLocal() as db:
+            query = (
+                select(RoadmapJobModel.id)
+                .where(
+                    RoadmapJobModel.status == "pending",
+                    or_(
+                        RoadmapJobModel.next_attempt_at.is_(None),
+                        RoadmapJobModel.next_attempt_at <= now
+                    )
+                )
+                .order_by(RoadmapJobModel.created_at, RoadmapJobModel.id)
+            )
+            if async_engine.dialect.name == "postgresql":
+                query = query.limit(1).with_for_update(skip_locked=True)
+            else:
+                # SQLite has no row locks: look at a few candidates and let the
+                # conditional UPDATE below decide which worker gets each one.
+                query = query.limit(5)
+
+            candidates = (await db.execute(query)).scalars().all()
+            for job_pk in candidates:
+                result = await db.execute(
+                    update(RoadmapJobModel)
+                    .where(RoadmapJobModel.id == job_pk, RoadmapJobModel.status == "pending")
+                    .values(
+                        status="processing",
+                        claimed_at=now,
+                        worker_id=self.worker_id,
+                        attempts=RoadmapJobModel.attempts + 1
+                    )
+                )
+                if result.rowcount == 1:
+                    await db.commit()
+                    self._stats["claimed"] += 1
+                    return job_pk
+            await db.rollback()
+        return None
+
+    async def recover_stale_jobs(self) -> int:
+        """
+        Requeue jobs stuck in `processing` (their worker died mid-job),
+        or fail them if they are out of attempts.
+        """
+        now = datetime.now(UTC)
+        stale_before = now - timedelta(seconds=self.stale_after)
+        is_stale = (
+            (RoadmapJobModel.status == "processing")
+            & or_(
+                RoadmapJobModel.claimed_at < stale_before,
+                # Left behind by the old BackgroundTasks runner
+                RoadmapJobModel.claimed_at.is_(None)
+            )
+        )
+        async with AsyncSessionLocal() as db:
+            failed = await db.execute(
+                update(RoadmapJobModel)
+                .where(is_stale, RoadmapJobModel.attempts >= self.max_attempts)
+                .values(status="failed", error="Worker stopped while processing the job", completed_at=now)
+            )
+            requeued = await db.execute(
+                update(RoadmapJobModel)
+                .where(is_stale)
+                .values(status="pending", next_attempt_at=None, worker_id=None)
+            )
+            await db.commit()
+
+        recovered = requeued.rowcount + failed.rowcount
+        if recovered:
+            self._stats["recovered"] += recovered
+            print(f"Roadmap worker recovered {recovered} stale job(s)")
+        return recovered
+
+    async def _run_job(self, job_pk: int):
+        async with AsyncSessionLocal() as db:
+            job = await db.get(RoadmapJobModel, job_pk)
+            user = await db.get(UserModel, job.user_id) if job else None
+            if not job or not user:
+                return
+            self._publish(job)
+
+            try:
+                with llm_class(interactive=False, premium=bool(user.is_premium)):
+                    roadmap_object = await RoadmapService.generate_roadmap(user, job.theme)
+
+                job.roadmap_data = roadmap_object.model_dump()
+                job.status = "completed"
+                job.error = None
+                job.completed_at = datetime.now(UTC)
+                self._stats["completed"] += 1
+
+            except Exception as e:
+                job.error = str(e)
+                if job.attempts < self.max_attempts:
+                    delay = self.retry_backoff * (2 ** (job.attempts - 1))
+                    job.status = "pending"
+                    job.next_attempt_at = datetime.now(UTC) + timedelta(seconds=delay)
+                    self._stats["retried"] += 1
+                else:
+                    job.status = "failed"
+                    job.completed_at = datetime.now(UTC)
+                    self._stats["failed"] += 1
+
+            await db.commit()
+            self._publish(job)
+
+    def _publish(self, job: RoadmapJobModel):
+        notification_hub.publish(
+            roadmap_topic(job.job_id),
+            {"job_id": job.job_id, "status": job.status}
+        )
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "worker_id": self.worker_id,
+            "running": self._runner is not None and not self._runner.done(),
+            "in_flight": len(self._jobs),
+            "concurrency": self.concurrency,
+        }
+
+
+roadmap_worker = RoadmapWorker(
+    concurrency=settings.ROADMAP_WORKER_CONCURRENCY,
+    poll_interval=settings.ROADMAP_WORKER_POLL_SECONDS,
+    max_attempts=settings.ROADMAP_JOB_MAX_ATTEMPTS,
+    retry_backoff=settings.ROADMAP_JOB_RETRY_BACKOFF_SECONDS,
+    stale_after=settings.ROADMAP_JOB_STALE_SECONDS,
+)
@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+from core.config import settings
+from core.llm_scheduler import llm_class
+from core.response_cache import normalize_exercise_text
+from core.tutor_service import TutorService
+from schemas.llm_output import SimilarExerciseLLM
+
+
+class SimilarExercisePrefetcher:
+    """
+    Generates the "similar exercise" suggestion speculatively, so a
+    correct answer does not wait for a second LLM round trip.
+
+    One background task runs per exercise text; `submit_answer` starts it
+    alongside the answer check (or finds the one started when the exercise
+    was created) and only awaits it if the answer turns out correct.
+    Otherwise the task is parked - left to finish, so its result lands in
+    the response cache for the next attempt - or cancelled, depending on
+    SIMILAR_EXERCISE_SPECULATION.
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._stats = {
+            "started": 0,
+            "joined": 0, # An in-flight task was already running for the exercise
+            "used": 0,
+            "parked": 0,
+            "cancelled": 0,
+            "failed": 0,
+            "wait_ms": 0.0, # Time spent waiting for the suggestion after the check
+        }
+
+    def start(self, exercise_content: str, premium: bool = False) -> tuple[asyncio.Task, bool]:
+        """
+        Return the running task for this exercise, starting one if needed.
+        The flag says whether this call started it.
+        """
+        key = normalize_exercise_text(exercise_content)
+        task = self._tasks.get(key)
+        if task is not None and not task.done():
+            self._stats["joined"] += 1
+            return task, False
+
+        task = asyncio.create_task(self._generate(exercise_content, premium))
+        self._tasks[key] = task
+        task.add_done_callback(lambda t: self._task_done(key, t))
+        self._stats["started"] += 1
+        return task, True
+
+    def prefetch(self, exercise_content: str, premium: bool = False):
+        """
+        Fire-and-forget generation, e.g. right after an exercise is created.
+        """
+        self.start(exercise_content, premium)
+
+    @staticmethod
+    async def _generate(exercise_content: str, premium: bool) -> SimilarExerciseLLM:
+        # Speculative, so batch work even when an answer check started it
+        with llm_class(interactive=False, premium=premium):
+            return await TutorService.get_similar_exercise(exercise_content)
+
+    def _task_done(self, key: str, task: asyncio.Task):
+        # Finished results live on in the response cache
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self._stats["failed"] += 1
+            print(f"Similar exercise prefetch failed: {error}")
+
+    async def result(self, speculative: tuple[asyncio.Task, bool]) -> SimilarExerciseLLM:
+        task, _ = speculative
+        started = time.perf_counter()
+        # Shielded: a cancelled request must not cancel a task others may share
+        suggestion = await asyncio.shield(task)
+        self._stats["wait_ms"] += (time.perf_counter() - started) * 1000
+        self._stats["used"] += 1
+        return suggestion
+
+    def release(self, speculative: tuple[asyncio.Task, bool]):
+        """
+        The caller no longer needs the suggestion.
+        """
+        task, started_here = speculative
+        if task.done():
+            return
+        if settings.SIMILAR_EXERCISE_SPECULATION == "cancel" and started_here:
+            task.cancel()
+            self._stats["cancelled"] += 1
+        else:
+            self._stats["parked"] += 1
+
+    def stats(self) -> dict:
+        used = self._stats["used"]
+        return {
+            **self._stats,
+            "wait_ms": round(self._stats["wait_ms"], 1),
+            "avg_wait_ms": round(self._stats["wait_ms"] / used, 1) if used else 0.0,
+            "in_flight": len(self._tasks),
+        }
+
+
+similar_prefetcher = SimilarExercisePrefetcher()
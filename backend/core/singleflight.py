@@ -0,0 +1,146 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable
+
+from core.config import settings
+
+_END = object()
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _SharedStream:
+    """
+    One producer, many consumers: every chunk is recorded, and each
+    subscriber gets its own queue that starts with a replay of the chunks
+    it missed.
+    """
+
+    def __init__(self, source: AsyncIterator):
+        self.chunks: list = []
+        self.end = None # _END, or the exception the producer failed with
+        self.subscribers: list[asyncio.Queue] = []
+        self.task = asyncio.create_task(self._produce(source))
+
+    async def _produce(self, source: AsyncIterator):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                for queue in self.subscribers:
+                    queue.put_nowait(chunk)
+            self.end = _END
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.end = e
+        for queue in self.subscribers:
+            queue.put_nowait(self.end)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        for chunk in self.chunks:
+            queue.put_nowait(chunk)
+        if self.end is not None:
+            queue.put_nowait(self.end)
+        self.subscribers.append(queue)
+        return queue
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight LLM calls.
+
+    The first caller for a key starts the work in a task of its own;
+    callers arriving while it runs wait on the same task instead of
+    making another request. Waiters that disconnect just stop waiting;
+    the underlying call is cancelled only when no one is left waiting.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, _Call] = {}
+        self._streams: dict[str, _SharedStream] = {}
+        self._stats = {
+            "leaders": 0,
+            "coalesced": 0,
+            "cancelled": 0,
+        }
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        if not settings.LLM_SINGLEFLIGHT_ENABLED:
+            return await fn()
+
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._forget(self._calls, key, call))
+            self._stats["leaders"] += 1
+        else:
+            self._stats["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # Last one waiting; nobody needs the result any more. Forget
+                # it now: a caller arriving while it winds down must start
+                # afresh rather than join a task that ends in CancelledError
+                self._forget(self._calls, key, call)
+                call.task.cancel()
+                self._stats["cancelled"] += 1
+            raise
+        finally:
+            call.waiters -= 1
+
+    async def stream(self, key: str, fn: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """
+        Streaming variant of do(): subscribers that join late first
+        receive the chunks produced so far.
+        """
+        if not settings.LLM_SINGLEFLIGHT_ENABLED:
+            async for chunk in fn():
+                yield chunk
+            return
+
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = _SharedStream(fn())
+            self._streams[key] = shared
+            shared.task.add_done_callback(lambda task: self._forget(self._streams, key, shared))
+            self._stats["leaders"] += 1
+        else:
+            self._stats["coalesced"] += 1
+
+        queue = shared.subscribe()
+        try:
+            while True:
+                item = await queue.get()
+                if item is _END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            shared.subscribers.remove(queue)
+            if not shared.subscribers and not shared.task.done():
+                self._forget(self._streams, key, shared)
+                shared.task.cancel()
+                self._stats["cancelled"] += 1
+
+    @staticmethod
+    def _forget(registry: dict, key: str, entry):
+        if registry.get(key) is entry:
+            del registry[key]
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "in_flight": len(self._calls) + len(self._streams),
+        }
+
+
+llm_flights = SingleFlight()
@@ -0,0 +1,16 @@
+# Helpers for Server-Sent Events responses
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Stop reverse proxies (nginx) from buffering the stream
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+def sse_comment(text: str = "keep-alive") -> str:
+    # Comment lines are ignored by EventSource but keep idle connections open
+    return f": {text}\n\n"
@@ -1,104 +1,556 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.exceptions import OutputParserException
 from langchain_core.output_parsers import StrOutputParser, PydanticOutputParser
 from langchain_core.messages import HumanMessage, SystemMessage
 from dotenv import load_dotenv
-import os
+import hashlib
+import json
 
 from core import prompts
+from core.answer_verifier import UNCONFIRMED_INCORRECT, Verdict, verifier_pool, verifier_stats
+from core.config import settings
+from core.json_repair import RepairingOutputParser
+from core.image_pipeline import PreprocessedImage, image_pipeline
+from core.ocr_cache import (
+    ocr_cache,
+    combine_exercise_text,
+    format_transcribed_guidance,
+    split_transcribed_guidance,
+)
+from core.llm_providers import bind_json_schema, image_block
+from core.llm_registry import LLMRegistry
+from core.resilience import resilient_model
+from core.model_router import RoutingDecision, model_router
+from core.micro_batcher import MicroBatcher
+from core.singleflight import llm_flights
+from core.response_cache import response_cache, normalize_exercise_text
 from models.user import User
 # FIX: Import the Pydantic models from the new, separate schema file
-from schemas.llm_output import CheckAnswerLLM, SimilarExerciseLLM, RoadmapLLM 
+from schemas.llm_output import (
+    CheckAnswerLLM,
+    CheckAnswerBatchLLM,
+    ExpectedAnswerLLM,
+    HintLadderLLM,
+    SimilarExerciseLLM,
+    RoadmapLLM,
+)
 
 load_dotenv()
 
+
+def _estimate_tokens(text: str) -> int:
+    # ~4 characters per token; good enough for the savings metric
+    return len(text) // 4
+
+
+def _build_structured_chain(call_type: str, template: str, schema, model_name: str):
+    """
+    Build a prompt | llm | parser chain for a structured reply.
+
+    With native structured output the model is constrained to the schema's
+    JSON itself, so the prompt no longer carries the format instructions.
+    The parser repairs near-misses locally; a reply that still cannot be
+    parsed is retried LLM_PARSE_RETRIES times.
+    """
+    format_instructions = prompts.FORMAT_INSTRUCTIONS_PREFIX + (
+        PydanticOutputParser(pydantic_object=schema).get_format_instructions()
+    )
+    llm = resilient_model(call_type, model_name)
+    if settings.LLM_NATIVE_STRUCTURED_OUTPUT:
+        llm = bind_json_schema(llm, schema)
+        tokens_saved = _estimate_tokens(format_instructions)
+        format_instructions = ""
+    else:
+        tokens_saved = 0
+
+    parser = RepairingOutputParser(pydantic_object=schema, call_type=call_type, tokens_saved=tokens_saved)
+    prompt = ChatPromptTemplate.from_template(template).partial(
+        format_instructions=format_instructions
+    )
+    chain = prompt | llm | parser
+    if settings.LLM_PARSE_RETRIES > 0:
+        chain = chain.with_retry(
+            retry_if_exception_type=(OutputParserException,),
+            stop_after_attempt=settings.LLM_PARSE_RETRIES + 1,
+            wait_exponential_jitter=False
+        )
+    return chain
+
+
 class TutorService:
 
     @classmethod
-    def _get_llm_multimodal(cls):
+    def _get_llm_text_only(cls, call_type: str):
         """
-        Load the multimodal (image + text) model using Gemini 2.5 Flash.
+        Load a faster, text-only model using Gemini 2.5 Flash-Lite.
         """
-        return ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=os.getenv("GOOGLE_API_KEY")
+        return resilient_model(call_type, settings.GEMINI_TEXT_MODEL)
+
+    @classmethod
+    def _guidance_chain(cls, multimodal: bool, model_name: str):
+        """
+        One chain per model the router may pick (core/model_router.py).
+        """
+        call_type = "guidance_multimodal" if multimodal else "guidance_text"
+        return LLMRegistry.get_chain(
+            f"{call_type}:{model_name}",
+            lambda: resilient_model(call_type, model_name) | StrOutputParser()
         )
 
     @classmethod
-    def _get_llm_text_only(cls):
+    def _check_answer_chain(cls):
+        return LLMRegistry.get_chain(
+            "check_answer",
+            lambda: _build_structured_chain(
+                "check_answer", prompts.CHECK_ANSWER_PROMPT, CheckAnswerLLM, settings.GEMINI_TEXT_MODEL
+            )
+        )
+
+    @classmethod
+    def _check_answer_batch_chain(cls):
+        return LLMRegistry.get_chain(
+            "check_answer_batch",
+            lambda: _build_structured_chain(
+                "check_answer_batch", prompts.CHECK_ANSWER_BATCH_PROMPT, CheckAnswerBatchLLM, settings.GEMINI_TEXT_MODEL
+            )
+        )
+
+    @classmethod
+    def _hint_ladder_chain(cls):
+        return LLMRegistry.get_chain(
+            "hint_ladder",
+            lambda: _build_structured_chain(
+                "hint_ladder", prompts.HINT_LADDER_PROMPT, HintLadderLLM, settings.GEMINI_TEXT_MODEL
+            )
+        )
+
+    @classmethod
+    def _expected_answer_chain(cls):
+        return LLMRegistry.get_chain(
+            "expected_answer",
+            lambda: _build_structured_chain(
+                "expected_answer", prompts.EXPECTED_ANSWER_PROMPT, ExpectedAnswerLLM, settings.GEMINI_TEXT_MODEL
+            )
+        )
+
+    @classmethod
+    def _explain_verdict_chain(cls):
+        return LLMRegistry.get_chain(
+            "explain_verdict",
+            lambda: ChatPromptTemplate.from_template(prompts.EXPLAIN_VERDICT_PROMPT)
+                | cls._get_llm_text_only("explain_verdict")
+                | StrOutputParser()
+        )
+
+    @classmethod
+    def _similar_exercise_chain(cls):
+        return LLMRegistry.get_chain(
+            "similar_exercise",
+            lambda: _build_structured_chain(
+                "similar_exercise", prompts.SIMILAR_EXERCISE_PROMPT, SimilarExerciseLLM, settings.GEMINI_TEXT_MODEL
+            )
+        )
+
+    @classmethod
+    def warm_up(cls):
         """
-        Load a faster, text-only model using Gemini 2.5 Flash-Lite.
+        Build every client and chain up front so the first request
+        does not pay for construction.
         """
-        return ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash-lite", 
-            google_api_key=os.getenv("GOOGLE_API_KEY")
+        for model_name in (model_router.fast_model, model_router.strong_model):
+            cls._guidance_chain(multimodal=True, model_name=model_name)
+            cls._guidance_chain(multimodal=False, model_name=model_name)
+        cls._check_answer_chain()
+        if settings.CHECK_ANSWER_BATCHING_ENABLED:
+            cls._check_answer_batch_chain()
+        cls._similar_exercise_chain()
+        cls._hint_ladder_chain()
+        if settings.ANSWER_VERIFIER_ENABLED:
+            cls._expected_answer_chain()
+            if settings.ANSWER_VERIFIER_EXPLANATION == "llm":
+                cls._explain_verdict_chain()
+        RoadmapService._roadmap_chain()
+
+    @classmethod
+    def _guidance_key(cls, prompt: str, image: bytes | None) -> str:
+        """
+        Response cache and singleflight key. Keyed on the image as uploaded,
+        so a cache hit skips preprocessing too.
+
+        The model is picked by model_router only on a miss, so the key
+        cannot name it. It names the pair the router chooses from instead:
+        a hint from either is served for the exercise, and changing either
+        model starts a fresh cache.
+        """
+        models = f"{model_router.fast_model}|{model_router.strong_model}"
+        if image:
+            image_hash = hashlib.sha256(image).hexdigest()
+            return response_cache.make_key(
+                "guidance", prompts.GUIDANCE_PROMPT_WITH_IMAGE, models,
+                normalize_exercise_text(prompt), image_hash
+            )
+        return response_cache.make_key(
+            "guidance", prompts.GUIDANCE_PROMPT, models,
+            normalize_exercise_text(prompt)
         )
 
     @classmethod
-    async def get_initial_guidance(cls, prompt: str, base64_image: str | None = None) -> str:
-        llm = cls._get_llm_multimodal() 
-        message_content = []
-        
-        if base64_image:
-            message_content.append(SystemMessage(content=prompts.GUIDANCE_PROMPT_WITH_IMAGE))
-            message_content.append(HumanMessage(
+    def _text_guidance_request(cls, prompt: str, model_name: str):
+        chain = cls._guidance_chain(multimodal=False, model_name=model_name)
+        return chain, [SystemMessage(content=prompts.GUIDANCE_PROMPT.format(exercise_content=prompt))]
+
+    @classmethod
+    def _image_guidance_request(cls, prompt: str, processed: PreprocessedImage, model_name: str):
+        chain = cls._guidance_chain(multimodal=True, model_name=model_name)
+        return chain, [
+            SystemMessage(content=prompts.GUIDANCE_PROMPT_WITH_IMAGE),
+            HumanMessage(
                 content=[
                     {"type": "text", "text": prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": { "url": f"data:image/jpeg;base64,{base64_image}" }
-                    }
+                    # Raw inline bytes for Gemini, a data URL for the other providers
+                    image_block(processed.mime, processed.data)
                 ]
-            ))
+            )
+        ]
+
+    @classmethod
+    async def _routed_ainvoke(cls, decision: RoutingDecision, chain, message_content) -> str:
+        try:
+            result = await chain.ainvoke(message_content)
+        except Exception:
+            model_router.finish(decision, ok=False)
+            raise
+        model_router.finish(decision, ok=True)
+        return result
+
+    @classmethod
+    async def _routed_astream(cls, decision: RoutingDecision, chain, message_content):
+        ok = False
+        try:
+            async for chunk in chain.astream(message_content):
+                decision.mark_first_chunk()
+                yield chunk
+            ok = True
+        finally:
+            model_router.finish(decision, ok=ok)
+
+    @classmethod
+    async def _remember_transcription(
+        cls,
+        prompt: str,
+        image: bytes,
+        processed: PreprocessedImage,
+        guidance: str
+    ):
+        """
+        Index the problem text read from a new photo, and cache its hint under
+        that text, so the same photo sent again is answered without any model call.
+        """
+        problem, hint = split_transcribed_guidance(guidance)
+        if problem is None:
+            return
+        await ocr_cache.add(hashlib.sha256(image).hexdigest(), processed, problem)
+        if settings.RESPONSE_CACHE_ENABLED and hint:
+            text_key = cls._guidance_key(combine_exercise_text(problem, prompt), None)
+            await response_cache.set(text_key, "guidance", hint)
+
+    @classmethod
+    async def get_initial_guidance(cls, prompt: str, image: bytes | None = None) -> str:
+        """
+        Identical concurrent requests share a single model call.
+        """
+        key = cls._guidance_key(prompt, image)
+        return await llm_flights.do(key, lambda: cls._get_initial_guidance(prompt, image, key))
+
+    @classmethod
+    async def _get_initial_guidance(cls, prompt: str, image: bytes | None, key: str) -> str:
+        cache_key = key if settings.RESPONSE_CACHE_ENABLED else None
+        if cache_key:
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        if image:
+            processed = await image_pipeline.process(image)
+            problem = await ocr_cache.lookup(hashlib.sha256(image).hexdigest(), processed)
+            if problem is not None:
+                # Same page photographed before: hint from the stored text only
+                hint = await cls.get_initial_guidance(combine_exercise_text(problem, prompt))
+                guidance = format_transcribed_guidance(problem, hint)
+            else:
+                decision = model_router.choose("guidance_multimodal", prompt, has_image=True)
+                chain, message_content = cls._image_guidance_request(prompt, processed, decision.model)
+                guidance = await cls._routed_ainvoke(decision, chain, message_content)
+                await cls._remember_transcription(prompt, image, processed, guidance)
         else:
-            llm = cls._get_llm_text_only() 
-            message_content.append(SystemMessage(content=prompts.GUIDANCE_PROMPT.format(exercise_content=prompt)))
+            decision = model_router.choose("guidance_text", prompt)
+            chain, message_content = cls._text_guidance_request(prompt, decision.model)
+            guidance = await cls._routed_ainvoke(decision, chain, message_content)
 
-        chain = llm | StrOutputParser()
-        return await chain.ainvoke(message_content)
+        if cache_key:
+            await response_cache.set(cache_key, "guidance", guidance)
+        return guidance
 
     @classmethod
-    async def check_user_answer(cls, exercise_content: str, user_answer: str) -> CheckAnswerLLM:
-        llm = cls._get_llm_text_only()
-        parser = PydanticOutputParser(pydantic_object=CheckAnswerLLM)
-        prompt = ChatPromptTemplate.from_template(prompts.CHECK_ANSWER_PROMPT)
-        chain = prompt | llm | parser
-        
-        return await chain.ainvoke({
+    async def stream_initial_guidance(cls, prompt: str, image: bytes | None = None):
+        """
+        Same as get_initial_guidance, but yields the hint chunk by chunk
+        as Gemini produces it. A cached hint is yielded in one piece.
+        Identical concurrent requests share one stream.
+        """
+        key = cls._guidance_key(prompt, image)
+        async for chunk in llm_flights.stream(
+            "stream:" + key,
+            lambda: cls._stream_initial_guidance(prompt, image, key)
+        ):
+            yield chunk
+
+    @classmethod
+    async def _stream_initial_guidance(cls, prompt: str, image: bytes | None, key: str):
+        cache_key = key if settings.RESPONSE_CACHE_ENABLED else None
+        if cache_key:
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        chunks = []
+        if image:
+            processed = await image_pipeline.process(image)
+            problem = await ocr_cache.lookup(hashlib.sha256(image).hexdigest(), processed)
+            if problem is not None:
+                # Same page photographed before: hint from the stored text only
+                header = format_transcribed_guidance(problem)
+                chunks.append(header)
+                yield header
+                async for chunk in cls.stream_initial_guidance(combine_exercise_text(problem, prompt)):
+                    chunks.append(chunk)
+                    yield chunk
+            else:
+                decision = model_router.choose("guidance_multimodal:stream", prompt, has_image=True)
+                chain, message_content = cls._image_guidance_request(prompt, processed, decision.model)
+                async for chunk in cls._routed_astream(decision, chain, message_content):
+                    chunks.append(chunk)
+                    yield chunk
+                await cls._remember_transcription(prompt, image, processed, "".join(chunks))
+        else:
+            decision = model_router.choose("guidance_text:stream", prompt)
+            chain, message_content = cls._text_guidance_request(prompt, decision.model)
+            async for chunk in cls._routed_astream(decision, chain, message_content):
+                chunks.append(chunk)
+                yield chunk
+
+        if cache_key:
+            await response_cache.set(cache_key, "guidance", "".join(chunks))
+
+    @classmethod
+    async def get_hint_ladder(cls, exercise_content: str, first_hint: str) -> HintLadderLLM:
+        """
+        All the hints after the first one, from gentlest to strongest, in one call.
+        """
+        key = response_cache.make_key(
+            "hint_ladder", prompts.HINT_LADDER_PROMPT, settings.GEMINI_TEXT_MODEL,
+            normalize_exercise_text(exercise_content), normalize_exercise_text(first_hint),
+            str(settings.HINT_LADDER_STEPS)
+        )
+        return await llm_flights.do(key, lambda: cls._get_hint_ladder(exercise_content, first_hint, key))
+
+    @classmethod
+    async def _get_hint_ladder(cls, exercise_content: str, first_hint: str, key: str) -> HintLadderLLM:
+        cache_key = key if settings.RESPONSE_CACHE_ENABLED else None
+        if cache_key:
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                return HintLadderLLM.model_validate_json(cached)
+
+        ladder = await cls._hint_ladder_chain().ainvoke({
             "exercise_content": exercise_content,
-            "user_answer": user_answer,
-            "format_instructions": parser.get_format_instructions()
+            "first_hint": first_hint,
+            "steps": settings.HINT_LADDER_STEPS
         })
+        if cache_key:
+            await response_cache.set(cache_key, "hint_ladder", ladder.model_dump_json())
+        return ladder
 
     @classmethod
-    async def get_similar_exercise(cls, exercise_content: str) -> SimilarExerciseLLM:
-        llm = cls._get_llm_text_only()
-        parser = PydanticOutputParser(pydantic_object=SimilarExerciseLLM)
-        prompt = ChatPromptTemplate.from_template(prompts.SIMILAR_EXERCISE_PROMPT)
-        chain = prompt | llm | parser
-        
-        return await chain.ainvoke({
+    async def check_user_answer(
+        cls,
+        exercise_content: str,
+        user_answer: str,
+        expected_answer: str | None = None,
+        expected_answer_kind: str | None = None
+    ) -> CheckAnswerLLM:
+        """
+        When the exercise has an extracted answer key, numeric and algebraic
+        answers are checked locally first. A match is final; a mismatch is
+        only final with ANSWER_VERIFIER_TRUST_INCORRECT, since the key itself
+        came from the model and may be wrong. Everything else reaches the LLM.
+        """
+        if settings.ANSWER_VERIFIER_ENABLED:
+            verdict = None
+            if expected_answer_kind is not None:
+                verdict = await verifier_pool.verify(
+                    expected_answer, expected_answer_kind, user_answer,
+                    rel_tol=settings.ANSWER_VERIFIER_REL_TOL,
+                    abs_tol=settings.ANSWER_VERIFIER_ABS_TOL
+                )
+                if verdict.is_correct is False and not settings.ANSWER_VERIFIER_TRUST_INCORRECT:
+                    verdict = Verdict(None, UNCONFIRMED_INCORRECT)
+            verifier_stats.record(verdict)
+            if verdict is not None and verdict.is_correct is not None:
+                return await cls._explain_verdict(exercise_content, user_answer, verdict.is_correct)
+
+        check_input = {
             "exercise_content": exercise_content,
-            "format_instructions": parser.get_format_instructions()
+            "user_answer": user_answer
+        }
+        key = response_cache.make_key(
+            "check_answer", prompts.CHECK_ANSWER_PROMPT, settings.GEMINI_TEXT_MODEL,
+            normalize_exercise_text(exercise_content), normalize_exercise_text(user_answer)
+        )
+        if settings.CHECK_ANSWER_BATCHING_ENABLED:
+            return await llm_flights.do(key, lambda: check_answer_batcher.submit(check_input))
+        return await llm_flights.do(key, lambda: cls._check_answer_chain().ainvoke(check_input))
+
+    @classmethod
+    async def _explain_verdict(cls, exercise_content: str, user_answer: str, is_correct: bool) -> CheckAnswerLLM:
+        canned = prompts.VERIFIED_CORRECT_FEEDBACK if is_correct else prompts.VERIFIED_INCORRECT_FEEDBACK
+        if settings.ANSWER_VERIFIER_EXPLANATION != "llm":
+            return CheckAnswerLLM(is_correct=is_correct, explanation=canned)
+        try:
+            explanation = await cls._explain_verdict_chain().ainvoke({
+                "exercise_content": exercise_content,
+                "user_answer": user_answer,
+                "verdict": "CORRECT" if is_correct else "INCORRECT"
+            })
+        except Exception as e:
+            print(f"Explaining a verified answer failed, using fixed feedback: {e}")
+            explanation = canned
+        return CheckAnswerLLM(is_correct=is_correct, explanation=explanation.strip() or canned)
+
+    @classmethod
+    async def extract_expected_answer(cls, exercise_content: str) -> ExpectedAnswerLLM:
+        """
+        Solve the exercise once and return its final result for the local
+        answer verifier.
+        """
+        key = response_cache.make_key(
+            "expected_answer", prompts.EXPECTED_ANSWER_PROMPT, settings.GEMINI_TEXT_MODEL,
+            normalize_exercise_text(exercise_content)
+        )
+        return await llm_flights.do(key, lambda: cls._extract_expected_answer(exercise_content, key))
+
+    @classmethod
+    async def _extract_expected_answer(cls, exercise_content: str, key: str) -> ExpectedAnswerLLM:
+        cache_key = key if settings.RESPONSE_CACHE_ENABLED else None
+        if cache_key:
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                return ExpectedAnswerLLM.model_validate_json(cached)
+
+        answer_key = await cls._expected_answer_chain().ainvoke({
+            "exercise_content": exercise_content
+        })
+        if cache_key:
+            await response_cache.set(cache_key, "expected_answer", answer_key.model_dump_json())
+        return answer_key
+
+    @classmethod
+    async def _check_answers_batch(cls, check_inputs: list[dict]) -> list:
+        """
+        Micro-batch handler for check_user_answer. In "prompt" mode the whole
+        batch goes out as one multi-item request, each item JSON-encoded so
+        a student's answer cannot pass for another item. Unless the model
+        returns exactly one result per item, the whole batch falls back to
+        abatch.
+        """
+        chain = cls._check_answer_chain()
+        if len(check_inputs) == 1 or settings.CHECK_ANSWER_BATCH_MODE != "prompt":
+            return await chain.abatch(check_inputs, return_exceptions=True)
+
+        items = "\n".join(
+            json.dumps({
+                "index": number,
+                "exercise": check_input["exercise_content"],
+                "student_answer": check_input["user_answer"]
+            }, ensure_ascii=False)
+            for number, check_input in enumerate(check_inputs, start=1)
+        )
+        try:
+            batch = await cls._check_answer_batch_chain().ainvoke({"items": items})
+        except Exception as e:
+            print(f"Batched answer check failed, checking one by one: {e}")
+            return await chain.abatch(check_inputs, return_exceptions=True)
+
+        # A missing, repeated or unknown index means the results cannot be
+        # trusted to belong to the right student, so none of them are used
+        indices = sorted(item.index for item in batch.results)
+        if indices != list(range(1, len(check_inputs) + 1)):
+            print(f"Batched answer check returned indices {indices}, checking one by one")
+            return await chain.abatch(check_inputs, return_exceptions=True)
+
+        results = {
+            item.index - 1: CheckAnswerLLM(is_correct=item.is_correct, explanation=item.explanation)
+            for item in batch.results
+        }
+        return [results[i] for i in range(len(check_inputs))]
+
+    @classmethod
+    async def get_similar_exercise(cls, exercise_content: str, use_cache: bool = True) -> SimilarExerciseLLM:
+        """
+        use_cache=False always generates a fresh variant (the practice pool
+        needs distinct exercises, not the same cached one), so those calls
+        are not coalesced either.
+        """
+        if not use_cache:
+            return await cls._get_similar_exercise(exercise_content, None)
+        key = response_cache.make_key(
+            "similar_exercise", prompts.SIMILAR_EXERCISE_PROMPT, settings.GEMINI_TEXT_MODEL,
+            normalize_exercise_text(exercise_content)
+        )
+        return await llm_flights.do(key, lambda: cls._get_similar_exercise(exercise_content, key))
+
+    @classmethod
+    async def _get_similar_exercise(cls, exercise_content: str, key: str | None) -> SimilarExerciseLLM:
+        cache_key = key if settings.RESPONSE_CACHE_ENABLED else None
+        if cache_key:
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                return SimilarExerciseLLM.model_validate_json(cached)
+
+        chain = cls._similar_exercise_chain()
+        suggestion = await chain.ainvoke({
+            "exercise_content": exercise_content
         })
+        if cache_key:
+            await response_cache.set(cache_key, "similar_exercise", suggestion.model_dump_json())
+        return suggestion
+
+
+check_answer_batcher = MicroBatcher(
+    handler=TutorService._check_answers_batch,
+    max_batch_size=settings.CHECK_ANSWER_BATCH_MAX_SIZE,
+    max_wait_ms=settings.CHECK_ANSWER_BATCH_MAX_WAIT_MS,
+)
 
 
 class RoadmapService:
     @classmethod
-    def _get_llm(cls):
-        return TutorService._get_llm_text_only()
+    def _roadmap_chain(cls):
+        return LLMRegistry.get_chain(
+            "roadmap",
+            lambda: _build_structured_chain(
+                "roadmap", prompts.ROADMAP_PROMPT, RoadmapLLM, settings.GEMINI_TEXT_MODEL
+            )
+        )
 
     @classmethod
     async def generate_roadmap(cls, user: User, learning_target: str) -> RoadmapLLM:
-        llm = cls._get_llm()
-        parser = PydanticOutputParser(pydantic_object=RoadmapLLM)
-        prompt = ChatPromptTemplate.from_template(prompts.ROADMAP_PROMPT)
-        chain = prompt | llm | parser
+        chain = cls._roadmap_chain()
         common_mistakes = ", ".join(user.profile_common_mistakes) if user.profile_common_mistakes else "N/A"
         return await chain.ainvoke({
             "profile_year": user.profile_year or "N/A",
             "profile_skill_level": user.profile_skill_level or "N/A",
             "profile_common_mistakes": common_mistakes,
-            "learning_target": learning_target,
-            "format_instructions": parser.get_format_instructions()
-        })
\ No newline at end of file
+            "learning_target": learning_target
+        })
@@ -0,0 +1,175 @@
+import asyncio
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request
+
+from core.blob_store import BlobWriter, blob_store, sniff_image_mime
+from core.config import settings
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:  # older python-multipart releases
+    from multipart.multipart import MultipartParser, parse_options_header
+
+
+@dataclass
+class ExerciseImage:
+    """
+    An uploaded exercise image, already written to the blob store.
+    """
+    sha256: str
+    size: int
+    mime: str
+
+
+@dataclass
+class _Part:
+    name: str = ""
+    is_file: bool = False
+    data: bytearray | None = None
+
+
+def _too_large(detail: str) -> HTTPException:
+    return HTTPException(status_code=413, detail=detail)
+
+
+def check_content_length(request: Request, limit: int):
+    """
+    Reject an oversized body from its Content-Length before reading any of it.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise _too_large(f"Request body exceeds {limit} bytes")
+
+
+class ExerciseUploadParser:
+    """
+    Streaming multipart/form-data parser for POST /exercises.
+
+    Accepts a `prompt` text field and an `image` file field. The image is
+    hashed and written straight into the blob store as the body arrives, so
+    memory use stays flat however large the photo is, and the upload is cut
+    off with 413 as soon as it passes UPLOAD_MAX_IMAGE_BYTES.
+    """
+
+    def __init__(self, request: Request):
+        self.request = request
+        self.max_image_bytes = settings.UPLOAD_MAX_IMAGE_BYTES
+        self.max_field_bytes = settings.UPLOAD_MAX_FIELD_BYTES
+        self.fields: dict[str, str] = {}
+
+        self._part = _Part()
+        self._header_name = b""
+        self._header_value = b""
+        self._content_disposition = b""
+        self._writer: BlobWriter | None = None
+        self._image_head = b""
+        self._pending_writes: list[bytes] = []
+        self._finished_writer: BlobWriter | None = None
+
+    # --- Parser callbacks (sync, called from parser.write) ---
+    def on_part_begin(self):
+        self._part = _Part()
+        self._content_disposition = b""
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._content_disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._content_disposition)
+        self._part.name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" in options:
+            if self._part.name != "image":
+                return
+            if self._writer is not None or self._finished_writer is not None:
+                raise HTTPException(status_code=400, detail="Only one image can be uploaded")
+            self._part.is_file = True
+            self._writer = blob_store.writer()
+        elif self._part.name == "prompt":
+            self._part.data = bytearray()
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        chunk = data[start:end]
+        if self._part.is_file:
+            if self._writer.size + sum(map(len, self._pending_writes)) + len(chunk) > self.max_image_bytes:
+                raise _too_large(f"Image exceeds {self.max_image_bytes} bytes")
+            if len(self._image_head) < 16:
+                self._image_head += chunk[:16 - len(self._image_head)]
+            self._pending_writes.append(chunk)
+        elif self._part.data is not None:
+            if len(self._part.data) + len(chunk) > self.max_field_bytes:
+                raise _too_large(f"Field '{self._part.name}' exceeds {self.max_field_bytes} bytes")
+            self._part.data.extend(chunk)
+        # Any other field is skipped without being buffered
+
+    def on_part_end(self):
+        if self._part.is_file:
+            self._finished_writer = self._writer
+            self._writer = None
+        elif self._part.data is not None:
+            self.fields[self._part.name] = self._part.data.decode("utf-8", "replace")
+
+    # --- Driver ---
+    async def _flush_writes(self, writer: BlobWriter | None):
+        if writer is not None and self._pending_writes:
+            data = b"".join(self._pending_writes)
+            self._pending_writes.clear()
+            # File writes run in a thread so the event loop never waits on disk
+            await asyncio.to_thread(writer.write, data)
+
+    async def parse(self) -> tuple[str, ExerciseImage | None]:
+        check_content_length(self.request, self.max_image_bytes + self.max_field_bytes + 16 * 1024)
+
+        _, params = parse_options_header(self.request.headers.get("content-type", ""))
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise HTTPException(status_code=400, detail="Missing boundary in multipart body")
+
+        parser = MultipartParser(boundary, {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        })
+
+        try:
+            async for chunk in self.request.stream():
+                parser.write(chunk)
+                await self._flush_writes(self._writer or self._finished_writer)
+            parser.finalize()
+        except BaseException as e:
+            for writer in (self._writer, self._finished_writer):
+                if writer is not None:
+                    writer.abort()
+            if isinstance(e, HTTPException):
+                raise
+            if isinstance(e, Exception):
+                raise HTTPException(status_code=400, detail=f"Invalid multipart body: {e}")
+            raise
+
+        image = None
+        if self._finished_writer is not None:
+            writer = self._finished_writer
+            mime = sniff_image_mime(self._image_head)
+            if writer.size == 0:
+                writer.abort()
+            elif mime is None:
+                writer.abort()
+                raise HTTPException(status_code=400, detail="Unsupported image format")
+            else:
+                digest = await asyncio.to_thread(writer.commit)
+                image = ExerciseImage(sha256=digest, size=writer.size, mime=mime)
+
+        return self.fields.get("prompt", ""), image
@@ -1,15 +1,59 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 from core.config import settings
 
+
+def _async_database_url(url: str) -> str:
+    """
+    Map the sync DATABASE_URL onto the matching async driver
+    (asyncpg for PostgreSQL, aiosqlite for SQLite).
+    """
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+def _pool_options(url: str) -> dict:
+    # SQLite uses its own pool classes, which do not take sizing arguments
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
 engine = create_engine(
-    settings.DATABASE_URL
+    settings.DATABASE_URL,
+    **_pool_options(settings.DATABASE_URL)
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or _async_database_url(settings.DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    **_pool_options(ASYNC_DATABASE_URL)
+)
+
+# expire_on_commit=False: objects stay readable after commit without
+# an implicit (and, under asyncio, forbidden) lazy reload.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
@@ -21,5 +65,14 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def create_tables():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    from db.migrations import add_missing_columns, migrate_exercise_images
+
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    migrate_exercise_images(engine)
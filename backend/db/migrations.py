@@ -0,0 +1,85 @@
+import base64
+import binascii
+
+from sqlalchemy import inspect, text
+
+from db.database import Base
+
+
+def add_missing_columns(engine):
+    """
+    Base.metadata.create_all() only creates missing tables. This adds the
+    columns that were introduced after a table was first created, so an
+    existing database keeps working without a migration tool.
+    New columns must be nullable or have a server_default.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.execute(text(ddl))
+                print(f"Added column {table.name}.{column.name}")
+
+
+def migrate_exercise_images(engine, batch_size: int = 100) -> int:
+    """
+    Move images still stored inline in `exercises.image_base64` into the
+    blob store, keeping only their hash, size and mime type on the row.
+    Safe to run repeatedly; returns the number of rows moved.
+    """
+    from core.blob_store import blob_store, sniff_image_mime
+
+    inspector = inspect(engine)
+    if not inspector.has_table("exercises"):
+        return 0
+    columns = {column["name"] for column in inspector.get_columns("exercises")}
+    if "image_base64" not in columns:
+        return 0
+
+    moved = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, image_base64 FROM exercises "
+                    "WHERE image_base64 IS NOT NULL LIMIT :limit"
+                ),
+                {"limit": batch_size}
+            ).all()
+            if not rows:
+                break
+
+            for exercise_id, image_base64 in rows:
+                try:
+                    data = base64.b64decode(image_base64, validate=False)
+                except (binascii.Error, ValueError):
+                    print(f"Exercise {exercise_id}: unreadable base64 image dropped")
+                    data = b""
+
+                values = {"id": exercise_id, "sha": None, "size": None, "mime": None}
+                if data:
+                    values["sha"] = blob_store.put(data)
+                    values["size"] = len(data)
+                    values["mime"] = sniff_image_mime(data[:16]) or "application/octet-stream"
+
+                conn.execute(
+                    text(
+                        "UPDATE exercises SET image_sha256 = :sha, image_size = :size, "
+                        "image_mime = :mime, image_base64 = NULL WHERE id = :id"
+                    ),
+                    values
+                )
+                moved += 1
+
+    if moved:
+        print(f"Moved {moved} exercise image(s) into the blob store")
+    return moved
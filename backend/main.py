@@ -1,4 +1,5 @@
 import pathlib
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -6,19 +7,49 @@ from fastapi.responses import FileResponse
 import os # Need os for path joining
 
 from core.config import settings
+from core.tutor_service import TutorService
+from core.roadmap_worker import roadmap_worker
+from core.image_pipeline import image_pipeline
+from core.password_hasher import password_hasher
+from core.answer_verifier import verifier_pool
+from core.practice_pool import practice_pool
+from core.model_router import model_router
+from core.response_cache import response_cache
 from db.database import create_tables
 # FIX: Only import active routers
-from routers import auth, exercise, roadmap 
+from routers import auth, exercise, hint, roadmap, metrics
 
 # Create all database tables (if they don't exist)
 create_tables()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the shared LLM clients and chains before taking traffic
+    if settings.LLM_WARM_UP_ON_STARTUP:
+        TutorService.warm_up()
+    if settings.PASSWORD_HASH_WARM_UP_ON_STARTUP:
+        await password_hasher.warm_up()
+    if settings.ROADMAP_WORKER_IN_PROCESS:
+        await roadmap_worker.start()
+    if settings.PRACTICE_POOL_ENABLED:
+        await practice_pool.start()
+    yield
+    await practice_pool.stop()
+    if settings.ROADMAP_WORKER_IN_PROCESS:
+        await roadmap_worker.stop()
+    await model_router.flush()
+    await response_cache.flush_hits()
+    image_pipeline.shutdown()
+    password_hasher.shutdown()
+    verifier_pool.shutdown()
+
 app = FastAPI(
     title="EDUKIE AI Tutor API",
     description="API for the EDUKIE AI learning platform.",
     version="0.1.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # --- FIX: Define Base Directories Robustly ---
@@ -28,7 +59,9 @@ FRONTEND_DIR = BASE_DIR / "frontend"
 # --- API Routers ---
 app.include_router(auth.router, prefix=settings.API_PREFIX)
 app.include_router(exercise.router, prefix=settings.API_PREFIX)
+app.include_router(hint.router, prefix=settings.API_PREFIX)
 app.include_router(roadmap.router, prefix=settings.API_PREFIX)
+app.include_router(metrics.router, prefix=settings.API_PREFIX)
 
 # --- Frontend Serving ---
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from db.database import Base
 from sqlalchemy.sql import func
@@ -13,8 +13,16 @@ class Exercise(Base):
     
     # Exercise content (from text or OCR)
     content = Column(Text, nullable=False)
-    # Original image (optional) - stored as base64
-    image_base64 = Column(Text, nullable=True) 
+    # Original image (optional) - the bytes live in the blob store
+    # (core/blob_store.py), keyed by their SHA-256
+    image_sha256 = Column(String(64), nullable=True, index=True)
+    image_size = Column(Integer, nullable=True)
+    image_mime = Column(String, nullable=True)
+
+    # Final result, extracted once by the LLM for the local answer verifier
+    # (core/answer_verifier.py). kind: number, expression or other; NULL until extracted
+    expected_answer = Column(Text, nullable=True)
+    expected_answer_kind = Column(String, nullable=True)
     
     status = Column(String, default="in_progress") # in_progress, completed
     
@@ -22,6 +30,9 @@ class Exercise(Base):
 
     user = relationship("User", back_populates="exercises")
     interactions = relationship("Interaction", back_populates="exercise", cascade="all, delete-orphan")
+    hint_steps = relationship(
+        "HintStep", back_populates="exercise", cascade="all, delete-orphan", order_by="HintStep.level"
+    )
 
 # This table stores each turn (AI hint, user answer)
 class Interaction(Base):
@@ -44,4 +55,24 @@ class Interaction(Base):
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    exercise = relationship("Exercise", back_populates="interactions")
\ No newline at end of file
+    exercise = relationship("Exercise", back_populates="interactions")
+
+# This table stores the hint ladder: progressively stronger hints that follow
+# the first one, generated in a single LLM call and revealed one at a time
+class HintStep(Base):
+    __tablename__ = "hint_steps"
+    __table_args__ = (UniqueConstraint("exercise_id", "level"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    exercise_id = Column(Integer, ForeignKey("exercises.id"), nullable=False, index=True)
+
+    # 1 = the hint right after the initial guidance
+    level = Column(Integer, nullable=False)
+    content = Column(Text, nullable=False)
+
+    # NULL until the student asks for this hint
+    revealed_at = Column(DateTime(timezone=True), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    exercise = relationship("Exercise", back_populates="hint_steps")
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime
+from sqlalchemy.sql import func
+from db.database import Base
+
+
+# Persistent tier of the LLM response cache (see core/response_cache.py)
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_response_cache"
+
+    # SHA-256 of (kind, prompt version, model, normalized inputs)
+    key = Column(String(64), primary_key=True)
+    kind = Column(String, index=True, nullable=False) # guidance, similar_exercise
+
+    # Serialized response (plain text or model JSON)
+    value = Column(Text, nullable=False)
+
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(Float, index=True, nullable=False) # Unix timestamp
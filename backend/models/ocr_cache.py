@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy.sql import func
+from db.database import Base
+
+
+# Problem text transcribed from exercise photos, looked up by the photo's
+# SHA-256 or, optionally, its perceptual hash (see core/ocr_cache.py)
+class ImageTranscription(Base):
+    __tablename__ = "image_transcriptions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # First 64 bits of dhash256. Rows written before dhash256 hold an 8x8
+    # dHash here, too coarse to tell pages of text apart; they are only
+    # ever matched exactly, by image_sha256.
+    dhash = Column(String(16), index=True, nullable=False)
+    # 256-bit dHash as 64 hex digits
+    dhash256 = Column(String(64), index=True)
+    # 1024-bit dHash as 256 hex digits, to verify a near-duplicate match
+    fine_dhash = Column(String(256))
+    # The photo the text was read from (blob store key)
+    image_sha256 = Column(String(64), index=True, nullable=False)
+
+    problem_text = Column(Text, nullable=False)
+
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
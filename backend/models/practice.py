@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy.sql import func
+from db.database import Base
+
+
+# Pre-generated practice exercises, served instead of generating a
+# similar exercise on demand (see core/practice_pool.py)
+class PracticeExercise(Base):
+    __tablename__ = "practice_pool"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # SHA-256 of the normalized source exercise text
+    source_key = Column(String(64), index=True, nullable=False)
+    source_content = Column(Text, nullable=False)
+
+    # The generated practice exercise
+    content = Column(Text, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set once the exercise has been handed to a student
+    served_at = Column(DateTime(timezone=True), nullable=True, index=True)
@@ -21,5 +21,11 @@ class RoadmapJob(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     completed_at = Column(DateTime(timezone=True), nullable=True)
 
+    # Worker bookkeeping (see core/roadmap_worker.py)
+    attempts = Column(Integer, nullable=False, server_default="0")
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True) # Retry backoff
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+    worker_id = Column(String, nullable=True)
+
     # Relationship
     user = relationship("User", back_populates="roadmaps")
\ No newline at end of file
@@ -1,30 +1,34 @@
 import datetime
 from fastapi import APIRouter, Depends, HTTPException, status, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta, datetime, UTC
 
-from db.database import get_db
+from db.database import get_async_db
 # FIX: Import models directly from their files, not through the __init__.py
 from models.user import User as UserModel
 from schemas import user as user_schema
 from schemas import token as token_schema
 from core.config import settings
+from core.auth_cache import UserSnapshot, auth_cache
 
 # --- Password Hashing & Token utils ---
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 
-# Using argon2 is a great choice, as you noted.
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Argon2 runs in a dedicated process pool (core/password_hasher.py)
+from core.password_hasher import PasswordHasherBusy, password_hasher
+from core.admission import INTERACTIVE, rate_limiter, too_many_requests
+from core.llm_scheduler import set_llm_class
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_PREFIX}/auth/token")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in requests right now, please try again shortly",
+        headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+    )
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -44,12 +48,14 @@ router = APIRouter(
 )
 
 @router.post("/register", response_model=user_schema.User)
-def register_user(
+async def register_user(
     user: user_schema.UserCreate, # <-- This schema now contains all the new fields
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Check if email already exists
-    db_user_email = db.query(UserModel).filter(UserModel.email == user.email).first()
+    db_user_email = (await db.execute(
+        select(UserModel).where(UserModel.email == user.email)
+    )).scalars().first()
     if db_user_email:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -57,14 +63,19 @@ def register_user(
         )
     
     # Check if username already exists
-    db_user_username = db.query(UserModel).filter(UserModel.username == user.username).first()
+    db_user_username = (await db.execute(
+        select(UserModel).where(UserModel.username == user.username)
+    )).scalars().first()
     if db_user_username:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already taken"
         )
     
-    hashed_password = get_password_hash(user.password)
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     
     # Create the new user object with all fields from the schema
     new_user = UserModel(
@@ -78,23 +89,37 @@ def register_user(
     )
         
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     return new_user
 
 
 @router.post("/token", response_model=token_schema.Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     # Note: Login still uses email (form_data.username)
-    user = db.query(UserModel).filter(UserModel.email == form_data.username).first()
+    user = (await db.execute(
+        select(UserModel).where(UserModel.email == form_data.username)
+    )).scalars().first()
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    matches, new_hash = False, None
+    if user:
+        try:
+            matches, new_hash = await password_hasher.verify(form_data.password, user.hashed_password)
+        except PasswordHasherBusy:
+            raise _hasher_busy()
+
+    if not matches:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    if new_hash:
+        # Stored with outdated Argon2 parameters; upgrade it now that we have the password
+        user.hashed_password = new_hash
+        await db.commit()
         
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -103,23 +128,57 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
     
     return {"access_token": access_token, "token_type": "bearer"}
 
-# --- Auth Dependency (No changes needed here) ---
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# --- Auth Dependency ---
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> UserSnapshot:
+    """
+    Resolve the bearer token to a cached snapshot of the user.
+    A warm cache answers without decoding the JWT or querying the DB.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+
+    email = auth_cache.get_token_subject(token)
+    if email is None:
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            email: str = payload.get("sub")
+            if email is None:
+                raise credentials_exception
+            token_data = token_schema.TokenData(email=email)
+        except JWTError:
             raise credentials_exception
-        token_data = token_schema.TokenData(email=email)
-    except JWTError:
-        raise credentials_exception
-        
-    user = db.query(UserModel).filter(UserModel.email == token_data.email).first()
+        auth_cache.put_token(token, token_data.email, payload.get("exp"))
+
+    user = auth_cache.get_user(email)
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        db_user = (await db.execute(
+            select(UserModel).where(UserModel.email == email)
+        )).scalars().first()
+        if db_user is None:
+            raise credentials_exception
+        user = UserSnapshot.from_model(db_user)
+        auth_cache.put_user(user)
+    return user
+
+
+def rate_limited(endpoint_class: str):
+    """
+    Dependency: the current user, admitted through their token bucket for
+    `endpoint_class` (core/admission.py), or a 429 with Retry-After.
+    Also sets the scheduling class of the request's model calls.
+    """
+    async def dependency(current_user: UserSnapshot = Depends(get_current_user)) -> UserSnapshot:
+        if settings.RATE_LIMIT_ENABLED:
+            retry_after = rate_limiter.take(endpoint_class, current_user.id, current_user.is_premium)
+            if retry_after:
+                raise too_many_requests("Too many requests, please slow down", retry_after)
+        set_llm_class(interactive=endpoint_class in INTERACTIVE, premium=current_user.is_premium)
+        return current_user
+    return dependency
+
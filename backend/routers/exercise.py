@@ -1,89 +1,354 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
 import base64
+import binascii
+import json
 
-from db.database import get_db
+from db.database import get_async_db, AsyncSessionLocal
 # FIX: Import models directly from their files, not through the __init__.py
-from models.user import User as UserModel
 from models.exercise import Exercise as ExerciseModel
 from models.exercise import Interaction as InteractionModel 
 from schemas import exercise as exercise_schema
 from core.tutor_service import TutorService
-from routers.auth import get_current_user
+from core.similar_prefetch import similar_prefetcher
+from core.practice_pool import practice_pool
+from core.answer_keys import answer_keys
+from core.hint_ladder import hint_ladder, first_hint_of
+from core.ocr_cache import combine_exercise_text, split_transcribed_guidance
+from core.blob_store import blob_store, sniff_image_mime, is_valid_digest
+from core.config import settings
+from core import admission
+from core.admission import LLMOverloaded, overloaded_response, rate_limiter
+from core.resilience import LLMDeadlineExceeded, deadline_response
+from core.cancellation import (
+    ClientDisconnected,
+    RequestDeadlineExceeded,
+    cancellation_stats,
+    client_closed_response,
+    request_scope,
+)
+from core.uploads import ExerciseImage, ExerciseUploadParser, check_content_length
+from core.sse import sse_event, SSE_HEADERS
+from routers.auth import get_current_user, rate_limited
+from core.auth_cache import UserSnapshot
 
 router = APIRouter(
     prefix="/exercises",
     tags=["exercises"]
 )
 
+async def _store_image(data: bytes) -> ExerciseImage:
+    mime = sniff_image_mime(data[:16])
+    if mime is None:
+        raise HTTPException(status_code=400, detail="Unsupported image format")
+    # Disk I/O, keep it off the event loop
+    digest = await asyncio.to_thread(blob_store.put, data)
+    return ExerciseImage(sha256=digest, size=len(data), mime=mime)
+
+
+async def _read_exercise_payload(request: Request) -> tuple[str, ExerciseImage | None]:
+    """
+    Accepts either multipart/form-data (`prompt` field + `image` file, the
+    preferred way to upload photos) or JSON ({"prompt", "base64_image"}).
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        prompt, image = await ExerciseUploadParser(request).parse()
+    elif content_type.startswith("application/x-www-form-urlencoded"):
+        # Text-only form post
+        check_content_length(request, settings.UPLOAD_MAX_FIELD_BYTES)
+        form = await request.form()
+        prompt, image = str(form.get("prompt", "")), None
+    else:
+        # base64 inflates the image by a third; bound the body before reading it
+        check_content_length(
+            request, settings.UPLOAD_MAX_IMAGE_BYTES * 4 // 3 + settings.UPLOAD_MAX_FIELD_BYTES
+        )
+        try:
+            data = await request.json()
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid JSON payload")
+
+        prompt = data.get("prompt", "")
+        base64_image = data.get("base64_image")
+
+        image = None
+        if base64_image:
+            try:
+                image_bytes = base64.b64decode(base64_image, validate=True)
+            except (binascii.Error, ValueError):
+                raise HTTPException(status_code=400, detail="Invalid base64 image")
+            image = await _store_image(image_bytes)
+
+    if not prompt and not image:
+        raise HTTPException(status_code=400, detail="Must provide either text or an image")
+
+    return prompt, image
+
+
+async def _load_image_bytes(image: ExerciseImage | None) -> bytes | None:
+    if image is None:
+        return None
+    return await asyncio.to_thread(blob_store.read, image.sha256)
+
+
+async def _save_new_exercise(
+    db: AsyncSession,
+    user_id: int,
+    prompt: str,
+    image: ExerciseImage | None,
+    initial_guidance: str
+) -> ExerciseModel:
+    """
+    Store the exercise and its first hint once the AI has answered.
+    """
+    exercise_content = prompt
+
+    if image:
+        # Use the problem transcribed from the photo as the exercise content
+        problem, _ = split_transcribed_guidance(initial_guidance)
+        if problem:
+            exercise_content = combine_exercise_text(problem, prompt)
+        elif not prompt:
+            first_line = initial_guidance.strip().split('\n')[0]
+            exercise_content = first_line or "Exercise from image"
+    
+    db_exercise = ExerciseModel(
+        user_id=user_id,
+        content=exercise_content,
+        image_sha256=image.sha256 if image else None,
+        image_size=image.size if image else None,
+        image_mime=image.mime if image else None
+    )
+    db.add(db_exercise)
+    await db.flush()
+
+    # Save the first interaction
+    first_interaction = InteractionModel(
+        exercise_id=db_exercise.id,
+        ai_response=initial_guidance
+    )
+    db.add(first_interaction)
+    await db.commit()
+
+    # Reload with the interactions (and server-side defaults) eagerly,
+    # since lazy loading is not available on an AsyncSession.
+    result = await db.execute(
+        select(ExerciseModel)
+        .options(selectinload(ExerciseModel.interactions))
+        .where(ExerciseModel.id == db_exercise.id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().one()
+
+
+def _prefetch_for_exercise(db_exercise: ExerciseModel, premium: bool):
+    """
+    Start preparing the hint ladder, the answer key and the follow-up
+    exercise as soon as an exercise exists.
+    """
+    if settings.HINT_LADDER_GENERATE_ON_CREATE and db_exercise.interactions:
+        hint_ladder.schedule(
+            db_exercise.id, db_exercise.content, first_hint_of(db_exercise.interactions[0].ai_response),
+            premium=premium
+        )
+    if settings.ANSWER_VERIFIER_ENABLED and settings.ANSWER_KEY_EXTRACT_ON_CREATE:
+        answer_keys.schedule(db_exercise.id, db_exercise.content, premium=premium)
+    if settings.SIMILAR_EXERCISE_PREFETCH_ON_CREATE:
+        similar_prefetcher.prefetch(db_exercise.content, premium=premium)
+    if settings.PRACTICE_POOL_ENABLED and settings.PRACTICE_POOL_FILL_ON_CREATE:
+        practice_pool.request_refill(db_exercise.content, db_exercise.user_id, premium)
+
+
+async def _keep_in_practice_pool(exercise_content: str, suggested_exercise_text: str):
+    # The pool is an optimization: a failed insert must not fail the answer
+    try:
+        await practice_pool.add(exercise_content, suggested_exercise_text)
+    except Exception as e:
+        print(f"Practice pool insert failed: {e}")
+
+
 @router.post("/", response_model=exercise_schema.ExerciseResponse)
 async def create_exercise(
     request: Request,
-    db: Session = Depends(get_db),
-    current_user: UserModel = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(rate_limited(admission.HINT))
 ):
     """
-    Create a new exercise (from text and/or base64 image).
+    Create a new exercise (from text and/or an image).
     Returns the first hint.
     """
-    try:
-        data = await request.json()
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid JSON payload")
-    
-    prompt = data.get("prompt", "")
-    base64_image = data.get("base64_image")
-
-    if not prompt and not base64_image:
-        raise HTTPException(status_code=400, detail="Must provide either text or an image")
+    prompt, image = await _read_exercise_payload(request)
 
     try:
-        # 1. Call AI to get the first hint
-        initial_guidance = await TutorService.get_initial_guidance(
-            prompt=prompt,
-            base64_image=base64_image
-        )
-
-        # 2. Create the exercise in the DB
-        exercise_content = prompt
-        
-        if not prompt and base64_image:
-            try:
-                # Use the OCR output from the guidance as the exercise content
-                exercise_content = initial_guidance.split('\n')[0]
-            except:
-                exercise_content = "Exercise from image"
-        
-        db_exercise = ExerciseModel(
-            user_id=current_user.id,
-            content=exercise_content,
-            image_base64=base64_image
-        )
-        db.add(db_exercise)
-        db.commit()
-
-        # 3. Save the first interaction
-        first_interaction = InteractionModel(
-            exercise_id=db_exercise.id,
-            ai_response=initial_guidance
-        )
-        db.add(first_interaction)
-        db.commit()
-        db.refresh(db_exercise)
+        # Stops the model call and the writes if the client goes away
+        async with request_scope(request, "create_exercise"):
+            # 1. Call AI to get the first hint
+            initial_guidance = await TutorService.get_initial_guidance(
+                prompt=prompt,
+                image=await _load_image_bytes(image)
+            )
 
+            # 2. Create the exercise and its first interaction in the DB
+            db_exercise = await _save_new_exercise(db, current_user.id, prompt, image, initial_guidance)
+        _prefetch_for_exercise(db_exercise, current_user.is_premium)
         return db_exercise
 
+    except LLMOverloaded as e:
+        await db.rollback()
+        raise overloaded_response(e)
+    except (LLMDeadlineExceeded, RequestDeadlineExceeded):
+        await db.rollback()
+        raise deadline_response()
+    except ClientDisconnected:
+        await db.rollback()
+        raise client_closed_response()
     except Exception as e:
+        await db.rollback()
         print(f"Error creating exercise: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing: {str(e)}")
 
 
+@router.post("/stream")
+async def create_exercise_stream(
+    request: Request,
+    current_user: UserSnapshot = Depends(rate_limited(admission.HINT))
+):
+    """
+    Streaming variant of create_exercise.
+    Sends the first hint as Server-Sent Events while Gemini generates it:
+    - `token`: {"text": "..."} for every chunk
+    - `done`:  the stored exercise (same shape as POST /exercises/)
+    - `error`: {"detail": "..."}, plus "retry_after" (seconds) when the tutor is overloaded
+    The exercise is only written to the DB once the stream has finished, and
+    not at all if the client went away or the request ran past its deadline.
+    """
+    prompt, image = await _read_exercise_payload(request)
+    user_id, premium = current_user.id, current_user.is_premium
+
+    async def generate(queue: asyncio.Queue):
+        # A task of its own, so the request scope only ever cancels the
+        # model call, never the response while it is sending an event.
+        # Puts every chunk, then None or the exception that ended it.
+        try:
+            async with request_scope(request, "create_exercise"):
+                async for chunk in TutorService.stream_initial_guidance(
+                    prompt=prompt,
+                    image=await _load_image_bytes(image)
+                ):
+                    queue.put_nowait(chunk)
+        except Exception as e:
+            queue.put_nowait(e)
+        else:
+            queue.put_nowait(None)
+
+    async def event_stream():
+        queue: asyncio.Queue = asyncio.Queue()
+        producer = asyncio.create_task(generate(queue))
+        chunks = []
+        try:
+            while (chunk := await queue.get()) is not None:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                chunks.append(chunk)
+                yield sse_event("token", json.dumps({"text": chunk}, ensure_ascii=False))
+        except LLMOverloaded as e:
+            busy = overloaded_response(e)
+            yield sse_event("error", json.dumps({
+                "detail": busy.detail,
+                "retry_after": int(busy.headers["Retry-After"])
+            }))
+            return
+        except (LLMDeadlineExceeded, RequestDeadlineExceeded):
+            yield sse_event("error", json.dumps({"detail": deadline_response().detail}, ensure_ascii=False))
+            return
+        except ClientDisconnected:
+            return # Nobody left to send the error to
+        except Exception as e:
+            print(f"Error streaming exercise: {e}")
+            yield sse_event("error", json.dumps({"detail": f"Error processing: {str(e)}"}))
+            return
+        finally:
+            producer.cancel()
+
+        if await request.is_disconnected():
+            # Gone between the last chunk and the write
+            cancellation_stats.record_request("create_exercise", "disconnected")
+            return
+
+        # The request-scoped session may already be closed while the
+        # response streams, so the writes use a session of their own.
+        async with AsyncSessionLocal() as db:
+            try:
+                db_exercise = await _save_new_exercise(db, user_id, prompt, image, "".join(chunks))
+                exercise_json = exercise_schema.ExerciseResponse.model_validate(db_exercise).model_dump_json()
+                _prefetch_for_exercise(db_exercise, premium)
+            except Exception as e:
+                await db.rollback()
+                print(f"Error saving streamed exercise: {e}")
+                yield sse_event("error", json.dumps({"detail": f"Error processing: {str(e)}"}))
+                return
+
+        yield sse_event("done", exercise_json)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+@router.get("/images/{image_sha256}")
+async def get_exercise_image(
+    image_sha256: str,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """
+    Stream an exercise image from the blob store.
+    Images are immutable (the URL is their hash), so browsers can cache
+    them forever and revalidate with If-None-Match.
+    """
+    if not is_valid_digest(image_sha256):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    # Only serve images attached to one of the user's own exercises
+    image_mime = (await db.execute(
+        select(ExerciseModel.image_mime).where(
+            ExerciseModel.image_sha256 == image_sha256,
+            ExerciseModel.user_id == current_user.id
+        ).limit(1)
+    )).scalars().first()
+    if image_mime is None or not blob_store.exists(image_sha256):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    etag = f'"{image_sha256}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=31536000, immutable",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    headers["Content-Length"] = str(blob_store.size(image_sha256))
+    return StreamingResponse(
+        blob_store.iter_chunks(image_sha256),
+        media_type=image_mime,
+        headers=headers
+    )
+
+
 @router.post("/{exercise_id}/answer")
 async def submit_answer(
     exercise_id: int,
     request: Request,
-    db: Session = Depends(get_db),
-    current_user: UserModel = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(rate_limited(admission.CHECK))
 ):
     """
     Submit an answer for an in-progress exercise.
@@ -97,10 +362,12 @@ async def submit_answer(
     if not user_answer:
         raise HTTPException(status_code=422, detail="Missing 'answer' field")
 
-    db_exercise = db.query(ExerciseModel).filter(
-        ExerciseModel.id == exercise_id,
-        ExerciseModel.user_id == current_user.id
-    ).first()
+    db_exercise = (await db.execute(
+        select(ExerciseModel).where(
+            ExerciseModel.id == exercise_id,
+            ExerciseModel.user_id == current_user.id
+        )
+    )).scalars().first()
 
     if not db_exercise:
         raise HTTPException(status_code=404, detail="Exercise not found")
@@ -108,44 +375,77 @@ async def submit_answer(
     if db_exercise.status == "completed":
         raise HTTPException(status_code=400, detail="Exercise is already completed")
 
+    # A ready exercise in the practice pool makes speculation unnecessary
+    in_pool = settings.PRACTICE_POOL_ENABLED and await practice_pool.has_ready(db_exercise.content)
+
+    speculative = None
+    if (
+        settings.SIMILAR_EXERCISE_SPECULATION != "off"
+        and not in_pool
+        and not rate_limiter.take(admission.SPECULATION, current_user.id, current_user.is_premium)
+    ):
+        # Start on the next exercise while the answer is being checked
+        speculative = similar_prefetcher.start(db_exercise.content, premium=current_user.is_premium)
+
+    if settings.ANSWER_VERIFIER_ENABLED and db_exercise.expected_answer_kind is None:
+        # Not extracted yet: this answer goes to the LLM, later ones may not
+        answer_keys.schedule(db_exercise.id, db_exercise.content, premium=current_user.is_premium)
+
     try:
-        # 1. Call AI to check the answer (returns a Pydantic object: CheckAnswerLLM)
-        check_response_obj = await TutorService.check_user_answer(
-            exercise_content=db_exercise.content,
-            user_answer=user_answer
-        )
+        # Stops the model calls and the writes if the client goes away
+        async with request_scope(request, "submit_answer"):
+            # 1. Call AI to check the answer (returns a Pydantic object: CheckAnswerLLM)
+            check_response_obj = await TutorService.check_user_answer(
+                exercise_content=db_exercise.content,
+                user_answer=user_answer,
+                expected_answer=db_exercise.expected_answer,
+                expected_answer_kind=db_exercise.expected_answer_kind
+            )
         
-        # FIX: Get data directly from the object's structured fields
-        is_correct = check_response_obj.is_correct
-        check_response_text = check_response_obj.explanation # The text explanation
+            # FIX: Get data directly from the object's structured fields
+            is_correct = check_response_obj.is_correct
+            check_response_text = check_response_obj.explanation # The text explanation
         
-        # 2. Save the user's answer and the AI's check
-        db_interaction = InteractionModel(
-            exercise_id=db_exercise.id,
-            user_answer=user_answer,
-            ai_response=check_response_text, # FIX: Store the text explanation
-            is_correct=is_correct
-        )
-        db.add(db_interaction)
+            # 2. Save the user's answer and the AI's check
+            db_interaction = InteractionModel(
+                exercise_id=db_exercise.id,
+                user_answer=user_answer,
+                ai_response=check_response_text, # FIX: Store the text explanation
+                is_correct=is_correct
+            )
+            db.add(db_interaction)
 
-        suggested_exercise_text = None
-        if is_correct:
-            db_exercise.status = "completed"
+            suggested_exercise_text = None
+            if is_correct:
+                db_exercise.status = "completed"
             
-            # 3. If correct, get a similar exercise (returns a Pydantic object: SimilarExerciseLLM)
-            suggested_exercise_obj = await TutorService.get_similar_exercise(
-                exercise_content=db_exercise.content
-            )
-            suggested_exercise_text = suggested_exercise_obj.content # FIX: Access the content field
+                # 3. If correct, serve a pre-generated exercise from the pool...
+                if settings.PRACTICE_POOL_ENABLED:
+                    suggested_exercise_text = await practice_pool.pop(
+                        db_exercise.content, current_user.id, current_user.is_premium
+                    )
+
+                # ...or get a similar exercise (returns a Pydantic object: SimilarExerciseLLM)
+                if suggested_exercise_text is None:
+                    if speculative is not None:
+                        suggested_exercise_obj = await similar_prefetcher.result(speculative)
+                    else:
+                        suggested_exercise_obj = await TutorService.get_similar_exercise(
+                            exercise_content=db_exercise.content
+                        )
+                    suggested_exercise_text = suggested_exercise_obj.content # FIX: Access the content field
+                    if settings.PRACTICE_POOL_ENABLED:
+                        # Keep it for the next user of this source, so a miss still fills the pool
+                        await _keep_in_practice_pool(db_exercise.content, suggested_exercise_text)
             
-            # 4. Save the suggestion as a new interaction
-            suggestion_interaction = InteractionModel(
-                exercise_id=db_exercise.id,
-                suggested_exercise=suggested_exercise_text
-            )
-            db.add(suggestion_interaction)
+                # 4. Save the suggestion as a new interaction
+                suggestion_interaction = InteractionModel(
+                    exercise_id=db_exercise.id,
+                    suggested_exercise=suggested_exercise_text
+                )
+                db.add(suggestion_interaction)
         
-        db.commit()
+            await db.commit()
 
         return {
             "check_response": check_response_text,
@@ -153,7 +453,22 @@ async def submit_answer(
             "suggested_exercise": suggested_exercise_text
         }
 
+    except LLMOverloaded as e:
+        await db.rollback()
+        raise overloaded_response(e)
+    except (LLMDeadlineExceeded, RequestDeadlineExceeded):
+        await db.rollback()
+        raise deadline_response()
+    except ClientDisconnected:
+        await db.rollback()
+        raise client_closed_response()
     except Exception as e:
+        await db.rollback()
         print(f"Error processing: {e}")
         # Re-raise the exception as an HTTP 500 error for the client
-        raise HTTPException(status_code=500, detail=f"Error processing: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error processing: {str(e)}")
+
+    finally:
+        # Wrong answer or error: park or cancel the unused suggestion
+        if speculative is not None:
+            similar_prefetcher.release(speculative)
\ No newline at end of file
@@ -0,0 +1,112 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+
+from db.database import get_async_db
+from models.exercise import Exercise as ExerciseModel
+from models.exercise import HintStep as HintStepModel
+from models.exercise import Interaction as InteractionModel
+from schemas import exercise as exercise_schema
+from core import admission
+from core.admission import LLMOverloaded, overloaded_response
+from core.resilience import LLMDeadlineExceeded, deadline_response
+from core.hint_ladder import hint_ladder, first_hint_of
+from routers.auth import get_current_user, rate_limited
+from core.auth_cache import UserSnapshot
+
+router = APIRouter(
+    prefix="/exercises",
+    tags=["hints"]
+)
+
+
+async def _get_owned_exercise(db: AsyncSession, exercise_id: int, user_id: int) -> ExerciseModel:
+    db_exercise = (await db.execute(
+        select(ExerciseModel).where(
+            ExerciseModel.id == exercise_id,
+            ExerciseModel.user_id == user_id
+        )
+    )).scalars().first()
+    if not db_exercise:
+        raise HTTPException(status_code=404, detail="Exercise not found")
+    return db_exercise
+
+
+async def _first_hint(db: AsyncSession, exercise_id: int) -> str:
+    initial_guidance = (await db.execute(
+        select(InteractionModel.ai_response)
+        .where(InteractionModel.exercise_id == exercise_id)
+        .order_by(InteractionModel.id)
+        .limit(1)
+    )).scalar_one_or_none()
+    return first_hint_of(initial_guidance or "")
+
+
+@router.post("/{exercise_id}/hints/next", response_model=exercise_schema.NextHintResponse)
+async def next_hint(
+    exercise_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(rate_limited(admission.HINT))
+):
+    """
+    Reveal the next, stronger hint from the exercise's hint ladder.
+    The hint is also stored as an interaction.
+    """
+    db_exercise = await _get_owned_exercise(db, exercise_id, current_user.id)
+
+    try:
+        step, remaining = await hint_ladder.next_hint(
+            db,
+            db_exercise.id,
+            db_exercise.content,
+            await _first_hint(db, db_exercise.id),
+            premium=current_user.is_premium
+        )
+        if step is None:
+            await db.rollback()
+            raise HTTPException(status_code=404, detail="No more hints for this exercise")
+
+        db.add(InteractionModel(
+            exercise_id=db_exercise.id,
+            ai_response=step.content
+        ))
+        await db.commit()
+
+        return exercise_schema.NextHintResponse(
+            level=step.level,
+            content=step.content,
+            revealed_at=step.revealed_at,
+            remaining=remaining
+        )
+
+    except HTTPException:
+        raise
+    except LLMOverloaded as e:
+        await db.rollback()
+        raise overloaded_response(e)
+    except LLMDeadlineExceeded:
+        await db.rollback()
+        raise deadline_response()
+    except Exception as e:
+        await db.rollback()
+        print(f"Error getting next hint: {e}")
+        raise HTTPException(status_code=500, detail=f"Error processing: {str(e)}")
+
+
+@router.get("/{exercise_id}/hints", response_model=List[exercise_schema.HintResponse])
+async def list_hints(
+    exercise_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """
+    The hints revealed so far, in order.
+    """
+    await _get_owned_exercise(db, exercise_id, current_user.id)
+    result = await db.execute(
+        select(HintStepModel)
+        .where(HintStepModel.exercise_id == exercise_id, HintStepModel.revealed_at.is_not(None))
+        .order_by(HintStepModel.level)
+    )
+    return result.scalars().all()
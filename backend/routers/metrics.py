@@ -0,0 +1,82 @@
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+
+from core.admission import rate_limiter
+from core.answer_keys import answer_keys
+from core.answer_verifier import verifier_pool, verifier_stats
+from core.auth_cache import auth_cache
+from core.blob_store import blob_store
+from core.cancellation import cancellation_stats
+from core.config import settings
+from core.hint_ladder import hint_ladder
+from core.image_pipeline import image_pipeline
+from core.json_repair import structured_output_stats
+from core.llm_registry import LLMRegistry
+from core.llm_scheduler import llm_scheduler
+from core.model_router import model_router
+from core.notify_hub import notification_hub
+from core.ocr_cache import ocr_cache
+from core.password_hasher import password_hasher
+from core.practice_pool import practice_pool
+from core.resilience import resilience_monitor
+from core.response_cache import response_cache
+from core.roadmap_worker import roadmap_worker
+from core.similar_prefetch import similar_prefetcher
+from core.singleflight import llm_flights
+from core.tutor_service import check_answer_batcher
+
+
+def require_metrics_access(authorization: str | None = Header(default=None)):
+    """
+    Hide the endpoint unless METRICS_ENABLED, and check METRICS_TOKEN when set.
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not settings.METRICS_TOKEN:
+        return
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+    dependencies=[Depends(require_metrics_access)]
+)
+
+@router.get("/")
+def get_metrics():
+    """
+    Runtime counters for the performance-related subsystems.
+    """
+    return {
+        "llm_registry": LLMRegistry.stats(),
+        "llm_singleflight": llm_flights.stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "llm_resilience": resilience_monitor.stats(),
+        "model_router": model_router.stats(),
+        "request_cancellation": cancellation_stats.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "structured_output": structured_output_stats.stats(),
+        "auth_cache": auth_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "response_cache": response_cache.stats(),
+        "check_answer_batcher": check_answer_batcher.stats(),
+        "answer_verifier": verifier_stats.stats(),
+        "answer_verifier_pool": verifier_pool.stats(),
+        "answer_keys": answer_keys.stats(),
+        "hint_ladder": hint_ladder.stats(),
+        "similar_prefetch": similar_prefetcher.stats(),
+        "practice_pool": practice_pool.stats(),
+        "roadmap_worker": roadmap_worker.stats(),
+        "notification_hub": notification_hub.stats(),
+        "blob_store": blob_store.stats(),
+        "image_pipeline": image_pipeline.stats(),
+        "ocr_cache": ocr_cache.stats(),
+    }
@@ -1,66 +1,33 @@
+import asyncio
+import json
 import uuid
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, status
-from sqlalchemy.orm import Session
-import asyncio 
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.database import get_db, SessionLocal
+from db.database import get_async_db, AsyncSessionLocal
 # FIX: Import models directly from their files, not through the __init__.py
 from models.roadmap import RoadmapJob as RoadmapJobModel
-from models.user import User as UserModel
 from schemas.roadmap import RoadmapJobResponse, CreateRoadmapRequest
-from core.tutor_service import RoadmapService
-from routers.auth import get_current_user
+from core.config import settings
+from core import admission
+from core.notify_hub import notification_hub, roadmap_topic
+from core.roadmap_worker import roadmap_worker
+from core.sse import sse_event, sse_comment, SSE_HEADERS
+from routers.auth import get_current_user, rate_limited
+from core.auth_cache import UserSnapshot
 
 router = APIRouter(
     prefix="/roadmaps",
     tags=["roadmaps"]
 )
 
-# --- Background Task ---
-def generate_roadmap_task(job_id: str, user_id: int, learning_target: str):
-    """
-    This is the background task that calls the LLM.
-    """
-    db = SessionLocal() 
-    
-    async def _run_async_job():
-        # FIX: Reference models by their new name
-        job = db.query(RoadmapJobModel).filter(RoadmapJobModel.job_id == job_id).first()
-        user = db.query(UserModel).filter(UserModel.id == user_id).first()
-        if not job or not user:
-            return
-
-        job.status = "processing"
-        db.commit()
-
-        try:
-            roadmap_object = await RoadmapService.generate_roadmap(user, learning_target)
-            
-            job.roadmap_data = roadmap_object.model_dump() 
-            job.status = "completed"
-            job.completed_at = datetime.utcnow()
-            
-        except Exception as e:
-            job.status = "failed"
-            job.error = str(e)
-            job.completed_at = datetime.utcnow()
-        
-        db.commit()
-    
-    try:
-        asyncio.run(_run_async_job())
-    finally:
-        db.close()
-# --- End of Task ---
-
-
 @router.post("/create", response_model=RoadmapJobResponse)
-def create_roadmap(
+async def create_roadmap(
     request: CreateRoadmapRequest, 
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
-    current_user: UserModel = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(rate_limited(admission.ROADMAP))
 ):
     """
     Creates a new job to generate a premium learning roadmap.
@@ -81,34 +48,122 @@ def create_roadmap(
         status="pending"
     )
     db.add(job)
-    db.commit()
-    db.refresh(job)
+    await db.commit()
+    await db.refresh(job)
 
-    # Add the slow task to run in the background
-    background_tasks.add_task(
-        generate_roadmap_task,
-        job_id=job_id,
-        user_id=current_user.id,
-        learning_target=request.learning_target
-    )
+    # The job is now queued in the DB; the roadmap worker picks it up.
+    # Wake the in-process worker so it does not wait for its next poll.
+    roadmap_worker.notify()
 
     return job
 
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+async def _get_job(db: AsyncSession, job_id: str, user_id: int) -> RoadmapJobModel:
+    job = (await db.execute(
+        select(RoadmapJobModel)
+        .where(RoadmapJobModel.job_id == job_id)
+        .execution_options(populate_existing=True)
+    )).scalars().first()
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job.user_id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this job")
+
+    return job
+
+
+async def _wait_for_change(queue: asyncio.Queue, timeout: float) -> bool:
+    """
+    Wait until the worker publishes an update for the job, or `timeout` passes.
+    """
+    try:
+        await asyncio.wait_for(queue.get(), timeout=timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
 @router.get("/{job_id}", response_model=RoadmapJobResponse)
-def get_roadmap_job_status(
+async def get_roadmap_job_status(
     job_id: str, 
-    db: Session = Depends(get_db),
-    current_user: UserModel = Depends(get_current_user)
+    wait: float = Query(0, ge=0, description="Long-poll: seconds to wait for the job to finish"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     """
     Checks the status of a roadmap generation job.
+    With `wait`, the request is held until the job completes or fails
+    (or the timeout passes) instead of the client polling repeatedly.
     """
-    job = db.query(RoadmapJobModel).filter(RoadmapJobModel.job_id == job_id).first()
+    job = await _get_job(db, job_id, current_user.id)
+    wait = min(wait, settings.ROADMAP_STATUS_MAX_WAIT_SECONDS)
+    if wait == 0 or job.status in TERMINAL_STATUSES:
+        return job
 
-    if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
-    
-    if job.user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this job")
+    user_id = current_user.id
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    with notification_hub.subscribe(roadmap_topic(job_id)) as queue:
+        # End the read transaction so the DB connection goes back to the
+        # pool while we wait.
+        await db.rollback()
+        # Re-check right after subscribing, in case the job finished meanwhile
+        job = await _get_job(db, job_id, user_id)
+        while job.status not in TERMINAL_STATUSES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await db.rollback()
+            # The recheck interval covers jobs run by a worker in another process
+            await _wait_for_change(queue, min(remaining, settings.ROADMAP_STATUS_RECHECK_SECONDS))
+            job = await _get_job(db, job_id, user_id)
+
+    return job
+
+
+@router.get("/{job_id}/events")
+async def stream_roadmap_job_status(
+    job_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """
+    Server-Sent Events stream of a roadmap job.
+    Sends a `status` event (a full RoadmapJobResponse) whenever the status
+    changes and closes once the job has completed or failed.
+    """
+    # Validate access up front so errors are plain HTTP responses
+    await _get_job(db, job_id, current_user.id)
+    user_id = current_user.id
+
+    async def event_stream():
+        last_status = None
+        with notification_hub.subscribe(roadmap_topic(job_id)) as queue:
+            while True:
+                async with AsyncSessionLocal() as session:
+                    try:
+                        job = await _get_job(session, job_id, user_id)
+                    except HTTPException as e:
+                        yield sse_event("error", json.dumps({"detail": e.detail}))
+                        return
+                    job_json = RoadmapJobResponse.model_validate(job).model_dump_json()
+
+                if job.status != last_status:
+                    last_status = job.status
+                    yield sse_event("status", job_json)
+                if job.status in TERMINAL_STATUSES:
+                    return
 
-    return job
\ No newline at end of file
+                changed = await _wait_for_change(queue, settings.ROADMAP_STATUS_RECHECK_SECONDS)
+                if not changed:
+                    yield sse_comment()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
@@ -19,12 +19,25 @@ class ExerciseResponse(BaseModel):
     id: int
     content: str
     status: str
+    image_sha256: Optional[str] = None # Fetch with GET /exercises/images/{image_sha256}
     created_at: datetime
     interactions: List[InteractionResponse] = [] 
 
     class Config:
         from_attributes = True
 
+# --- Hint ladder ---
+class HintResponse(BaseModel):
+    level: int
+    content: str
+    revealed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class NextHintResponse(HintResponse):
+    remaining: int # Hints still available after this one
+
 # --- Data submitted by user ---
 class SubmitAnswerRequest(BaseModel):
     answer: str # The user's answer
\ No newline at end of file
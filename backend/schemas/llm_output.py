@@ -9,6 +9,33 @@ class CheckAnswerLLM(BaseModel):
     is_correct: bool = Field(description="Whether the user's answer is correct.")
     explanation: str = Field(description="The reasoning for why the answer is correct or incorrect, in a helpful, tutor-like tone.")
 
+class CheckAnswerItemLLM(BaseModel):
+    """
+    The check of one answer within a batch.
+    """
+    index: int = Field(description="The number of the item being checked, as given in the prompt.")
+    is_correct: bool = Field(description="Whether the student's answer to this item is correct.")
+    explanation: str = Field(description="The reasoning for why the answer is correct or incorrect, in a helpful, tutor-like tone.")
+
+class CheckAnswerBatchLLM(BaseModel):
+    """
+    Pydantic model for the LLM to check several independent answers in one call.
+    """
+    results: List[CheckAnswerItemLLM] = Field(description="One entry per item, in any order.")
+
+class ExpectedAnswerLLM(BaseModel):
+    """
+    Pydantic model for the LLM to extract an exercise's final result for local checking.
+    """
+    kind: str = Field(description="'number', 'expression' or 'other'.")
+    answer: str = Field(description="The final result in SymPy syntax, or an empty string when kind is 'other'.")
+
+class HintLadderLLM(BaseModel):
+    """
+    Pydantic model for the LLM to produce progressively stronger hints for one exercise.
+    """
+    hints: List[str] = Field(description="The hints in order, from the gentlest nudge to the most detailed walk-through.")
+
 class SimilarExerciseLLM(BaseModel):
     """
     Pydantic model for the LLM to generate a similar exercise.
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Settings are read at import time: point them at a throwaway database and
+# the offline model provider before any app module is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/tests.db"
+os.environ["LLM_PROVIDER"] = "fake"
+os.environ["GOOGLE_API_KEY"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
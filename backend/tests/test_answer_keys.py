@@ -0,0 +1,34 @@
+import asyncio
+
+from core.answer_keys import AnswerKeyExtractor
+from core.answer_verifier import VerifierUnavailable, verifier_pool
+from core.tutor_service import TutorService
+from db.database import SessionLocal, create_tables
+from models import payment, practice, roadmap, user  # noqa: F401 (maps every model before querying)
+from models.exercise import Exercise
+from schemas.llm_output import ExpectedAnswerLLM
+
+
+def test_busy_verifier_leaves_the_key_to_be_extracted_again(monkeypatch):
+    create_tables()
+    with SessionLocal() as db:
+        exercise = Exercise(user_id=1, content="Giải x - 3 = 0")
+        db.add(exercise)
+        db.commit()
+        exercise_id = exercise.id
+
+    async def extract(cls, exercise_content):
+        return ExpectedAnswerLLM(kind="number", answer="3")
+
+    async def busy(kind, answer):
+        raise VerifierUnavailable("busy")
+
+    monkeypatch.setattr(TutorService, "extract_expected_answer", classmethod(extract))
+    monkeypatch.setattr(verifier_pool, "normalize", busy)
+    extractor = AnswerKeyExtractor()
+    asyncio.run(extractor._extract(exercise_id, "Giải x - 3 = 0", premium=False))
+
+    with SessionLocal() as db:
+        assert db.get(Exercise, exercise_id).expected_answer_kind is None
+    assert extractor.stats()["deferred"] == 1
+    assert extractor.stats()["extracted"] == 0
@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import pytest
+
+from core.answer_verifier import (
+    KIND_EXPRESSION,
+    KIND_NUMBER,
+    KIND_OTHER,
+    AnswerVerifierPool,
+    VerifierUnavailable,
+    _parse,
+    normalize_answer_key,
+    verify_answer,
+)
+
+
+@pytest.mark.parametrize("answer", [
+    "9**9**9",
+    "10^10^8",
+    "2^(3^50)",
+    "10^100000",
+    "exp(exp(exp(10)))",
+    "2^(100*100*100)",
+    "123456789012345678901234567890",
+    "pi.evalf(200000)",
+    "x.subs(x, 2)",
+    "__import__('os')",
+    "foo(2)",
+    "evalf(pi, 200000)",
+    "Integer(10)**Integer(10)",
+])
+def test_rejects_expensive_or_unsafe_input(answer):
+    started = time.monotonic()
+    assert _parse(answer) is None
+    verdict = verify_answer("3", KIND_NUMBER, answer)
+    assert verdict.is_correct is None
+    assert time.monotonic() - started < 1
+
+
+@pytest.mark.parametrize("answer", [
+    "x = 2 hoặc x = 3",
+    "x = 3 hoặc x = 2",
+    "x1 = 2, x2 = 3",
+    "x = 2 và x = 3",
+    "2; 3",
+    "2, 3",
+    "x = y = 3",
+    "x = ±3",
+    "2 3",
+])
+def test_several_values_are_undecided(answer):
+    assert verify_answer("3", KIND_NUMBER, answer).is_correct is None
+
+
+@pytest.mark.parametrize("expected, kind, answer, is_correct", [
+    ("3", KIND_NUMBER, "x = 3", True),
+    ("3", KIND_NUMBER, "4", False),
+    ("2.5", KIND_NUMBER, "2,5", True),
+    ("1/2", KIND_NUMBER, "0.5", True),
+    ("sqrt(2)", KIND_NUMBER, "√2", True),
+    ("2^10", KIND_NUMBER, "1024", True),
+    ("2x + 1", KIND_EXPRESSION, "f'(x) = 1 + 2x", True),
+    ("x^2 - 1", KIND_EXPRESSION, "(x - 1)(x + 1)", True),
+    ("x^2 - 1", KIND_EXPRESSION, "(x - 1)^2", False),
+])
+def test_single_values_are_decided(expected, kind, answer, is_correct):
+    assert verify_answer(expected, kind, answer).is_correct is is_correct
+
+
+def test_rounded_answer_is_left_to_the_tutor():
+    assert verify_answer("pi", KIND_NUMBER, "3.14").is_correct is None
+
+
+def test_normalize_answer_key_rejects_expensive_keys():
+    assert normalize_answer_key("number", "9**9**9") == (None, KIND_OTHER)
+    assert normalize_answer_key("number", "x = 2 hoặc x = 3") == (None, KIND_OTHER)
+    assert normalize_answer_key("number", "12") == ("12", KIND_NUMBER)
+
+
+def test_pool_verifies_in_a_worker():
+    pool = AnswerVerifierPool(workers=1, max_queue=1, timeout=10)
+    try:
+        verdict = asyncio.run(pool.verify("3", KIND_NUMBER, "x = 3"))
+    finally:
+        pool.shutdown()
+    assert verdict.is_correct is True
+    assert pool.stats()["calls"] == 1
+
+
+def test_pool_replaces_its_workers_after_a_timeout():
+    pool = AnswerVerifierPool(workers=1, max_queue=1, timeout=0.5)
+
+    async def scenario():
+        started = time.monotonic()
+        with pytest.raises(VerifierUnavailable):
+            await pool._run(time.sleep, 3)
+        elapsed = time.monotonic() - started
+        verdict = await pool.verify("3", KIND_NUMBER, "3")
+        return elapsed, verdict
+
+    try:
+        elapsed, verdict = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+    # Served by a new worker while the old one is still sleeping
+    assert elapsed < 2
+    assert verdict.is_correct is True
+    assert pool.stats()["timeouts"] == 1
+    assert pool.stats()["restarts"] == 1
+
+
+def test_pool_rejects_beyond_its_queue():
+    pool = AnswerVerifierPool(workers=1, max_queue=0, timeout=5)
+
+    async def scenario():
+        running = asyncio.create_task(pool._run(time.sleep, 0.5))
+        await asyncio.sleep(0.1)
+        verdict = await pool.verify("3", KIND_NUMBER, "3")
+        await running
+        return verdict
+
+    try:
+        verdict = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+    assert verdict.is_correct is None
+    assert pool.stats()["rejected"] == 1
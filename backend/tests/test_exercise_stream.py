@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core.auth_cache import UserSnapshot
+from core.config import settings
+from core.tutor_service import TutorService
+from db.database import SessionLocal, create_tables
+from models import payment, practice, roadmap, user  # noqa: F401 (maps every model before querying)
+from models.exercise import Exercise
+from routers import exercise
+from routers.auth import get_current_user
+
+PROMPT = "Tính đạo hàm của x^3 (stream deadline)"
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(exercise.router, prefix=settings.API_PREFIX)
+    app.dependency_overrides[get_current_user] = lambda: UserSnapshot(
+        id=1, email="a@b.com", username=None, is_premium=False,
+        profile_year=None, profile_skill_level=None, profile_common_mistakes=None
+    )
+    return TestClient(app)
+
+
+def test_stream_past_its_deadline_reports_an_error_and_saves_nothing(monkeypatch):
+    create_tables()
+    cancelled = []
+
+    async def stream(cls, prompt, image=None):
+        yield "Gợi ý: "
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        yield "quá muộn"
+
+    monkeypatch.setattr(TutorService, "stream_initial_guidance", classmethod(stream))
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+    monkeypatch.setitem(settings.REQUEST_DEADLINE_SECONDS, "create_exercise", 0.3)
+
+    response = _client().post("/api/exercises/stream", json={"prompt": PROMPT})
+    events = [line for line in response.text.splitlines() if line.startswith(("event:", "data:"))]
+
+    assert events[0] == "event: token"
+    assert events[-2] == "event: error"
+    assert "detail" in json.loads(events[-1].removeprefix("data:"))
+    assert cancelled == [True]
+    with SessionLocal() as db:
+        assert db.query(Exercise).filter(Exercise.content == PROMPT).count() == 0
@@ -0,0 +1,15 @@
+from core.model_router import model_router
+from core.tutor_service import TutorService
+
+
+def test_key_covers_the_exercise_and_the_image():
+    key = TutorService._guidance_key("Giải x + 1 = 2", None)
+    assert TutorService._guidance_key("Giải  x + 1 = 2 ", None) == key
+    assert TutorService._guidance_key("Giải x + 1 = 3", None) != key
+    assert TutorService._guidance_key("Giải x + 1 = 2", b"photo") != key
+
+
+def test_key_changes_with_the_models_the_router_picks_from(monkeypatch):
+    before = TutorService._guidance_key("Giải x + 1 = 2", None)
+    monkeypatch.setattr(model_router, "strong_model", "another-model")
+    assert TutorService._guidance_key("Giải x + 1 = 2", None) != before
@@ -0,0 +1,60 @@
+import pytest
+from langchain_core.exceptions import OutputParserException
+
+from core.json_repair import RepairingOutputParser, repair_json, structured_output_stats
+from schemas.llm_output import CheckAnswerBatchLLM, CheckAnswerLLM, HintLadderLLM
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}', {"a": 1}),
+    ('```json\n{"a": 1}\n```', {"a": 1}),
+    ('Đây là kết quả: {"a": [1, 2,],} Chúc bạn học tốt!', {"a": [1, 2]}),
+    ('{"a": "b}c", "d": 2}', {"a": "b}c", "d": 2}),
+    # Cut off at the token limit
+    ('{"hints": ["Gợi ý 1", "Gợi ý', {"hints": ["Gợi ý 1", "Gợi ý"]}),
+    ('{"a": {"b": 1,', {"a": {"b": 1}}),
+    ('{"a":', {"a": None}),
+])
+def test_repair_json(text, expected):
+    assert repair_json(text) == expected
+
+
+def test_repair_json_gives_up_on_prose():
+    with pytest.raises(ValueError):
+        repair_json("Xin lỗi, tôi không thể trả lời.")
+
+
+def _parser(schema, call_type="test"):
+    return RepairingOutputParser(pydantic_object=schema, call_type=call_type)
+
+
+def test_clean_output_parses_strictly():
+    result = _parser(CheckAnswerLLM, "test_clean").parse('{"is_correct": true, "explanation": "Đúng"}')
+    assert result == CheckAnswerLLM(is_correct=True, explanation="Đúng")
+    assert structured_output_stats.stats()["test_clean"]["clean"] == 1
+
+
+def test_fields_are_matched_and_coerced_leniently():
+    text = '```json\n{"Is-Correct": "đúng", "explanation": ["Bước 1", "Bước 2"]}\n```'
+    result = _parser(CheckAnswerLLM, "test_repaired").parse(text)
+    assert result == CheckAnswerLLM(is_correct=True, explanation="Bước 1\nBước 2")
+    assert structured_output_stats.stats()["test_repaired"]["repaired"] == 1
+
+
+def test_nested_models_and_single_items_are_coerced():
+    text = '[{"results": {"index": "1", "is_correct": "sai", "explanation": 42}}]'
+    result = _parser(CheckAnswerBatchLLM).parse(text)
+    assert result.results[0].index == 1
+    assert result.results[0].is_correct is False
+    assert result.results[0].explanation == "42"
+
+
+def test_truncated_list_keeps_what_arrived():
+    result = _parser(HintLadderLLM).parse('{"hints": ["Nhắc lại công thức", "Thay số vào')
+    assert result.hints == ["Nhắc lại công thức", "Thay số vào"]
+
+
+def test_unusable_output_raises_for_the_chain_to_retry():
+    with pytest.raises(OutputParserException):
+        _parser(CheckAnswerLLM, "test_failed").parse('{"explanation": "thiếu is_correct"}')
+    assert structured_output_stats.stats()["test_failed"]["failed"] == 1
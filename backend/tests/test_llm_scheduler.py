@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from core.answer_keys import AnswerKeyExtractor
+from core.hint_ladder import HintLadder
+from core.llm_scheduler import (
+    BATCH_FREE,
+    BATCH_PREMIUM,
+    INTERACTIVE_FREE,
+    INTERACTIVE_PREMIUM,
+    LLMOverloaded,
+    LLMScheduler,
+    _current_class,
+    llm_class,
+)
+from core.similar_prefetch import SimilarExercisePrefetcher
+from core.tutor_service import TutorService
+from db.database import create_tables
+
+
+def _scheduler(max_concurrent: int = 1) -> LLMScheduler:
+    return LLMScheduler(
+        max_concurrent=max_concurrent,
+        max_waiting=100,
+        weights={INTERACTIVE_PREMIUM: 8, INTERACTIVE_FREE: 4, BATCH_PREMIUM: 2, BATCH_FREE: 1},
+        max_wait={name: 10 for name in (INTERACTIVE_PREMIUM, INTERACTIVE_FREE, BATCH_PREMIUM, BATCH_FREE)},
+    )
+
+
+def test_slots_are_shared_by_weight_under_load():
+    scheduler = _scheduler()
+    order = []
+
+    async def call(interactive: bool):
+        with llm_class(interactive=interactive, premium=False):
+            async with scheduler.slot():
+                order.append("interactive" if interactive else "batch")
+                await asyncio.sleep(0)
+
+    async def scenario():
+        async with scheduler.slot(): # Busy, so everything below queues
+            tasks = [asyncio.create_task(call(interactive)) for interactive in [False] * 10 + [True] * 10]
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    # Weights 4:1, so the first ten slots go 8 to interactive, 2 to batch
+    assert order[:10].count("interactive") == 8
+    assert len(order) == 20
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_queued_call_past_its_deadline_is_dropped():
+    scheduler = LLMScheduler(
+        max_concurrent=1, max_waiting=10, weights={}, max_wait={BATCH_FREE: 0.05}
+    )
+
+    async def queued_call():
+        async with scheduler.slot():
+            pass
+
+    async def scenario():
+        async with scheduler.slot():
+            with pytest.raises(LLMOverloaded):
+                await queued_call()
+
+    asyncio.run(scenario())
+    assert scheduler.stats()["queues"][BATCH_FREE]["expired"] == 1
+
+
+class _Recorded(Exception):
+    pass
+
+
+@pytest.fixture
+def recorded_classes(monkeypatch):
+    classes = []
+
+    async def record(*args, **kwargs):
+        classes.append(_current_class.get())
+        raise _Recorded()
+
+    for name in ("extract_expected_answer", "get_similar_exercise", "get_hint_ladder"):
+        monkeypatch.setattr(TutorService, name, record)
+    return classes
+
+
+def test_background_work_runs_as_batch_from_an_interactive_request(recorded_classes):
+    create_tables()
+
+    async def scenario():
+        # As inside a hint or answer request
+        with llm_class(interactive=True, premium=True):
+            extractor = AnswerKeyExtractor()
+            extractor.schedule(1, "1 + 1", premium=True)
+            tasks = list(extractor._tasks.values())
+            tasks.append(HintLadder(steps=3).schedule(1, "1 + 1", "hint", premium=False))
+            speculative, _ = SimilarExercisePrefetcher().start("1 + 1", premium=True)
+            tasks.append(speculative)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert sorted(recorded_classes) == sorted([BATCH_PREMIUM, BATCH_FREE, BATCH_PREMIUM])
+
+
+def test_hint_ladder_someone_waits_for_stays_interactive(recorded_classes):
+    create_tables()
+
+    async def scenario():
+        task = HintLadder(steps=3).schedule(2, "2 + 2", "hint", premium=True, interactive=True)
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert recorded_classes == [INTERACTIVE_PREMIUM]
@@ -0,0 +1,28 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core.config import settings
+from routers import metrics
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(metrics.router, prefix=settings.API_PREFIX)
+    return TestClient(app)
+
+
+def test_hidden_by_default(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_ENABLED", False)
+    assert client.get("/api/metrics/").status_code == 404
+
+
+def test_requires_the_token_when_set(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_ENABLED", True)
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "s3cret")
+    assert client.get("/api/metrics/").status_code == 401
+    assert client.get("/api/metrics/", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/api/metrics/", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert "llm_scheduler" in response.json()
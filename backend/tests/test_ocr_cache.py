@@ -0,0 +1,84 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from core.config import settings
+from core.image_pipeline import preprocess_image
+from core.ocr_cache import OCRCache
+from db.database import SessionLocal, create_tables
+from models.ocr_cache import ImageTranscription
+
+PAGE = ["Bai 1. Giai phuong trinh", "x^2 - 5x + 6 = 0", "Bai 2. Tinh dao ham", "f(x) = 3x^3 + 2x"]
+# Same worksheet layout, one line different: must never share a transcription
+OTHER_PAGE = ["Bai 1. Giai phuong trinh", "x^2 - 7x + 12 = 0", "Bai 2. Tinh dao ham", "f(x) = 3x^3 + 2x"]
+
+
+def _photo(lines: list[str], quality: int = 90) -> bytes:
+    img = Image.new("RGB", (1200, 900), "white")
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=40)
+    for i, line in enumerate(lines):
+        draw.text((60, 60 + i * 70), line, fill="black", font=font)
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+def _processed(data: bytes):
+    return preprocess_image(data, max_dimension=1600, text_mode="grayscale", quality=80)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    create_tables()
+    with SessionLocal() as db:
+        db.query(ImageTranscription).delete()
+        db.commit()
+    monkeypatch.setattr(settings, "OCR_CACHE_ENABLED", True)
+    return OCRCache(max_distance=2, verify_max_distance=4, refresh_seconds=0)
+
+
+def _remember_then_lookup(cache: OCRCache, original: bytes, text: str, photo: bytes) -> str | None:
+    async def scenario():
+        await cache.add(hashlib.sha256(original).hexdigest(), _processed(original), text)
+        return await cache.lookup(hashlib.sha256(photo).hexdigest(), _processed(photo))
+
+    return asyncio.run(scenario())
+
+
+def test_identical_photo_reuses_the_transcription(cache, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_CACHE_NEAR_DUPLICATES", False)
+    photo = _photo(PAGE)
+    assert _remember_then_lookup(cache, photo, "identical", photo) == "identical"
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_near_duplicates_are_off_by_default(cache, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_CACHE_NEAR_DUPLICATES", False)
+    found = _remember_then_lookup(cache, _photo(PAGE), "off by default", _photo(PAGE, quality=60))
+    assert found is None
+
+
+def test_recompressed_copy_matches_when_enabled(cache, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_CACHE_NEAR_DUPLICATES", True)
+    found = _remember_then_lookup(cache, _photo(PAGE), "recompressed", _photo(PAGE, quality=60))
+    assert found == "recompressed"
+    assert cache.stats()["near_duplicate_hits"] == 1
+
+
+def test_page_with_different_text_never_matches(cache, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_CACHE_NEAR_DUPLICATES", True)
+    found = _remember_then_lookup(cache, _photo(PAGE), "first page", _photo(OTHER_PAGE))
+    assert found is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_verification_rejects_a_loose_hash_match(cache, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_CACHE_NEAR_DUPLICATES", True)
+    loose = OCRCache(max_distance=8, verify_max_distance=4, refresh_seconds=0)
+    found = _remember_then_lookup(loose, _photo(PAGE), "first page", _photo(OTHER_PAGE))
+    assert found is None
+    assert loose.stats()["rejected_by_verification"] == 1
@@ -0,0 +1,48 @@
+import asyncio
+
+from core import admission, practice_pool as practice_pool_module
+from core.admission import RateLimiter
+from core.practice_pool import PracticePool, source_key
+from db.database import SessionLocal, create_tables
+from models import exercise, payment, roadmap, user  # noqa: F401 (maps every model before querying)
+from models.practice import PracticeExercise
+
+SOURCE = "Giải phương trình 2x + 4 = 0"
+
+
+def test_only_hits_queue_refills_within_the_speculation_budget(monkeypatch):
+    create_tables()
+    with SessionLocal() as db:
+        db.query(PracticeExercise).filter(PracticeExercise.source_key == source_key(SOURCE)).delete()
+        db.commit()
+    monkeypatch.setattr(practice_pool_module, "rate_limiter", RateLimiter(
+        limits={admission.SPECULATION: (0.001, 1)}, premium_multiplier=1.0, max_buckets=16
+    ))
+    pool = PracticePool(target_depth=2, concurrency=1, sweep_interval=300)
+
+    async def scenario():
+        pool._queue = asyncio.Queue()
+        # A miss spends nothing, but keeps the exercise it generated
+        assert await pool.pop(SOURCE, user_id=1) is None
+        assert pool._queue.qsize() == 0
+        assert await pool.add(SOURCE, "Giải phương trình 3x + 6 = 0")
+        assert not await pool.add(SOURCE, "  Giải  phương trình 3x + 6 = 0 ")
+
+        # The next correct answer is a hit, and its refill takes the user's token
+        assert await pool.pop(SOURCE, user_id=1) == "Giải phương trình 3x + 6 = 0"
+        assert pool._queue.qsize() == 1
+
+        # Once the budget is spent, further refills are dropped
+        pool._queued.clear()
+        pool._queue = asyncio.Queue()
+        await pool.add(SOURCE, "Giải phương trình 5x - 10 = 0")
+        assert await pool.pop(SOURCE, user_id=1) == "Giải phương trình 5x - 10 = 0"
+        assert pool._queue.qsize() == 0
+
+    asyncio.run(scenario())
+    stats = pool.stats()
+    assert stats["served_from_pool"] == 2
+    assert stats["generated_on_miss"] == 1
+    assert stats["kept_from_miss"] == 2
+    assert stats["duplicates_skipped"] == 1
+    assert stats["refill_over_budget"] == 1
@@ -0,0 +1,32 @@
+import asyncio
+
+from db.database import AsyncSessionLocal, create_tables
+from core.response_cache import ResponseCache
+from models.llm_cache import LLMCacheEntry
+
+
+async def _stored_hits(key: str) -> int:
+    async with AsyncSessionLocal() as db:
+        return (await db.get(LLMCacheEntry, key)).hits
+
+
+def test_persistent_hits_are_counted_in_batches():
+    create_tables()
+    cache = ResponseCache(max_entries=16, ttl_seconds=60, hits_flush_every=3)
+    key = ResponseCache.make_key("test", "template", "model", "hit counting")
+
+    async def scenario():
+        await cache.set(key, "test", "value")
+        seen = []
+        for _ in range(3):
+            cache.clear_memory()
+            assert await cache.get(key) == "value"
+            seen.append(await _stored_hits(key))
+        await cache._flushing
+        seen.append(await _stored_hits(key))
+        return seen
+
+    # No write per hit; the third hit triggers one batched update
+    assert asyncio.run(scenario()) == [0, 0, 0, 3]
+    assert cache.stats()["persistent_hits"] == 3
+    assert cache.stats()["pending_hits"] == 0
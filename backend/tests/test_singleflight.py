@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from core.config import settings
+from core.singleflight import SingleFlight
+
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_SINGLEFLIGHT_ENABLED", True)
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def scenario():
+        return await asyncio.gather(*(flights.do("key", work) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["result"] * 5
+    assert calls == 1
+    assert flights.stats() == {"leaders": 1, "coalesced": 4, "cancelled": 0, "in_flight": 0}
+
+
+def test_caller_after_last_waiter_left_gets_a_fresh_call():
+    flights = SingleFlight()
+    started = 0
+
+    async def work():
+        nonlocal started
+        started += 1
+        try:
+            await asyncio.sleep(0.2)
+        except asyncio.CancelledError:
+            # Slow to wind down, like a model call closing its connection
+            await asyncio.sleep(0.05)
+            raise
+        return "result"
+
+    async def scenario():
+        first = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0) # The cancelled call is still winding down
+        return await asyncio.wait_for(flights.do("key", work), 5)
+
+    assert asyncio.run(scenario()) == "result"
+    assert started == 2
+    assert flights.stats()["cancelled"] == 1
+
+
+def test_remaining_waiter_keeps_the_call_alive():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def scenario():
+        leaving = asyncio.create_task(flights.do("key", work))
+        staying = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        return await staying
+
+    assert asyncio.run(scenario()) == "result"
+    assert flights.stats()["cancelled"] == 0
+
+
+def test_stream_subscriber_after_last_one_left_gets_a_fresh_stream():
+    flights = SingleFlight()
+    started = 0
+
+    async def chunks():
+        nonlocal started
+        started += 1
+        try:
+            for chunk in ("a", "b", "c"):
+                await asyncio.sleep(0.02)
+                yield chunk
+        except asyncio.CancelledError:
+            await asyncio.sleep(0.05)
+            raise
+
+    async def consume():
+        return [chunk async for chunk in flights.stream("key", chunks)]
+
+    async def scenario():
+        first = asyncio.create_task(consume())
+        await asyncio.sleep(0.03)
+        first.cancel()
+        await asyncio.sleep(0)
+        return await asyncio.wait_for(consume(), 5)
+
+    assert asyncio.run(scenario()) == ["a", "b", "c"]
+    assert started == 2
+    assert flights.stats()["in_flight"] == 0
@@ -0,0 +1,39 @@
+"""
+Standalone roadmap job worker.
+
+    python worker.py
+
+Run it next to the API with ROADMAP_WORKER_IN_PROCESS=false so the API
+processes only queue jobs and this process generates them.
+"""
+import asyncio
+import signal
+
+from core.roadmap_worker import roadmap_worker
+from db.database import create_tables
+
+
+async def main():
+    create_tables()
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows: fall back to KeyboardInterrupt
+            pass
+
+    await roadmap_worker.start()
+    try:
+        await stop_event.wait()
+    finally:
+        await roadmap_worker.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -381,7 +381,7 @@ const fileInput = document.getElementById('file-input');
 const imagePreviewContainer = document.getElementById('image-preview-container');
 const imagePreview = document.getElementById('image-preview');
 const removeImageBtn = document.getElementById('remove-image-btn');
-let attachedFileBase64 = null;
+let attachedFile = null;
 
 if (fileInput) {
     fileInput.addEventListener('change', () => {
@@ -392,20 +392,16 @@ if (fileInput) {
                 fileInput.value = null;
                 return;
             }
-            const reader = new FileReader();
-            reader.onload = e => {
-                const base64String = e.target.result;
-                imagePreview.src = base64String;
-                attachedFileBase64 = base64String.split(',')[1];
-            };
-            reader.readAsDataURL(file);
+            // The file itself is uploaded as multipart; no base64 copy is kept
+            attachedFile = file;
+            imagePreview.src = URL.createObjectURL(file);
             imagePreviewContainer.classList.remove('hidden');
         }
     });
 }
 if (removeImageBtn) {
     removeImageBtn.addEventListener('click', () => {
-        attachedFileBase64 = null;
+        attachedFile = null;
         if (fileInput) fileInput.value = null;
         if (imagePreview) imagePreview.src = "";
         if (imagePreviewContainer) imagePreviewContainer.classList.add('hidden');
@@ -431,37 +427,75 @@ if (chatForm) {
             if (!message) return;
             handleSubmitAnswer(message);
         } else {
-            if (!message && !attachedFileBase64) return;
-            handleNewExercise(message, attachedFileBase64);
+            if (!message && !attachedFile) return;
+            handleNewExercise(message, attachedFile);
         }
         chatInput.value = '';
         if (removeImageBtn) removeImageBtn.click();
     });
 }
 
-async function handleNewExercise(prompt, base64Image) {
+async function handleNewExercise(prompt, imageFile) {
     if (prompt) addMessage(prompt, 'user');
-    if (base64Image) {
-        const imageUrl = `data:image/jpeg;base64,${base64Image}`;
+    if (imageFile) {
+        const imageUrl = URL.createObjectURL(imageFile);
         const imageHtml = `<img src="${imageUrl}" alt="Exercise Image" class="w-full h-auto max-w-xs rounded-lg">`;
         addMessage(imageHtml, 'user');
     }
     if (chatStateHelper) chatStateHelper.textContent = 'Status: AI is analyzing the exercise...';
 
-    const payload = { prompt, base64_image: base64Image };
+    const formData = new FormData();
+    formData.append('prompt', prompt || '');
+    if (imageFile) formData.append('image', imageFile);
     try {
-        const response = await fetch(`${API_BASE_URL}/exercises/`, {
+        // The hint is streamed as Server-Sent Events so it shows up while it is generated
+        const response = await fetch(`${API_BASE_URL}/exercises/stream`, {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'Authorization': `Bearer ${authToken}`
-            },
-            body: JSON.stringify(payload)
+            // No Content-Type: the browser sets the multipart boundary itself
+            headers: { 'Authorization': `Bearer ${authToken}` },
+            body: formData
         });
-        const data = await response.json();
-        if (!response.ok) throw new Error(data.detail || 'Unknown error');
+        if (!response.ok) {
+            const data = await response.json();
+            throw new Error(data.detail || 'Unknown error');
+        }
+
+        let hintText = null;
+        let data = null;
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let eventData = '';
+                for (const line of rawEvent.split('\n')) {
+                    if (line.startsWith('event: ')) eventName = line.slice(7);
+                    else if (line.startsWith('data: ')) eventData += line.slice(6);
+                }
+                const parsed = JSON.parse(eventData);
+
+                if (eventName === 'token') {
+                    if (!hintText) hintText = addMessage('', 'ai');
+                    if (hintText) hintText.textContent += parsed.text;
+                    if (chatMessages) chatMessages.scrollTop = chatMessages.scrollHeight;
+                } else if (eventName === 'done') {
+                    data = parsed;
+                } else if (eventName === 'error') {
+                    throw new Error(parsed.detail || 'Unknown error');
+                }
+            }
+        }
+        if (!data) throw new Error('The connection was closed before the exercise was saved');
 
-        addMessage(data.interactions[0].ai_response, 'ai');
         currentExerciseId = data.id;
         if (chatStateHelper) chatStateHelper.textContent = `Status: Working on Exercise #${data.id}. Please enter your answer.`;
         if (fileInput) fileInput.disabled = true;
@@ -530,6 +564,8 @@ function addMessage(text, sender = 'ai', type = 'normal') {
     }</div>`;
     chatMessages.appendChild(messageDiv);
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    // Returned so streamed replies can keep appending to the same bubble
+    return messageDiv.querySelector('p');
 }
 
 function checkToken(error) {